@@ -0,0 +1,75 @@
+"""Accounting: the ledger dashboard and the income/expense record page."""
+from datetime import datetime
+
+from flask import Blueprint, flash, redirect, render_template, url_for
+from flask_login import current_user, login_required
+
+from conditional import conditional_get
+from dashboard_api import summary as dashboard_summary
+from forms import IncomeExpenseForm
+from models import db, IncomeExpense
+from pagination import keyset_paginate
+from query_budget import query_budget
+from read_models import ledger_lines, ledger_rows
+from rollups import record_ledger_entry
+
+bp = Blueprint('accounting', __name__)
+
+@bp.route('/dashboard/accounting', methods=['GET', 'POST'])
+@login_required
+@query_budget(20)
+@conditional_get('income_expenses', 'users')
+def accounting_dashboard():
+    if current_user.role != 'accounting':
+        return render_template('unauthorized.html')
+    
+    form = IncomeExpenseForm()
+    if form.validate_on_submit():
+        try:
+            record = IncomeExpense(
+                date=datetime.combine(form.date.data, datetime.min.time()),
+                description=form.description.data,
+                amount=form.amount.data,
+                type=form.type.data,
+                user_id=current_user.id
+            )
+            db.session.add(record)
+            record_ledger_entry(record)
+            db.session.commit()
+            flash('Record added successfully!', 'success')
+            return redirect(url_for('accounting.accounting_dashboard'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error adding record: {str(e)}', 'danger')
+    
+    # One page of entries, with the amount already split into income and expense by the query
+    page = keyset_paginate(ledger_lines(), IncomeExpense)
+    
+    return render_template('dashboard_accounting.html', form=form, records=page, page=page,
+                           totals=dashboard_summary('income_expenses', current_user))
+
+@bp.route('/record/income_expense', methods=['GET', 'POST'])
+@login_required
+@query_budget(20)
+@conditional_get('income_expenses', 'users')
+def record_income_expense():
+    if current_user.role != 'accounting':
+        return render_template('unauthorized.html')
+    
+    form = IncomeExpenseForm()
+    if form.validate_on_submit():
+        record = IncomeExpense(
+            date=datetime.combine(form.date.data, datetime.min.time()),
+            description=form.description.data,
+            amount=form.amount.data,
+            type=form.type.data,
+            user_id=current_user.id
+        )
+        db.session.add(record)
+        record_ledger_entry(record)
+        db.session.commit()
+        flash('Record added successfully!', 'success')
+        return redirect(url_for('accounting.record_income_expense'))
+    
+    records = keyset_paginate(ledger_rows(), IncomeExpense, default_per_page=5)
+    return render_template('record_income_expense.html', form=form, records=records)
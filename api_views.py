@@ -0,0 +1,152 @@
+"""JSON and streaming endpoints shared by the role dashboards.
+
+CSV imports, offline sync, the in-place dashboard updates, product
+suggestions and the live feed; each checks the role itself.
+"""
+import io
+
+from flask import Blueprint, abort, current_app, jsonify, request
+from flask_login import current_user, login_required
+from flask_wtf.csrf import validate_csrf
+from sqlalchemy.exc import IntegrityError
+from wtforms.validators import ValidationError
+
+from dashboard_api import (READ_ROLES, can_read, can_write, create_row,
+                           delta as dashboard_delta, summary as dashboard_summary)
+from imports import IMPORTS, IMPORT_ROLES, import_csv
+from live_events import LIVE_ROLES, open_stream
+from models import db
+from products import search_products
+from query_budget import query_budget
+from sync import MAX_BATCH as SYNC_MAX_BATCH, apply_batch
+
+bp = Blueprint('api', __name__)
+
+# Bulk-load a CSV of the rows the user's record page would create
+@bp.route('/import/<table>', methods=['POST'])
+@login_required
+@query_budget(25)
+def import_data(table):
+    if table not in IMPORTS:
+        abort(404)
+    if current_user.role != IMPORT_ROLES[table]:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    # The upload form is posted by script; its FormData carries the page's CSRF token
+    try:
+        if current_app.config.get('WTF_CSRF_ENABLED', True):
+            validate_csrf(request.form.get('csrf_token') or request.headers.get('X-CSRFToken'))
+    except ValidationError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'success': False, 'message': 'Aucun fichier CSV reçu.'}), 400
+    
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    try:
+        result = import_csv(table, stream, current_user.id, dry_run=request.form.get('dry_run') == '1')
+    except ValueError as e:
+        # Missing columns, or a file that is not UTF-8 text
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify(result.to_dict())
+
+# Apply submissions the service worker queued while offline
+@bp.route('/api/sync', methods=['POST'])
+@login_required
+@query_budget(25)
+def sync_offline_submissions():
+    payload = request.get_json(silent=True)
+    submissions = payload.get('submissions') if isinstance(payload, dict) else None
+    if not isinstance(submissions, list):
+        return jsonify({'success': False, 'message': 'Invalid payload'}), 400
+    if len(submissions) > SYNC_MAX_BATCH:
+        return jsonify({'success': False, 'message': f'At most {SYNC_MAX_BATCH} submissions per batch'}), 413
+    
+    try:
+        results = apply_batch(submissions, current_user)
+    except IntegrityError:
+        # A concurrent batch recorded one of these keys first; a retry will see it as a duplicate
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'Batch conflicts with another sync, retry'}), 409
+    return jsonify({'success': True, 'results': results})
+
+# Rows added to a dashboard's table since the newest one the page shows, with its summary
+@bp.route('/api/dashboard/<table>/rows')
+@login_required
+@query_budget(4)
+def dashboard_rows(table):
+    if table not in READ_ROLES:
+        return jsonify({'success': False, 'message': 'Unknown table'}), 404
+    if not can_read(table, current_user):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    since_id = request.args.get('since_id', 0, type=int)
+    return jsonify(dashboard_delta(table, current_user, since_id))
+
+# Summary figures of a dashboard (ledger totals, today's sales, stock levels)
+@bp.route('/api/dashboard/<table>/summary')
+@login_required
+@query_budget(3)
+def dashboard_summary_data(table):
+    if table not in READ_ROLES:
+        return jsonify({'success': False, 'message': 'Unknown table'}), 404
+    if not can_read(table, current_user):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    return jsonify({'success': True, 'summary': dashboard_summary(table, current_user)})
+
+# Product names starting with what was typed, for the sale and stock forms' autocomplete
+@bp.route('/api/products')
+@login_required
+@query_budget(2)
+def product_suggestions():
+    if current_user.role not in ['agent_commercial', 'chef_commercial', 'stock', 'management']:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    return jsonify({'success': True, 'products': search_products(request.args.get('q', ''))})
+
+# A dashboard form submitted as JSON; answers with the rows and summary to patch into the page
+@bp.route('/api/dashboard/<table>', methods=['POST'])
+@login_required
+@query_budget(20)
+def dashboard_write(table):
+    if table not in IMPORTS:
+        return jsonify({'success': False, 'message': 'Unknown table'}), 404
+    if not can_write(table, current_user):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    # The page's CSRF token comes in a header, since the form itself is not posted
+    try:
+        if current_app.config.get('WTF_CSRF_ENABLED', True):
+            validate_csrf(request.headers.get('X-CSRFToken'))
+    except ValidationError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    payload = request.get_json(silent=True)
+    data = payload.get('data') if isinstance(payload, dict) else None
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': 'Invalid payload'}), 400
+    since_id = payload.get('since_id')
+    if not isinstance(since_id, int):
+        since_id = 0
+    
+    try:
+        row, errors = create_row(table, data, current_user)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Error adding record: {str(e)}'}), 500
+    if errors:
+        return jsonify({'success': False, 'message': 'Invalid data', 'errors': errors}), 400
+    
+    result = dashboard_delta(table, current_user, since_id)
+    result['id'] = row.id
+    return jsonify(result), 201
+
+# Server-Sent Events feed of new ledger entries, sales and stock movements
+@bp.route('/live/events')
+@login_required
+@query_budget(4)
+def live_feed():
+    tables = LIVE_ROLES.get(current_user.role)
+    if not tables:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    # EventSource resends the last id it saw as a header when it reconnects
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return open_stream(current_app._get_current_object(), tables, last_event_id)
@@ -0,0 +1,124 @@
+"""Hot and archive tiers of the ledger, sales and stock tables.
+
+Closed periods are moved out of ``income_expenses``, ``sales`` and
+``stocks`` into ``*_archive`` tables with the same columns and ids
+(``flask archive --before``). The dashboards page through the hot tables
+only, so their indexes stay the size of the open periods however much
+history builds up.
+
+Readers that take a date range (reports, exports, totals over partial
+days) get their sources from ``sources()``: always the hot table, which
+also holds entries dated in a closed period but recorded after it was
+archived, plus the archive when the range starts before the cutoff. The
+rollups keep counting archived rows, so totals, stock levels and the
+daily sales figures do not change when a period is archived.
+
+MySQL RANGE partitioning would do the same inside one table, but it does
+not allow foreign keys, which every one of these tables has.
+"""
+import heapq
+from datetime import datetime
+
+from sqlalchemy.orm import joinedload
+
+from models import db, ArchiveCutoff, IncomeExpense, IncomeExpenseArchive, Sale, SaleArchive, Stock, StockArchive
+
+# Hot model: its archive
+ARCHIVES = {IncomeExpense: IncomeExpenseArchive, Sale: SaleArchive, Stock: StockArchive}
+# Rows moved per transaction
+BATCH_SIZE = 1000
+
+
+def archive_cutoffs():
+    """``{table_name: archived_before}`` for the tables archived so far."""
+    return dict(db.session.query(ArchiveCutoff.table_name, ArchiveCutoff.archived_before).all())
+
+
+def sources(model, start=None, cutoffs=None):
+    """The models holding ``model``'s rows dated from ``start`` (None: all of them)."""
+    cutoff = (archive_cutoffs() if cutoffs is None else cutoffs).get(model.__tablename__)
+    if cutoff is not None and (start is None or start < cutoff):
+        return [model, ARCHIVES[model]]
+    return [model]
+
+
+def rows_between(model, start, end, joined=()):
+    """Rows of ``model`` dated ``start <= date < end``, archive included, ordered by (date, id).
+
+    ``joined`` names relationships to load with the rows.
+    """
+    results = []
+    for source in sources(model, start):
+        query = source.query.options(*[joinedload(getattr(source, name)) for name in joined])
+        query = query.filter(source.date >= start, source.date < end)
+        results.append(query.order_by(source.date, source.id).all())
+    if len(results) == 1:
+        return results[0]
+    return list(heapq.merge(*results, key=lambda row: (row.date, row.id)))
+
+
+def _move_batch(model, cutoff, batch_size):
+    from rollups import bump_table_version
+
+    hot = model.__table__
+    archive = ARCHIVES[model].__table__
+    ids = [row_id for (row_id,) in db.session.query(model.id).filter(
+        model.date < cutoff
+    ).order_by(model.id).limit(batch_size)]
+    if not ids:
+        return 0
+    columns = [column.name for column in hot.columns]
+    db.session.execute(archive.insert().from_select(
+        columns, db.select(*[hot.c[name] for name in columns]).where(hot.c.id.in_(ids))
+    ))
+    db.session.execute(hot.delete().where(hot.c.id.in_(ids)))
+    # The rows leave the dashboards' pages
+    bump_table_version(model.__tablename__)
+    db.session.commit()
+    return len(ids)
+
+
+def archive_before(cutoff, batch_size=BATCH_SIZE, echo=None):
+    """Move every row dated before ``cutoff`` (a datetime) to the archives.
+
+    The cutoff is recorded first, so range readers look in the archive
+    before any row gets there; rows then move ``batch_size`` at a time, one
+    transaction each. Returns ``{table_name: rows moved}``.
+    """
+    cutoffs = archive_cutoffs()
+    for model in ARCHIVES:
+        table_name = model.__tablename__
+        if cutoffs.get(table_name) is None:
+            db.session.add(ArchiveCutoff(table_name=table_name, archived_before=cutoff))
+        elif cutoffs[table_name] < cutoff:
+            ArchiveCutoff.query.filter_by(table_name=table_name).update({ArchiveCutoff.archived_before: cutoff})
+    db.session.commit()
+
+    moved = {}
+    for model in ARCHIVES:
+        # Entries dated before an older cutoff but recorded after it move too
+        effective = max(cutoff, archive_cutoffs()[model.__tablename__])
+        total = 0
+        while True:
+            count = _move_batch(model, effective, batch_size)
+            if not count:
+                break
+            total += count
+            if echo:
+                echo(f'{model.__tablename__}: {total} row(s) archived')
+        moved[model.__tablename__] = total
+    return moved
+
+
+def archive_status():
+    """``{table_name: (archived_before, hot rows, archived rows)}``."""
+    cutoffs = archive_cutoffs()
+    return {model.__tablename__: (cutoffs.get(model.__tablename__), model.query.count(), archive.query.count())
+            for model, archive in ARCHIVES.items()}
+
+
+def months_ago(months, today=None):
+    """Midnight on the first day of the month ``months`` before the current one."""
+    today = today or datetime.now().date()
+    month = today.year * 12 + today.month - 1 - months
+    return datetime(month // 12, month % 12 + 1, 1)
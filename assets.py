@@ -0,0 +1,147 @@
+"""Fingerprinted, precompressed static files.
+
+``build_assets`` copies every file under ``static/`` to ``static/dist/`` as
+``<name>.<hash>.<ext>`` and writes ``.br`` (Brotli) and ``.gz`` (Zopfli)
+variants of text files next to it, plus ``assets.json`` mapping original
+names to hashed ones. Once a manifest exists, ``url_for('static', ...)``
+returns the hashed URL. Hashed files are served in the best encoding the
+client accepts, with ``Cache-Control: immutable``, since any change
+produces a new name. Without a build, everything falls back to the plain
+static files.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import abort, current_app, request, send_from_directory
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'assets.json'
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg', '.html', '.txt', '.map')
+# Served from fixed URLs (the service worker must keep its name)
+EXCLUDED = ('sw.js', 'service-worker.js')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_manifest = {'version': None, 'files': {}}
+
+
+def _dist_path(app):
+    return os.path.join(app.static_folder, DIST_DIR)
+
+
+def _source_files(static_folder):
+    for directory, subdirectories, files in os.walk(static_folder):
+        relative_dir = os.path.relpath(directory, static_folder)
+        if relative_dir == DIST_DIR or relative_dir.startswith(DIST_DIR + os.sep):
+            subdirectories[:] = []
+            continue
+        for name in sorted(files):
+            relative = os.path.normpath(os.path.join(relative_dir, name)).replace(os.sep, '/')
+            if relative in EXCLUDED:
+                continue
+            yield relative
+
+
+def _write(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_assets(app, echo=None):
+    """Hash and compress every static file; returns the new manifest."""
+    import brotli
+    import zopfli.gzip
+
+    dist = _dist_path(app)
+    os.makedirs(dist, exist_ok=True)
+    files = {}
+    keep = {MANIFEST_NAME}
+    for relative in _source_files(app.static_folder):
+        with open(os.path.join(app.static_folder, relative), 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, ext = os.path.splitext(relative)
+        hashed = f'{stem}.{digest}{ext}'
+        target = os.path.join(dist, hashed)
+        files[relative] = hashed
+        keep.add(hashed)
+        if os.path.exists(target):
+            # Same name, same content: already built
+            keep.update({f'{hashed}.br', f'{hashed}.gz'})
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _write(target, data)
+        if ext.lower() in COMPRESSIBLE:
+            _write(f'{target}.br', brotli.compress(data, quality=11))
+            _write(f'{target}.gz', zopfli.gzip.compress(data))
+            keep.update({f'{hashed}.br', f'{hashed}.gz'})
+        if echo:
+            echo(f'{relative} -> {DIST_DIR}/{hashed}')
+
+    version = hashlib.sha256(json.dumps(files, sort_keys=True).encode()).hexdigest()[:12]
+    manifest = {'version': version, 'files': files}
+    _write(os.path.join(dist, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    # Drop outputs of earlier builds
+    for directory, _, names in os.walk(dist):
+        for name in names:
+            relative = os.path.relpath(os.path.join(directory, name), dist).replace(os.sep, '/')
+            if relative not in keep:
+                os.remove(os.path.join(directory, name))
+
+    _manifest.update(manifest)
+    return manifest
+
+
+def load_manifest(app):
+    try:
+        with open(os.path.join(_dist_path(app), MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {'version': None, 'files': {}}
+    _manifest.update(manifest)
+    return manifest
+
+
+def asset_version():
+    """Version of the current build, or None when serving unbuilt files."""
+    return _manifest['version']
+
+
+def hashed_urls(url_for):
+    return {name: url_for('static', filename=name) for name in _manifest['files']}
+
+
+def _fingerprint_static_urls(endpoint, values):
+    if endpoint == 'static':
+        hashed = _manifest['files'].get(values.get('filename'))
+        if hashed:
+            values['filename'] = f'{DIST_DIR}/{hashed}'
+
+
+def serve_asset(filename):
+    dist = _dist_path(current_app)
+    if filename == MANIFEST_NAME or filename.endswith(('.br', '.gz', '.tmp')):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for name, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[name] and os.path.exists(os.path.join(dist, filename + suffix)):
+            encoding = name
+            filename += suffix
+            break
+    response = send_from_directory(dist, filename, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_assets(app):
+    load_manifest(app)
+    app.url_defaults(_fingerprint_static_urls)
+    app.add_url_rule(f'{app.static_url_path}/{DIST_DIR}/<path:filename>', 'assets', serve_asset)
@@ -0,0 +1,89 @@
+"""Login, logout and the landing redirect to each role's dashboard."""
+from flask import Blueprint, current_app, flash, make_response, redirect, render_template, request, url_for
+from flask_login import current_user, login_required, login_user, logout_user
+
+from forms import LoginForm
+from models import db, User
+from passwords import HashingBusy, LoginThrottled, login_attempts
+from query_budget import query_budget
+
+bp = Blueprint('auth', __name__)
+
+@bp.route('/')
+def index():
+    if current_user.is_authenticated:
+        return redirect(url_for('auth.dashboard'))
+    return redirect(url_for('auth.login'))
+
+@bp.route('/login', methods=['GET', 'POST'])
+@query_budget(4)
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('auth.dashboard'))
+    
+    form = LoginForm()
+    if form.validate_on_submit():
+        username = form.username.data
+        try:
+            # Refuse before hashing anything once the username is out of attempts
+            login_attempts.check(username)
+            user = User.query.filter_by(username=username).first()
+            if user and user.check_password(form.password.data):
+                login_attempts.reset(username)
+                if user.password_needs_rehash():
+                    rehash_password(user, form.password.data)
+                login_user(user)
+                next_page = request.args.get('next')
+                return redirect(next_page) if next_page else redirect(url_for('auth.dashboard'))
+            else:
+                login_attempts.fail(username)
+                flash('Invalid username or password', 'danger')
+        except LoginThrottled as e:
+            flash(f'Trop de tentatives de connexion. Réessayez dans {e.retry_after} secondes.', 'danger')
+            response = make_response((render_template('login.html', form=form), 429))
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        except HashingBusy:
+            flash('Serveur occupé, veuillez réessayer dans un instant.', 'warning')
+            response = make_response((render_template('login.html', form=form), 503))
+            response.headers['Retry-After'] = '2'
+            return response
+    
+    return render_template('login.html', form=form)
+
+def rehash_password(user, password):
+    """Re-hash with the configured work factor; the login goes ahead even if this fails."""
+    try:
+        user.set_password(password)
+        db.session.commit()
+    except HashingBusy:
+        pass
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Password rehash failed for {user.username}: {e}")
+
+@bp.route('/logout')
+@login_required
+@query_budget(1)
+def logout():
+    logout_user()
+    return redirect(url_for('auth.login'))
+
+@bp.route('/dashboard')
+@login_required
+@query_budget(1)
+def dashboard():
+    role = current_user.role
+    
+    if role == 'accounting':
+        return redirect(url_for('accounting.accounting_dashboard'))
+    elif role == 'agent_commercial' or role == 'chef_commercial':
+        return redirect(url_for('commercial.commercial_dashboard'))
+    elif role == 'stock':
+        return redirect(url_for('stock.stock_dashboard'))
+    elif role == 'finance':
+        return redirect(url_for('finance.finance_dashboard'))
+    elif role == 'management':
+        return redirect(url_for('management.management_dashboard'))
+    else:
+        return render_template('unauthorized.html')
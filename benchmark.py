@@ -0,0 +1,372 @@
+"""Route benchmarks through the Flask test client.
+
+``flask benchmark`` requests every route of the app as the role that uses
+it, a few times to warm caches and then ``iterations`` times, and records
+for each case the latency percentiles (ms), the SQL statements per request
+and the peak Python memory allocated by one request (tracemalloc). Run it
+against a seeded database (``flask seed-data``, see seed_data.py).
+
+``--save`` writes the results as a JSON baseline; ``--baseline`` compares
+a run with one and exits non-zero on a regression: p90 slower by more than
+the tolerance (and by more than ``MIN_REGRESSION_MS``, so noise on fast
+routes does not count), more queries per request, or peak memory up by
+more than the tolerance (and ``MIN_REGRESSION_KB``). Baselines are only
+comparable on the same machine and seeded scale, so none is committed.
+A route of the app that no case covers, and is not listed in ``SKIPPED``,
+also fails the run, so new routes get a case, and so does a request that
+gets another status than its case expects or goes over its query budget
+(``QUERY_BUDGET_STRICT`` is on while benchmarking): an error page or a
+budget overrun is not a timing.
+"""
+import io
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+import sqlalchemy
+
+from flask import got_request_exception
+
+from models import db, IncomeExpense, ReportJob, Sale, Stock, User
+from query_budget import QueryBudgetExceeded, count_queries
+from seed_data import PASSWORD, ROLE_USERS
+
+DEFAULT_ITERATIONS = 20
+DEFAULT_WARMUP = 2
+DEFAULT_TOLERANCE = 0.2
+MIN_REGRESSION_MS = 2.0
+MIN_REGRESSION_KB = 256
+
+# Endpoints deliberately left out, with the reason
+SKIPPED = {
+    'static': 'served by the web server / precompressed assets in production',
+    'assets': 'the same files as static, hashed; only exists after flask build-assets',
+}
+
+
+class Case:
+    """One request to benchmark.
+
+    ``path``, ``data`` and ``json`` may be callables taking the iteration
+    number, called inside an app context before the request is timed;
+    that is how cases get fresh ids and unique keys. A callable ``path``
+    needs the ``endpoint`` it requests, for the coverage check. A
+    ``fresh_client`` starts every request without cookies, e.g. to log in.
+    Every request must answer with ``status``.
+    """
+
+    def __init__(self, name, path, role=None, method='GET', data=None, json=None, headers=None,
+                 iterations=None, buffered=True, fresh_client=False, endpoint=None, status=200):
+        self.name = name
+        self.status = status
+        self.endpoint = endpoint
+        self.path = path
+        self.role = role
+        self.method = method
+        self.data = data
+        self.json = json
+        self.headers = headers or {}
+        self.iterations = iterations
+        self.buffered = buffered
+        self.fresh_client = fresh_client
+
+
+def _value(value, iteration):
+    return value(iteration) if callable(value) else value
+
+
+def _day(days_ago=0):
+    return (datetime.now().date() - timedelta(days=days_ago)).isoformat()
+
+
+def _newest_id(model):
+    return db.session.query(db.func.max(model.id)).scalar() or 0
+
+
+def _throwaway_user(iteration):
+    # Created outside the timed request; the hash is copied so nothing is hashed here
+    password_hash = db.session.query(User.password_hash).filter_by(username=ROLE_USERS['stock']).scalar()
+    user = User(username=f'bench_del_{uuid.uuid4().hex[:8]}', full_name='Temporaire', department='stock',
+                role='stock', password_hash=password_hash)
+    db.session.add(user)
+    db.session.commit()
+    return f'/delete_user/{user.id}'
+
+
+def _report_job(suffix):
+    def path(iteration):
+        user_id = db.session.query(User.id).filter_by(username=ROLE_USERS['management']).scalar()
+        job = ReportJob(id=uuid.uuid4().hex, start_date=datetime.now().date(), end_date=datetime.now().date(),
+                        status='queued', created_at=datetime.utcnow(), user_id=user_id)
+        db.session.add(job)
+        db.session.commit()
+        return f'/reports/{job.id}{suffix}'
+    return path
+
+
+def _csv_upload(header, row, count=100):
+    def data(iteration):
+        text = header + '\n' + '\n'.join(row for _ in range(count)) + '\n'
+        return {'file': (io.BytesIO(text.encode()), 'bench.csv')}
+    return data
+
+
+def _sync_batch(iteration):
+    return {'submissions': [
+        {'key': uuid.uuid4().hex, 'table': 'sales',
+         'data': {'date': _day(), 'product': 'Riz 25 kg', 'quantity': 2, 'unit_price': 1500}}
+        for _ in range(10)
+    ]}
+
+
+def _user_id(role):
+    def path(iteration):
+        return f'/edit_user/{db.session.query(User.id).filter_by(username=ROLE_USERS[role]).scalar()}'
+    return path
+
+
+def default_cases():
+    month_start, today = _day(30), _day()
+    sale = {'date': today, 'product': 'Riz 25 kg', 'quantity': 3, 'unit_price': 1500}
+    movement = {'date': today, 'product': 'Riz 25 kg', 'quantity_in': 0, 'quantity_out': 1}
+    entry = {'date': today, 'description': 'Transport', 'amount': 2500, 'type': 'expense'}
+    return [
+        Case('service worker', '/sw.js'),
+        Case('manifest', '/manifest.json'),
+        Case('offline page', '/offline.html'),
+        Case('install guide', '/install'),
+        Case('index', '/', 'management', status=302),
+        Case('login page', '/login'),
+        # Hashes the password on every request; a few runs are enough
+        Case('login', '/login', method='POST', data={'username': ROLE_USERS['finance'], 'password': PASSWORD},
+             iterations=3, fresh_client=True, status=302),
+        Case('logout (anonymous)', '/logout', status=302),
+        Case('dashboard redirect', '/dashboard', 'management', status=302),
+        Case('manage users', '/manage_users', 'management'),
+        Case('create user form', '/create_user', 'management'),
+        Case('create user', '/create_user', 'management', 'POST', iterations=3, data=lambda i: {
+            'username': f'bench_new_{uuid.uuid4().hex[:8]}', 'full_name': 'Nouvel utilisateur',
+            'password': PASSWORD, 'department': 'stock', 'role': 'stock'}, status=302),
+        Case('edit user form', _user_id('agent_commercial'), 'management', endpoint='management.edit_user'),
+        Case('delete user', _throwaway_user, 'management', 'POST', iterations=5, endpoint='management.delete_user',
+             status=302),
+        Case('report dates form', '/select_report_dates', 'management'),
+        Case('download report', f'/download_report?start_date={month_start}&end_date={today}', 'management',
+             status=302),
+        Case('submit report', '/reports', 'management', 'POST', json={'start_date': month_start, 'end_date': today},
+             status=202),
+        Case('report job page', _report_job(''), 'management', endpoint='management.report_job'),
+        Case('report job status', _report_job('/status'), 'management', endpoint='management.report_status'),
+        Case('report download (queued)', _report_job('/download'), 'management',
+             endpoint='management.download_report_file', status=404),
+        Case('export sales csv', f'/export/sales.csv?start_date={month_start}&end_date={today}', 'finance'),
+        Case('export ledger ndjson', f'/export/income_expenses.ndjson?start_date={month_start}&end_date={today}',
+             'finance'),
+        Case('import stocks csv', '/import/stocks', 'stock', 'POST', iterations=5,
+             data=_csv_upload('date,product,quantity_in,quantity_out', f'{today},Sel 1 kg,10,0')),
+        Case('offline sync', '/api/sync', 'agent_commercial', 'POST', json=_sync_batch),
+        Case('dashboard rows', '/api/dashboard/sales/rows?since_id=0', 'chef_commercial'),
+        Case('dashboard summary', '/api/dashboard/sales/summary', 'agent_commercial'),
+        Case('product suggestions', '/api/products?q=ri', 'agent_commercial'),
+        Case('dashboard write', '/api/dashboard/sales', 'agent_commercial', 'POST',
+             json={'data': sale, 'since_id': 0}, status=201),
+        # Time to the first byte: the subscription and replay, not the open stream
+        Case('live feed', '/live/events?last_event_id=0', 'management', buffered=False),
+        Case('delete ledger entry', lambda i: f'/delete_income_expense/{_newest_id(IncomeExpense)}', 'management',
+             'POST', iterations=5, endpoint='management.delete_income_expense'),
+        Case('delete sale', lambda i: f'/delete_sale/{_newest_id(Sale)}', 'management', 'POST', iterations=5,
+             endpoint='management.delete_sale'),
+        Case('delete stock movement', lambda i: f'/delete_stock/{_newest_id(Stock)}', 'management', 'POST',
+             iterations=5, endpoint='management.delete_stock'),
+        Case('accounting dashboard', '/dashboard/accounting', 'accounting'),
+        Case('accounting dashboard post', '/dashboard/accounting', 'accounting', 'POST', data=entry, status=302),
+        Case('commercial dashboard (chef)', '/dashboard/commercial', 'chef_commercial'),
+        Case('commercial dashboard (agent)', '/dashboard/commercial', 'agent_commercial'),
+        Case('commercial dashboard post', '/dashboard/commercial', 'agent_commercial', 'POST', data=sale,
+             status=302),
+        Case('sales summary', '/api/sales/summary?period=month&group_by=agent', 'chef_commercial'),
+        Case('stock dashboard', '/dashboard/stock', 'stock'),
+        Case('stock dashboard post', '/dashboard/stock', 'stock', 'POST', data=movement, status=302),
+        Case('finance dashboard', '/dashboard/finance', 'finance'),
+        Case('management dashboard', '/dashboard/management', 'management'),
+        Case('record ledger page', '/record/income_expense', 'accounting'),
+        Case('record ledger', '/record/income_expense', 'accounting', 'POST', data=entry, status=302),
+        Case('record sale page', '/record/sale', 'agent_commercial'),
+        Case('record sale', '/record/sale', 'agent_commercial', 'POST', data=sale, status=302),
+        Case('record stock page', '/record/stock', 'stock'),
+        Case('record stock', '/record/stock', 'stock', 'POST', data=movement, status=302),
+        Case('metrics', '/metrics', 'management'),
+    ]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def case_endpoint(app, case):
+    """The endpoint a case requests; callable paths name it explicitly."""
+    if case.endpoint:
+        return case.endpoint
+    adapter = app.url_map.bind('localhost')
+    return adapter.match(case.path.split('?')[0], method=case.method)[0]
+
+
+def uncovered_endpoints(app, cases):
+    """Endpoints of ``app`` that no case requests and ``SKIPPED`` does not list."""
+    covered = {case_endpoint(app, case) for case in cases}
+    return sorted(set(app.view_functions) - covered - set(SKIPPED))
+
+
+class Benchmark:
+    def __init__(self, app, iterations=DEFAULT_ITERATIONS, warmup=DEFAULT_WARMUP, echo=None):
+        self.app = app
+        self.iterations = iterations
+        self.warmup = warmup
+        self.echo = echo or (lambda message: None)
+        self.clients = {}
+
+    def client(self, role):
+        if role not in self.clients:
+            client = self.app.test_client()
+            if role is not None:
+                with self.app.app_context():
+                    response = client.post('/login', data={'username': ROLE_USERS[role], 'password': PASSWORD})
+                if response.status_code != 302:
+                    raise RuntimeError(f'Could not log in as {ROLE_USERS[role]}; run flask seed-data first')
+            self.clients[role] = client
+        return self.clients[role]
+
+    def request(self, case, iteration):
+        with self.app.app_context():
+            path = _value(case.path, iteration)
+            data = _value(case.data, iteration)
+            payload = _value(case.json, iteration)
+        client = self.app.test_client() if case.fresh_client else self.client(case.role)
+        errors = []
+
+        def record(sender, exception, **extra):
+            errors.append(exception)
+
+        # A context of its own, as in the server: under the flask command one is
+        # already pushed, and requests would otherwise share its g (and logged-in user)
+        with got_request_exception.connected_to(record, self.app), self.app.app_context(), \
+                count_queries() as counter:
+            started = time.perf_counter()
+            try:
+                response = client.open(path, method=case.method, data=data, json=payload, headers=case.headers,
+                                       buffered=case.buffered)
+            except QueryBudgetExceeded as e:
+                # Raised by a streamed body, after the response started
+                response = None
+                errors.append(e)
+            elapsed = (time.perf_counter() - started) * 1000
+        status = response.status_code if response is not None else 500
+        if response is not None:
+            response.close()
+        failures = [f'{type(e).__name__}: {e}' for e in errors]
+        if status != case.status:
+            failures.append(f'status {status}, expected {case.status}')
+        return elapsed, counter.count, status, failures
+
+    def run_case(self, case):
+        iterations = case.iterations or self.iterations
+        failures = set()
+        for i in range(min(self.warmup, iterations)):
+            failures.update(self.request(case, i)[3])
+        timings, queries, statuses = [], [], set()
+        for i in range(iterations):
+            elapsed, count, status, request_failures = self.request(case, i)
+            timings.append(elapsed)
+            queries.append(count)
+            statuses.add(status)
+            failures.update(request_failures)
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            failures.update(self.request(case, iterations)[3])
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        result = {
+            'method': case.method,
+            'path': case.path if isinstance(case.path, str) else None,
+            'iterations': iterations,
+            'status': sorted(statuses),
+            'p50_ms': round(percentile(timings, 0.5), 3),
+            'p90_ms': round(percentile(timings, 0.9), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'max_ms': round(max(timings), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'queries': max(queries),
+            'peak_kb': round(peak / 1024, 1),
+            'failures': sorted(failures),
+        }
+        self.echo(f"{case.name:32} p50 {result['p50_ms']:8.2f} ms  p90 {result['p90_ms']:8.2f} ms  "
+                  f"{result['queries']:3d} queries  {result['peak_kb']:9.1f} KiB  {result['status']}")
+        return result
+
+    def run(self, cases):
+        # CSRF tokens are not what is being measured; the forms post without them.
+        # Budget overruns raise, so they show up as failures
+        csrf = self.app.config.get('WTF_CSRF_ENABLED', True)
+        strict = self.app.config.get('QUERY_BUDGET_STRICT', self.app.testing)
+        self.app.config.update(WTF_CSRF_ENABLED=False, QUERY_BUDGET_STRICT=True)
+        try:
+            results = {case.name: self.run_case(case) for case in cases}
+        finally:
+            self.app.config.update(WTF_CSRF_ENABLED=csrf, QUERY_BUDGET_STRICT=strict)
+        with self.app.app_context():
+            rows = {model.__tablename__: model.query.count() for model in (IncomeExpense, Sale, Stock)}
+            dialect = db.engine.dialect.name
+        return {
+            'meta': {
+                'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'sqlalchemy': sqlalchemy.__version__,
+                'database': dialect,
+                'rows': rows,
+                'iterations': self.iterations,
+            },
+            'routes': results,
+        }
+
+
+def failed_requests(results):
+    """Cases of ``results`` with a request that failed, as messages."""
+    return [f'{name}: {failure}' for name, result in results['routes'].items()
+            for failure in result.get('failures', ())]
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Regressions of ``results`` against ``baseline``, as messages."""
+    regressions = []
+    for name, before in baseline.get('routes', {}).items():
+        after = results['routes'].get(name)
+        if after is None:
+            continue
+        if (after['p90_ms'] > before['p90_ms'] * (1 + tolerance)
+                and after['p90_ms'] - before['p90_ms'] > MIN_REGRESSION_MS):
+            regressions.append(f"{name}: p90 {before['p90_ms']:.2f} -> {after['p90_ms']:.2f} ms")
+        if after['queries'] > before['queries']:
+            regressions.append(f"{name}: queries {before['queries']} -> {after['queries']}")
+        if (after['peak_kb'] > before['peak_kb'] * (1 + tolerance)
+                and after['peak_kb'] - before['peak_kb'] > MIN_REGRESSION_KB):
+            regressions.append(f"{name}: peak memory {before['peak_kb']:.1f} -> {after['peak_kb']:.1f} KiB")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,231 @@
+"""The ``flask`` commands: migrations, rollup checks, workers, archiving and benchmarks.
+
+They live on a blueprint without a CLI group, so ``create_app`` registers
+them as top-level commands and each runs inside an app context.
+"""
+import resource
+
+import click
+from flask import Blueprint, current_app
+
+from archive import archive_before, archive_status, months_ago
+from assets import build_assets
+from benchmark import (Benchmark, DEFAULT_ITERATIONS, DEFAULT_WARMUP, DEFAULT_TOLERANCE, default_cases,
+                       uncovered_endpoints, failed_requests, compare, load_baseline,
+                       save_results as save_benchmark)
+from imports import IMPORTS, import_csv
+from migrations import upgrade, applied_versions, MIGRATIONS
+from models import db, User
+from query_plans import check_query_plans
+import report_cache
+from reports import work as run_report_worker
+from rollups import (verify_stock_balances, rebuild_stock_balances, verify_ledger_totals, rebuild_ledger_totals,
+                     verify_sales_daily, rebuild_sales_daily, reconcile_sales_stock)
+from seed_data import SCALES, ROLE_USERS, PASSWORD as SEED_PASSWORD, parse_rows, seed as seed_database
+from startup_budget import DEFAULT_RUNS as DEFAULT_STARTUP_RUNS, measure as measure_startup, check as check_startup
+
+bp = Blueprint('commands', __name__, cli_group=None)
+
+@bp.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations; on a database without users, create the default admin."""
+    applied = upgrade(echo=click.echo)
+    click.echo(f'{len(applied)} migration(s) applied.')
+    if not User.query.first():
+        admin = User(
+            username='administrator',
+            full_name='Management',
+            department='DIRECTEUR GENERAL',
+            role='management'
+        )
+        admin.set_password('0220Osias#')
+        db.session.add(admin)
+        db.session.commit()
+        click.echo("Default admin user created successfully!")
+
+@bp.cli.command('db-status')
+def db_status_command():
+    """List schema migrations and whether they have been applied."""
+    applied = applied_versions()
+    for version, name, _ in MIGRATIONS:
+        click.echo(f"{version:04d} {name:30} {'applied' if version in applied else 'pending'}")
+
+@bp.cli.command('explain-queries')
+def explain_queries_command():
+    """EXPLAIN each dashboard query and fail on full scans, unindexed sorts or a missing expected index."""
+    failures = check_query_plans(echo=click.echo)
+    if failures:
+        click.echo(f"Bad query plans: {', '.join(failures)}")
+        raise SystemExit(1)
+
+@bp.cli.command('report-worker')
+@click.option('--poll-interval', default=2.0, show_default=True, help='Seconds to wait when the queue is empty.')
+@click.option('--once', is_flag=True, help='Exit once the queue is empty.')
+def report_worker_command(poll_interval, once):
+    """Render queued PDF reports outside the web workers."""
+    run_report_worker(poll_interval=poll_interval, once=once)
+
+@bp.cli.command('report-cache-evict')
+@click.option('--max-age-days', type=int, help='Override REPORT_CACHE_MAX_AGE_DAYS.')
+@click.option('--max-bytes', type=int, help='Override REPORT_CACHE_MAX_BYTES.')
+def report_cache_evict_command(max_age_days, max_bytes):
+    """Trim the PDF report cache by age and size."""
+    report_cache.evict(max_age_days=max_age_days, max_bytes=max_bytes)
+
+@bp.cli.command('stock-balances')
+@click.option('--rebuild', is_flag=True, help='Recompute every balance from the stocks table.')
+def stock_balances_command(rebuild):
+    """Verify (or rebuild) the stock balances against the stocks table."""
+    if rebuild:
+        rebuild_stock_balances()
+        click.echo('Stock balances rebuilt.')
+    mismatches = verify_stock_balances()
+    for product_id, (expected, stored) in sorted(mismatches.items()):
+        click.echo(f'product {product_id}: expected (quantity, movements) {expected}, stored {stored}')
+    if mismatches:
+        raise SystemExit(1)
+    click.echo('Stock balances match the stocks table.')
+
+@bp.cli.command('ledger-totals')
+@click.option('--rebuild', is_flag=True, help='Recompute every daily total from the income_expenses table.')
+def ledger_totals_command(rebuild):
+    """Verify (or rebuild) the ledger daily totals against income_expenses."""
+    if rebuild:
+        rebuild_ledger_totals()
+        click.echo('Ledger daily totals rebuilt.')
+    mismatches = verify_ledger_totals()
+    for (day, type), (expected, stored) in sorted(mismatches.items(), key=lambda item: (item[0][0], item[0][1])):
+        click.echo(f'{day} {type}: expected (total, count) {expected}, stored {stored}')
+    if mismatches:
+        raise SystemExit(1)
+    click.echo('Ledger daily totals match the income_expenses table.')
+
+@bp.cli.command('sales-daily')
+@click.option('--rebuild', is_flag=True, help='Recompute the daily sales rollup from the sales table.')
+def sales_daily_command(rebuild):
+    """Verify (or rebuild) the daily sales rollup against sales."""
+    if rebuild:
+        rebuild_sales_daily()
+        click.echo('Daily sales rollup rebuilt.')
+    mismatches = verify_sales_daily()
+    for (day, product_id, user_id), (expected, stored) in sorted(mismatches.items(), key=lambda item: (item[0][0], item[0][1], item[0][2])):
+        click.echo(f'{day} product {product_id} user {user_id}: expected (quantity, revenue, count) {expected}, stored {stored}')
+    if mismatches:
+        raise SystemExit(1)
+    click.echo('Daily sales rollup matches the sales table.')
+
+@bp.cli.command('reconcile-sales')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), help='First day included (default: all).')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), help='First day excluded (default: all).')
+def reconcile_sales_command(start, end):
+    """List the products whose units sold differ from the stock taken out."""
+    differences = reconcile_sales_stock(start.date() if start else None, end.date() if end else None)
+    for row in differences:
+        click.echo(f"{row['product']} (product {row['product_id']}): sold {row['sold']}, stock out {row['out']}")
+    if differences:
+        raise SystemExit(1)
+    click.echo('Units sold match the stock taken out for every product.')
+
+@bp.cli.command('archive')
+@click.option('--before', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Archive rows dated before this day (default: keep ARCHIVE_KEEP_MONTHS whole months).')
+@click.option('--status', is_flag=True, help='Only show the cutoffs and row counts.')
+def archive_command(before, status):
+    """Move closed periods of the ledger, sales and stock tables to their archive tables."""
+    if not status:
+        cutoff = before or months_ago(current_app.config.get('ARCHIVE_KEEP_MONTHS', 12))
+        click.echo(f'Archiving rows dated before {cutoff:%Y-%m-%d}...')
+        archive_before(cutoff, echo=click.echo)
+    for table_name, (cutoff, hot, archived) in archive_status().items():
+        since = f'before {cutoff:%Y-%m-%d}' if cutoff else 'nothing'
+        click.echo(f'{table_name}: {hot} hot row(s), {archived} archived ({since})')
+
+@bp.cli.command('seed-data')
+@click.option('--rows', default='10k', show_default=True,
+              help=f"Rows across the ledger, sales and stock tables: a number or {', '.join(SCALES)}.")
+@click.option('--days', default=365, show_default=True, help='Spread the rows over this many past days.')
+@click.option('--seed', default=0, show_default=True, help='Random seed; the same seed gives the same data.')
+def seed_data_command(rows, days, seed):
+    """Fill an empty database with synthetic data for benchmarks."""
+    upgrade(echo=click.echo)
+    try:
+        seed_database(parse_rows(rows), days=days, seed=seed, echo=click.echo)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Seeded; log in as {", ".join(ROLE_USERS.values())} with password {SEED_PASSWORD!r}.')
+
+@bp.cli.command('benchmark')
+@click.option('--iterations', default=DEFAULT_ITERATIONS, show_default=True, help='Timed requests per route.')
+@click.option('--warmup', default=DEFAULT_WARMUP, show_default=True, help='Untimed requests per route first.')
+@click.option('--only', help='Only the cases whose name contains this text.')
+@click.option('--save', type=click.Path(dir_okay=False), help='Write the results to this JSON file.')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Fail on regressions against this file.')
+@click.option('--tolerance', default=DEFAULT_TOLERANCE, show_default=True,
+              help='Allowed slowdown (and memory growth) as a fraction of the baseline.')
+def benchmark_command(iterations, warmup, only, save, baseline, tolerance):
+    """Time every route through the test client against a seeded database."""
+    cases = default_cases()
+    uncovered = uncovered_endpoints(current_app, cases)
+    if only:
+        cases = [case for case in cases if only in case.name]
+    results = Benchmark(current_app._get_current_object(), iterations, warmup, echo=click.echo).run(cases)
+    click.echo(f"Peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024} MiB")
+    if save:
+        save_benchmark(results, save)
+        click.echo(f'Results saved to {save}.')
+    failed = False
+    if uncovered:
+        click.echo(f"Routes without a benchmark case: {', '.join(uncovered)}")
+        failed = True
+    for failure in failed_requests(results):
+        click.echo(f'Failed: {failure}')
+        failed = True
+    if baseline:
+        regressions = compare(results, load_baseline(baseline), tolerance)
+        for regression in regressions:
+            click.echo(f'Regression: {regression}')
+        failed = failed or bool(regressions)
+    if failed:
+        raise SystemExit(1)
+
+@bp.cli.command('startup-check')
+@click.option('--runs', default=DEFAULT_STARTUP_RUNS, show_default=True, help='Imports to time; the fastest counts.')
+def startup_check_command(runs):
+    """Fail if importing the app is slower or bigger than its budget, or loads the PDF stack."""
+    measurement = measure_startup(runs)
+    click.echo(f"import {measurement['import_ms']:.0f} ms, RSS {measurement['rss_mb']:.1f} MiB")
+    failures = check_startup(measurement, current_app.config['STARTUP_IMPORT_BUDGET_MS'],
+                             current_app.config['STARTUP_RSS_BUDGET_MB'])
+    for failure in failures:
+        click.echo(f'Over budget: {failure}')
+    if failures:
+        raise SystemExit(1)
+
+@bp.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress the files under static/ into static/dist/."""
+    manifest = build_assets(current_app, echo=click.echo)
+    click.echo(f"{len(manifest['files'])} asset(s), version {manifest['version']}.")
+
+@bp.cli.command('import-csv')
+@click.argument('table', type=click.Choice(sorted(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'username', required=True, help='Username the rows are recorded for.')
+@click.option('--dry-run', is_flag=True, help='Validate every row without writing anything.')
+def import_csv_command(table, path, username, dry_run):
+    """Bulk-load a CSV file of ledger entries, sales or stock movements."""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.BadParameter(f'No user named {username}', param_hint='--user')
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        try:
+            result = import_csv(table, f, user.id, dry_run=dry_run)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    for error in result.errors:
+        click.echo(f"line {error['line']}: {error['errors']}")
+    verb = 'validated' if dry_run else 'imported'
+    count = result.rows - result.failed if dry_run else result.imported
+    click.echo(f'{count} of {result.rows} row(s) {verb}, {result.failed} rejected.')
+    if result.failed:
+        raise SystemExit(1)
@@ -0,0 +1,141 @@
+"""Sales agents and their chef: the sales dashboard, summaries and the record page."""
+from datetime import datetime, timedelta
+
+from flask import Blueprint, flash, jsonify, redirect, render_template, request, url_for
+from flask_login import current_user, login_required
+
+from conditional import conditional_get
+from forms import SaleForm
+from live_events import latest_event_id
+from models import db, Sale
+from pagination import keyset_paginate
+from products import get_or_create_product
+from query_budget import query_budget
+from read_models import sale_rows
+from rollups import record_sale_entry, period_range, sales_totals, sales_by_product, sales_by_agent
+
+bp = Blueprint('commercial', __name__)
+
+@bp.route('/dashboard/commercial', methods=['GET', 'POST'])
+@login_required
+@query_budget(20)
+@conditional_get('sales', 'users')
+def commercial_dashboard():
+    if current_user.role not in ['agent_commercial', 'chef_commercial']:
+        return render_template('unauthorized.html')
+    
+    form = SaleForm()
+    
+    # Only show form for agent_commercial, not for chef_commercial
+    if form.validate_on_submit() and current_user.role == 'agent_commercial':
+        total = form.quantity.data * form.unit_price.data
+        product = get_or_create_product(form.product.data)
+        sale = Sale(
+            date=datetime.combine(form.date.data, datetime.min.time()),
+            product_id=product.id,
+            product=product,
+            quantity=form.quantity.data,
+            unit_price=form.unit_price.data,
+            total=total,
+            user_id=current_user.id
+        )
+        db.session.add(sale)
+        record_sale_entry(sale)
+        db.session.commit()
+        flash('Sale recorded successfully!', 'success')
+        return redirect(url_for('commercial.commercial_dashboard'))
+    
+    # Chef Commercial follows new sales live; read the feed position before the data so no sale falls between
+    live_event_id = latest_event_id() if current_user.role == 'chef_commercial' else None
+    
+    # Get sales data based on user role
+    if current_user.role == 'chef_commercial':
+        # Chef Commercial sees all sales
+        sales = keyset_paginate(sale_rows(with_agent=True), Sale)
+        
+        # Today's sales by product, read from the daily sales rollup
+        first_day, last_day = period_range(datetime.now().date(), 'day')
+        product_totals = {row['product']: row['quantity'] for row in sales_by_product(first_day, last_day)}
+        
+    else:
+        # Agent Commercial sees only their own sales
+        sales = keyset_paginate(sale_rows(user_id=current_user.id), Sale)
+        
+        # Today's sales by product for this agent
+        first_day, last_day = period_range(datetime.now().date(), 'day')
+        product_totals = {row['product']: row['quantity']
+                          for row in sales_by_product(first_day, last_day, user_id=current_user.id)}
+    
+    return render_template('dashboard_commercial.html', form=form, sales=sales, product_totals=product_totals,
+                           user_role=current_user.role, live_event_id=live_event_id,
+                           today=datetime.now().date().isoformat())
+
+# JSON sales totals per product or per agent for a day, week or month
+@bp.route('/api/sales/summary')
+@login_required
+@query_budget(3)
+def sales_summary():
+    if current_user.role not in ['agent_commercial', 'chef_commercial', 'management']:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    period = request.args.get('period', 'day')
+    group_by = request.args.get('group_by', 'product')
+    if period not in ['day', 'week', 'month'] or group_by not in ['product', 'agent']:
+        return jsonify({'success': False, 'message': 'period must be day, week or month and group_by product or agent'}), 400
+    
+    try:
+        date_str = request.args.get('date')
+        day = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else datetime.now().date()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid date, use YYYY-MM-DD'}), 400
+    
+    first_day, last_day = period_range(day, period)
+    
+    # Agents only ever see their own sales
+    user_id = current_user.id if current_user.role == 'agent_commercial' else None
+    if group_by == 'product':
+        rows = sales_by_product(first_day, last_day, user_id=user_id)
+    else:
+        rows = sales_by_agent(first_day, last_day, user_id=user_id)
+    
+    return jsonify({
+        'success': True,
+        'period': period,
+        'group_by': group_by,
+        'start_date': first_day.isoformat(),
+        'end_date': (last_day - timedelta(days=1)).isoformat(),
+        'totals': sales_totals(first_day, last_day, user_id=user_id),
+        'rows': rows
+    })
+
+@bp.route('/record/sale', methods=['GET', 'POST'])
+@login_required
+@query_budget(20)
+@conditional_get('sales', 'users')
+def record_sale():
+    if current_user.role != 'agent_commercial':
+        return render_template('unauthorized.html')
+    
+    form = SaleForm()
+    if form.validate_on_submit():
+        total = form.quantity.data * form.unit_price.data
+        product = get_or_create_product(form.product.data)
+        sale = Sale(
+            date=datetime.combine(form.date.data, datetime.min.time()),
+            product_id=product.id,
+            product=product,
+            quantity=form.quantity.data,
+            unit_price=form.unit_price.data,
+            total=total,
+            user_id=current_user.id
+        )
+        db.session.add(sale)
+        record_sale_entry(sale)
+        db.session.commit()
+        flash('Sale recorded successfully!', 'success')
+        return redirect(url_for('commercial.record_sale'))
+    
+    # Get sales based on user role
+    sales = keyset_paginate(sale_rows(user_id=current_user.id), Sale, default_per_page=5)
+    
+    return render_template('record_sale.html', form=form, sales=sales)
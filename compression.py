@@ -0,0 +1,40 @@
+"""Dynamic compression of HTML and JSON responses.
+
+Brotli at a low quality when the client accepts it (close to gzip's speed,
+smaller output), gzip otherwise. Streamed responses (exports, reports)
+and files are left alone: those are either already compressed or
+precompressed (see assets.py).
+"""
+import gzip
+
+import brotli
+from flask import request
+
+COMPRESSIBLE_MIMETYPES = ('text/html', 'application/json')
+MIN_SIZE = 500
+BROTLI_QUALITY = 4
+GZIP_LEVEL = 6
+
+
+def compress_response(response):
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < MIN_SIZE:
+        return response
+    if request.accept_encodings['br']:
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+        response.headers['Content-Encoding'] = 'br'
+    elif request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
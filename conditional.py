@@ -0,0 +1,86 @@
+"""Conditional GET for dashboards.
+
+``@conditional_get('sales', ...)`` gives a view a weak ETag built from the
+versions of the tables it reads (``table_versions``, bumped by every write),
+the user and role, the URL including pagination cursors, the day, and the
+template/asset build. A request whose ``If-None-Match`` matches gets a 304
+after one read of the (few-row) ``table_versions`` table, before the view
+runs any query or renders anything.
+"""
+import hashlib
+import time
+from datetime import date
+from functools import wraps
+
+from flask import current_app, g, make_response, request, session
+from flask_login import current_user
+
+from assets import asset_version
+from models import db, TableVersion
+
+_template_digest = None
+
+
+def template_digest():
+    """Hash of every template source, so a deploy that changes markup changes the ETags."""
+    global _template_digest
+    if _template_digest is None:
+        env = current_app.jinja_env
+        digest = hashlib.sha1()
+        for name in sorted(env.loader.list_templates()):
+            digest.update(name.encode())
+            digest.update(env.loader.get_source(env, name)[0].encode())
+        _template_digest = digest.hexdigest()
+    return _template_digest
+
+
+def current_table_versions():
+    """Every table's version, read once per request and shared by ETags and fragment caches."""
+    versions = g.get('table_versions')
+    if versions is None:
+        versions = g.table_versions = dict(db.session.query(TableVersion.table_name, TableVersion.version).all())
+    return versions
+
+
+def _csrf_period():
+    # Pages embed a CSRF token that expires after WTF_CSRF_TIME_LIMIT; change
+    # the ETag every half of that so a revalidated page never holds a dead token
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    return int(time.time() // (limit / 2)) if limit else 0
+
+
+def compute_etag(tables):
+    versions = current_table_versions()
+    parts = [
+        request.full_path,
+        str(current_user.get_id()),
+        current_user.role,
+        ','.join(f'{name}:{versions.get(name, 0)}' for name in tables),
+        date.today().isoformat(),
+        template_digest(),
+        asset_version() or '',
+        str(_csrf_period()),
+    ]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+def conditional_get(*tables):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Pending flash messages are consumed by the render, so never skip it
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+            etag = compute_etag(tables)
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,121 @@
+"""Application and database settings, read from the environment.
+
+The connection pool is sized per process: each gunicorn worker serves
+``GUNICORN_THREADS`` requests at once and gets its own engine, so the pool
+defaults to one connection per thread plus a small overflow. Connections
+are pinged on checkout and recycled before the managed MySQL idle timeout
+(``DB_POOL_RECYCLE``) so a worker never hands a dead connection to a request.
+
+``DATABASE_URL`` points the app at any other database instead, SQLite
+included, which is what local benchmarks and tests run against.
+"""
+import os
+
+from sqlalchemy.pool import StaticPool
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ''):
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+# Shared with gunicorn.conf.py so the pool matches the number of request threads
+DEFAULT_THREADS = 4
+
+
+def database_uri():
+    """``DATABASE_URL`` if set (any SQLAlchemy URL, e.g. ``sqlite:///bench.db``), else MySQL from ``DB_*``."""
+    url = os.environ.get('DATABASE_URL')
+    if url:
+        # Hosting dashboards hand out plain mysql:// URLs; PyMySQL is the installed driver
+        return 'mysql+pymysql://' + url[len('mysql://'):] if url.startswith('mysql://') else url
+    db_user = os.environ.get("DB_USER")
+    db_password = os.environ.get("DB_PASSWORD")
+    db_host = os.environ.get("DB_HOST")
+    db_name = os.environ.get("DB_NAME")
+    db_port = os.environ.get("DB_PORT", "17954")
+    return f"mysql+pymysql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+
+
+def engine_options(uri):
+    if uri.startswith('sqlite'):
+        # No pool to size: SQLite connections are files (or one shared in-memory
+        # database), used from request threads and the live feed thread alike
+        options = {"connect_args": {"check_same_thread": False}}
+        if uri in ('sqlite://', 'sqlite:///:memory:'):
+            options["poolclass"] = StaticPool
+        return options
+    threads = env_int('GUNICORN_THREADS', DEFAULT_THREADS)
+    connect_args = {"connect_timeout": env_int('DB_CONNECT_TIMEOUT', 10)}
+    if env_bool('DB_SSL', True):
+        connect_args["ssl"] = {"ssl_mode": "REQUIRED"}
+    return {
+        "connect_args": connect_args,
+        "pool_size": env_int('DB_POOL_SIZE', threads),
+        "max_overflow": env_int('DB_MAX_OVERFLOW', 2),
+        "pool_timeout": env_int('DB_POOL_TIMEOUT', 10),
+        # Below the server/proxy idle timeout so idle connections are replaced, not reused dead
+        "pool_recycle": env_int('DB_POOL_RECYCLE', 280),
+        "pool_pre_ping": env_bool('DB_POOL_PRE_PING', True),
+        # LIFO keeps a few connections hot and lets the rest age out through recycle
+        "pool_use_lifo": True,
+    }
+
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'd29c234ca310aa6990092d4b6cd4c4854585c51e1f73bf4de510adca03f5bc4e')
+
+    SQLALCHEMY_DATABASE_URI = database_uri()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connections opened by each worker before it accepts requests
+    DB_WARMUP_CONNECTIONS = env_int('DB_WARMUP_CONNECTIONS', min(2, SQLALCHEMY_ENGINE_OPTIONS.get('pool_size', 0)))
+
+    # Logged-in user cache: entry lifetime, size and the file touched to invalidate other workers
+    USER_CACHE_TTL = env_int('USER_CACHE_TTL', 60)
+    USER_CACHE_MAX_SIZE = env_int('USER_CACHE_MAX_SIZE', 1024)
+    USER_CACHE_SIGNAL_FILE = os.environ.get('USER_CACHE_SIGNAL_FILE')
+
+    # Password hashing: work factor (existing hashes are upgraded at login), executor size and queue
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+    PASSWORD_HASH_ITERATIONS = env_int('PASSWORD_HASH_ITERATIONS', 1_000_000)
+    PASSWORD_HASH_CONCURRENCY = env_int('PASSWORD_HASH_CONCURRENCY', 2)
+    # A login holds its request thread while its hash waits, so by default logins may take all
+    # but one of the worker's threads; the next one gets a 503 instead of a thread
+    PASSWORD_HASH_QUEUE = env_int('PASSWORD_HASH_QUEUE', max(
+        0, env_int('GUNICORN_THREADS', DEFAULT_THREADS) - PASSWORD_HASH_CONCURRENCY - 1))
+    # Failed logins allowed per username within the window (seconds)
+    LOGIN_MAX_ATTEMPTS = env_int('LOGIN_MAX_ATTEMPTS', 5)
+    LOGIN_ATTEMPT_WINDOW = env_int('LOGIN_ATTEMPT_WINDOW', 300)
+
+    # Rendered template fragments kept per process, and where compiled templates are stored
+    FRAGMENT_CACHE_SIZE = env_int('FRAGMENT_CACHE_SIZE', 256)
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR')
+
+    # Live feed (Server-Sent Events): open streams per worker (each holds a thread under
+    # gthread), stream length before the browser reconnects, fallback poll and event retention
+    LIVE_MAX_STREAMS = env_int('LIVE_MAX_STREAMS', max(1, env_int('GUNICORN_THREADS', DEFAULT_THREADS) // 2))
+    LIVE_STREAM_SECONDS = env_int('LIVE_STREAM_SECONDS', 300)
+    LIVE_POLL_SECONDS = env_int('LIVE_POLL_SECONDS', 2)
+    LIVE_RETENTION_HOURS = env_int('LIVE_RETENTION_HOURS', 24)
+    LIVE_SIGNAL_FILE = os.environ.get('LIVE_SIGNAL_FILE')
+
+    # Months kept in the hot tables by `flask archive` when no --before date is given
+    ARCHIVE_KEEP_MONTHS = env_int('ARCHIVE_KEEP_MONTHS', 12)
+
+    # Budgets checked by `flask startup-check`: time to import the app and RSS right after
+    STARTUP_IMPORT_BUDGET_MS = env_int('STARTUP_IMPORT_BUDGET_MS', 1500)
+    STARTUP_RSS_BUDGET_MB = env_int('STARTUP_RSS_BUDGET_MB', 96)
+
+    # Instrumentation: shared directory for per-worker metrics and slow query threshold
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    SLOW_QUERY_THRESHOLD_MS = env_int('SLOW_QUERY_THRESHOLD_MS', 200)
@@ -0,0 +1,132 @@
+"""JSON reads and writes behind the dashboards' in-place updates.
+
+The accounting, commercial and stock dashboards submit their form as JSON
+and patch the answer into the page instead of redirecting and rendering
+every row again. A write returns the rows added since the newest id the
+page already shows (``since_id``, which also picks up other users' entries)
+and the table's summary: ledger totals with the last days' income and
+expense, today's sales per product, or stock levels, all read from the
+rollups. The same delta and summary are
+available on their own for pages that only read.
+"""
+from datetime import datetime
+
+from sqlalchemy.orm import joinedload
+
+from imports import IMPORTS, IMPORT_ROLES, validate_row
+from models import db, IncomeExpense, Sale, Stock
+from products import get_or_create_product
+from rollups import get_stock_levels, ledger_totals, period_range, sales_by_product, sales_totals
+
+# More new rows than this and the client reloads the page instead
+MAX_DELTA_ROWS = 100
+
+# Roles that may read each table's rows and summary
+READ_ROLES = {
+    'income_expenses': ['accounting'],
+    'sales': ['agent_commercial', 'chef_commercial'],
+    'stocks': ['stock'],
+}
+
+
+def _product_name(row):
+    # Rows are read with their product joined in; never lazy-load one per row
+    product = row.__dict__.get('product')
+    return product.name if product is not None else None
+
+
+def _income_expense_dict(record):
+    return {'id': record.id, 'date': record.date.strftime('%Y-%m-%d'), 'description': record.description,
+            'amount': record.amount, 'type': record.type}
+
+
+def _sale_dict(sale, with_agent=False):
+    row = {'id': sale.id, 'date': sale.date.strftime('%Y-%m-%d'), 'product': _product_name(sale),
+           'product_id': sale.product_id, 'quantity': sale.quantity, 'unit_price': sale.unit_price, 'total': sale.total}
+    if with_agent:
+        row['agent'] = sale.user.full_name
+    return row
+
+
+def _stock_dict(stock):
+    return {'id': stock.id, 'date': stock.date.strftime('%Y-%m-%d'), 'product': _product_name(stock),
+            'product_id': stock.product_id, 'quantity_in': stock.quantity_in, 'quantity_out': stock.quantity_out}
+
+
+# Model to its JSON form; the live feed sends rows in the same shape
+SERIALIZERS = {IncomeExpense: _income_expense_dict, Sale: _sale_dict, Stock: _stock_dict}
+
+
+def _visible_rows(table, user):
+    """Query of the rows ``user`` sees on their dashboard, and how to serialize one."""
+    if table == 'income_expenses':
+        return IncomeExpense.query, _income_expense_dict
+    if table == 'sales':
+        if user.role == 'chef_commercial':
+            return (Sale.query.options(joinedload(Sale.user), joinedload(Sale.product)),
+                    lambda sale: _sale_dict(sale, with_agent=True))
+        # Agents only ever see their own sales
+        return Sale.query.options(joinedload(Sale.product)).filter_by(user_id=user.id), _sale_dict
+    return Stock.query.options(joinedload(Stock.product)), _stock_dict
+
+
+def can_read(table, user):
+    return user.role in READ_ROLES.get(table, [])
+
+
+def can_write(table, user):
+    return IMPORT_ROLES.get(table) == user.role
+
+
+def rows_since(table, user, since_id):
+    """Rows newer than ``since_id``, newest first, and whether the list was cut short."""
+    query, serialize = _visible_rows(table, user)
+    model = IMPORTS[table][0]
+    rows = query.filter(model.id > since_id).order_by(model.date.desc(), model.id.desc()).limit(
+        MAX_DELTA_ROWS + 1).all()
+    return [serialize(row) for row in rows[:MAX_DELTA_ROWS]], len(rows) > MAX_DELTA_ROWS
+
+
+def summary(table, user):
+    """The figures shown next to the table, from the rollups."""
+    if table == 'income_expenses':
+        totals = ledger_totals()
+        return {'income': totals['income'], 'expense': totals['expense'],
+                'balance': totals['income'] - totals['expense']}
+    if table == 'sales':
+        first_day, last_day = period_range(datetime.now().date(), 'day')
+        user_id = user.id if user.role == 'agent_commercial' else None
+        return {'today': sales_totals(first_day, last_day, user_id=user_id),
+                'products': sales_by_product(first_day, last_day, user_id=user_id)}
+    return {'levels': get_stock_levels()}
+
+
+def delta(table, user, since_id):
+    rows, truncated = rows_since(table, user, since_id)
+    return {
+        'success': True,
+        'rows': rows,
+        'truncated': truncated,
+        'last_id': max([since_id] + [row['id'] for row in rows]),
+        'summary': summary(table, user),
+    }
+
+
+def create_row(table, data, user):
+    """Validate ``data`` with the table's form and insert it with its rollup update.
+
+    Returns ``(row, None)`` with the new model instance, committed, or
+    ``(None, errors)`` with the form's errors.
+    """
+    values, errors = validate_row(table, data, user.id)
+    if errors:
+        return None, errors
+    model, _, _, _, _, record = IMPORTS[table]
+    if 'product' in values:
+        values['product'] = get_or_create_product(values['product'])
+        values['product_id'] = values['product'].id
+    row = model(**values)
+    db.session.add(row)
+    record([values])
+    db.session.commit()
+    return row, None
@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from archive import sources
+from models import db, IncomeExpense, Product, Sale, Stock
+
+# Rows fetched per round trip; the driver streams them with a server-side cursor
+BATCH_SIZE = 1000
+
+EXPORTS = {
+    'income_expenses': (IncomeExpense, ['id', 'date', 'description', 'amount', 'type', 'user_id']),
+    'sales': (Sale, ['id', 'date', 'product', 'quantity', 'unit_price', 'total', 'user_id']),
+    'stocks': (Stock, ['id', 'date', 'product', 'quantity_in', 'quantity_out', 'user_id']),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _select(source, columns, start, end_exclusive):
+    # The product column holds the product's name, as in the CSV imports
+    statement = db.select(*[Product.name.label('product') if name == 'product' else getattr(source, name)
+                            for name in columns])
+    if 'product' in columns:
+        statement = statement.join(Product, Product.id == source.product_id)
+    return statement.where(source.date >= start, source.date < end_exclusive)
+
+
+def _rows(table, start_date, end_date):
+    """Yield column tuples for the days ``start_date`` to ``end_date`` inclusive."""
+    model, columns = EXPORTS[table]
+    start = datetime.combine(start_date, datetime.min.time())
+    end_exclusive = start + timedelta(days=(end_date - start_date).days + 1)
+    selects = [_select(source, columns, start, end_exclusive) for source in sources(model, start)]
+    if len(selects) == 1:
+        statement = selects[0].order_by(model.date, model.id)
+    else:
+        # The range reaches into the archive; late entries keep the hot and archived rows interleaved
+        union = db.union_all(*selects).subquery()
+        statement = db.select(*[union.c[name] for name in columns]).order_by(union.c.date, union.c.id)
+    for partition in db.session.execute(statement.execution_options(yield_per=BATCH_SIZE)).partitions():
+        yield partition
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def generate_csv(table, start_date, end_date):
+    columns = EXPORTS[table][1]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for partition in _rows(table, start_date, end_date):
+        for row in partition:
+            writer.writerow([_value(value) for value in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def generate_ndjson(table, start_date, end_date):
+    columns = EXPORTS[table][1]
+    for partition in _rows(table, start_date, end_date):
+        yield ''.join(
+            json.dumps(dict(zip(columns, (_value(value) for value in row))), ensure_ascii=False) + '\n'
+            for row in partition
+        )
+
+
+def generate_export(table, fmt, start_date, end_date):
+    if fmt == 'csv':
+        return generate_csv(table, start_date, end_date)
+    return generate_ndjson(table, start_date, end_date)
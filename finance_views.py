@@ -0,0 +1,68 @@
+"""Finance: the ledger dashboard and raw exports (shared with management)."""
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, flash, redirect, render_template, request, stream_with_context, url_for
+from flask_login import current_user, login_required
+
+from conditional import conditional_get
+from exports import EXPORTS, FORMATS, generate_export
+from models import IncomeExpense
+from pagination import keyset_paginate
+from query_budget import query_budget
+from read_models import ledger_rows
+from rollups import ledger_totals
+
+bp = Blueprint('finance', __name__)
+
+# Stream raw rows of one table for a date range as CSV or NDJSON
+@bp.route('/export/<table>.<fmt>')
+@login_required
+@query_budget(3)
+def export_data(table, fmt):
+    if current_user.role not in ['management', 'finance']:
+        return render_template('unauthorized.html')
+    
+    if table not in EXPORTS or fmt not in FORMATS:
+        abort(404)
+    
+    try:
+        start_date = datetime.strptime(request.args.get('start_date', ''), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args.get('end_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        flash('Format de date invalide. Utilisez le format AAAA-MM-JJ.', 'danger')
+        return redirect(url_for('auth.dashboard'))
+    
+    filename = f'savane_{table}_{start_date.strftime("%Y%m%d")}_to_{end_date.strftime("%Y%m%d")}.{fmt}'
+    return Response(
+        stream_with_context(generate_export(table, fmt, start_date, end_date)),
+        mimetype=FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@bp.route('/dashboard/finance')
+@login_required
+@query_budget(4)
+@conditional_get('income_expenses', 'users')
+def finance_dashboard():
+    if current_user.role != 'finance':
+        return render_template('unauthorized.html')
+    
+    # Get one page of income and expense records
+    records = keyset_paginate(ledger_rows(), IncomeExpense)
+    
+    # Totals come from the daily ledger rollup
+    totals = ledger_totals()
+    total_income = totals['income']
+    total_expense = totals['expense']
+    balance = total_income - total_expense
+    
+    # Default export range: the current month
+    today = datetime.now()
+    
+    return render_template('dashboard_finance.html', 
+                          total_income=total_income, 
+                          total_expense=total_expense, 
+                          balance=balance,
+                          records=records,
+                          default_start_date=today.replace(day=1).strftime('%Y-%m-%d'),
+                          default_end_date=today.strftime('%Y-%m-%d'))
@@ -0,0 +1,135 @@
+"""Template fragment cache and Jinja bytecode cache.
+
+``{% cache key, deps %}...{% endcache %}`` renders its body once and reuses
+the HTML while nothing it depends on changes. ``key`` names the fragment
+(any hashable value), ``deps`` lists the tables it reads. The cache key
+also holds the user's role, the request's query string (pager links carry
+every section's cursor) and the current ``table_versions`` of ``deps``, so
+any write to one of those tables leads to a fresh render. Entries are
+kept per process in an LRU of ``FRAGMENT_CACHE_SIZE`` fragments.
+
+For the body's queries to be skipped on a hit too, views pass the data as
+``Deferred`` values, which only run their query when the template uses them.
+
+Compiled templates are stored under ``JINJA_BYTECODE_CACHE_DIR``, so a new
+worker loads bytecode rather than compiling every template again.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from flask import has_request_context, request
+from flask_login import current_user
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from conditional import current_table_versions
+
+DEFAULT_SIZE = 256
+
+
+class Deferred:
+    """Stand-in for ``func(*args, **kwargs)``, computed on first use in a template."""
+    __slots__ = ('_func', '_args', '_kwargs', '_value', '_loaded')
+
+    def __init__(self, func, *args, **kwargs):
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._value = None
+        self._loaded = False
+
+    def get(self):
+        if not self._loaded:
+            self._value = self._func(*self._args, **self._kwargs)
+            self._loaded = True
+        return self._value
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __iter__(self):
+        return iter(self.get())
+
+    def __len__(self):
+        return len(self.get())
+
+    def __bool__(self):
+        return bool(self.get())
+
+    def __getitem__(self, key):
+        return self.get()[key]
+
+
+class FragmentCache:
+    def __init__(self, max_size=DEFAULT_SIZE):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(()))
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render_cached', args), [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, key, deps, caller):
+        if not has_request_context():
+            return caller()
+        if isinstance(deps, str):
+            deps = (deps,)
+        versions = current_table_versions()
+        role = current_user.role if current_user.is_authenticated else None
+        cache_key = (key, role, request.query_string,
+                     tuple((table, versions.get(table, 0)) for table in deps))
+        cache = self.environment.fragment_cache
+        html = cache.get(cache_key)
+        if html is None:
+            html = str(caller())
+            cache.put(cache_key, html)
+        return Markup(html)
+
+
+def warm_templates(app):
+    """Compile every template now (e.g. in the gunicorn master, before forking)."""
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+
+def init_fragment_cache(app):
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache.max_size = app.config.get('FRAGMENT_CACHE_SIZE', DEFAULT_SIZE)
+    directory = app.config.get('JINJA_BYTECODE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
@@ -0,0 +1,82 @@
+"""Gunicorn settings for the web process (``gunicorn -c gunicorn.conf.py app:app``).
+
+Workers are threaded (``gthread``) by default so a request blocked on
+MySQL or a PDF download does not hold up the whole worker;
+``GUNICORN_WORKER_CLASS=gevent`` also works when gevent is installed
+(PyMySQL is pure Python and becomes cooperative once gevent patches sockets).
+The app is loaded once in the master and forked; each worker then drops
+the inherited pool and opens its own connections before taking traffic.
+"""
+import os
+
+from sqlalchemy import text
+
+from config import DEFAULT_THREADS, env_bool, env_int
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = env_int('WEB_CONCURRENCY', 2)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = env_int('GUNICORN_THREADS', DEFAULT_THREADS)
+worker_connections = env_int('GUNICORN_WORKER_CONNECTIONS', 100)
+timeout = env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+# Recycle workers now and then so slow leaks (WeasyPrint, fonts) cannot build up
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+preload_app = env_bool('GUNICORN_PRELOAD', True)
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+
+def on_starting(server):
+    from app import app
+    # Fingerprint and precompress static files once, in the master; workers
+    # forked from it (or loading the app after this) use the new manifest
+    if env_bool('ASSETS_BUILD_ON_START', True):
+        from assets import build_assets
+        manifest = build_assets(app)
+        server.log.info(f"Built {len(manifest['files'])} static asset(s), version {manifest['version']}")
+    # Compile templates here too: forked workers inherit them, recycled ones
+    # load them from the bytecode cache
+    from fragment_cache import warm_templates
+    warm_templates(app)
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared between processes:
+    # forget them without closing the sockets the parent may still own
+    from app import app
+    from models import db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    # Keep the exited worker's counters in the aggregate file and drop its own
+    from app import app
+    from instrumentation import fold_exited
+    with app.app_context():
+        fold_exited({worker.pid})
+
+
+def post_worker_init(worker):
+    """Open connections up front so the first requests after a deploy skip the TLS handshake."""
+    from app import app
+    from models import db
+    count = app.config.get('DB_WARMUP_CONNECTIONS', 0)
+    if count <= 0:
+        return
+    with app.app_context():
+        connections = []
+        try:
+            for _ in range(count):
+                connection = db.engine.connect()
+                connections.append(connection)
+                connection.execute(text('SELECT 1'))
+        except Exception as e:
+            worker.log.warning(f"Database warmup failed: {e}")
+        finally:
+            # Back into the pool, where they stay open for the first requests
+            for connection in connections:
+                connection.close()
+    worker.log.info(f"Worker {worker.pid} warmed up {len(connections)} database connection(s)")
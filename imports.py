@@ -0,0 +1,161 @@
+"""Bulk CSV import of ledger entries, sales and stock movements.
+
+Each row is validated with the same form class as the matching record page,
+then valid rows are written ``CHUNK_SIZE`` at a time. A chunk is one
+multi-row INSERT plus one grouped rollup update, committed together so the
+read models always match the raw tables. If a chunk fails to commit, it is
+rolled back and its rows are reported; earlier chunks stay imported.
+"""
+import csv
+from datetime import datetime
+
+from werkzeug.datastructures import MultiDict
+
+from forms import IncomeExpenseForm, SaleForm, StockForm
+from models import db, IncomeExpense, Sale, Stock
+from products import assign_product_ids
+from query_budget import allow_queries
+from rollups import record_ledger_entries, record_sale_entries, record_stock_movements
+
+CHUNK_SIZE = 500
+# Statements a chunk runs besides its rollup groups (product lookup, insert,
+# version bumps, live event, commit); the query budget allows them per chunk
+CHUNK_QUERIES = 8
+# Rows listed in the error report; later failures are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+def _midnight(form):
+    return datetime.combine(form.date.data, datetime.min.time())
+
+
+def _income_expense_values(form, user_id):
+    return {'date': _midnight(form), 'description': form.description.data, 'amount': form.amount.data,
+            'type': form.type.data, 'user_id': user_id}
+
+
+def _sale_values(form, user_id):
+    return {'date': _midnight(form), 'product': form.product.data, 'quantity': form.quantity.data,
+            'unit_price': form.unit_price.data, 'total': form.quantity.data * form.unit_price.data,
+            'user_id': user_id}
+
+
+def _stock_values(form, user_id):
+    return {'date': _midnight(form), 'product': form.product.data, 'quantity_in': form.quantity_in.data or 0,
+            'quantity_out': form.quantity_out.data or 0, 'user_id': user_id}
+
+
+# table: (model, form, CSV columns, required columns, row builder, rollup update)
+IMPORTS = {
+    'income_expenses': (IncomeExpense, IncomeExpenseForm, ['date', 'description', 'amount', 'type'],
+                        ['date', 'description', 'amount', 'type'], _income_expense_values, record_ledger_entries),
+    'sales': (Sale, SaleForm, ['date', 'product', 'quantity', 'unit_price'],
+              ['date', 'product', 'quantity', 'unit_price'], _sale_values, record_sale_entries),
+    'stocks': (Stock, StockForm, ['date', 'product', 'quantity_in', 'quantity_out'],
+               ['date', 'product'], _stock_values, record_stock_movements),
+}
+
+# The role whose record page writes each table
+IMPORT_ROLES = {
+    'income_expenses': 'accounting',
+    'sales': 'agent_commercial',
+    'stocks': 'stock',
+}
+
+
+class ImportResult:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.chunks = 0
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def to_dict(self):
+        return {
+            'success': self.failed == 0,
+            'dry_run': self.dry_run,
+            'rows': self.rows,
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+def validate_row(table, data, user_id):
+    """Check ``data`` (column name to text) with the table's form.
+
+    Returns ``(values, None)`` with the column values to insert, or
+    ``(None, errors)`` with the form's errors.
+    """
+    _, form_class, columns, _, build, _ = IMPORTS[table]
+    # Blank cells are left out so optional fields fall back to their form default
+    formdata = MultiDict((name, str(value).strip()) for name, value in data.items()
+                         if name in columns and value is not None and str(value).strip())
+    form = form_class(formdata=formdata, meta={'csrf': False})
+    if not form.validate():
+        return None, form.errors
+    return build(form, user_id), None
+
+
+def insert_rows(table, rows):
+    """Insert validated rows and update the rollups, in the caller's transaction."""
+    model, _, _, _, _, record = IMPORTS[table]
+    if 'product' in IMPORTS[table][2]:
+        # Product names become ids, creating the products seen for the first time
+        assign_product_ids(rows)
+    db.session.execute(db.insert(model), rows)
+    record(rows)
+
+
+def _write_chunk(table, chunk, result):
+    if result.chunks:
+        allow_queries(CHUNK_QUERIES)
+    result.chunks += 1
+    rows = [values for _, values in chunk]
+    try:
+        insert_rows(table, rows)
+        db.session.commit()
+        result.imported += len(rows)
+    except Exception as e:
+        db.session.rollback()
+        for line, _ in chunk:
+            result.add_error(line, {'database': [str(e)[:200]]})
+
+
+def import_csv(table, stream, user_id, dry_run=False, chunk_size=CHUNK_SIZE):
+    """Import the CSV text ``stream`` into ``table`` on behalf of ``user_id``.
+
+    Raises ``ValueError`` if the header lacks a required column.
+    """
+    required = IMPORTS[table][3]
+    reader = csv.DictReader(stream)
+    header = [name.strip() for name in reader.fieldnames or []]
+    missing = [column for column in required if column not in header]
+    if missing:
+        raise ValueError(f"Colonnes manquantes : {', '.join(missing)}")
+    reader.fieldnames = header
+
+    result = ImportResult(dry_run)
+    chunk = []
+    for row in reader:
+        result.rows += 1
+        values, errors = validate_row(table, row, user_id)
+        if errors:
+            result.add_error(reader.line_num, errors)
+            continue
+        if dry_run:
+            continue
+        chunk.append((reader.line_num, values))
+        if len(chunk) >= chunk_size:
+            _write_chunk(table, chunk, result)
+            chunk = []
+    if chunk:
+        _write_chunk(table, chunk, result)
+    return result
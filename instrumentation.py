@@ -0,0 +1,340 @@
+"""Request and SQL instrumentation exposed in Prometheus text format.
+
+Each process (gunicorn worker, report worker) keeps its own counters and
+histograms and periodically writes them to ``METRICS_DIR/metrics-<pid>-<token>.json``.
+The ``/metrics`` endpoint merges every file, so the numbers cover all
+workers whichever one serves the scrape. Queries slower than
+``SLOW_QUERY_THRESHOLD_MS`` are logged with their route.
+
+Files of processes that exited (recycled workers, finished report
+workers) are added to ``metrics-aggregate.json`` and deleted, by the
+gunicorn master when a worker exits and by every scrape, so the counters
+keep their totals while the directory stays one file per live process.
+The fold and the scrape's reads hold a lock on ``metrics.lock``, so a
+scrape never counts a file twice.
+"""
+import atexit
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context, request, request_finished, request_started
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    'savane_http_requests_total': ('counter', 'HTTP requests by route, method and status.'),
+    'savane_http_request_duration_seconds': ('histogram', 'HTTP request latency by route.'),
+    'savane_sql_queries_total': ('counter', 'SQL statements executed, by route.'),
+    'savane_sql_query_duration_seconds': ('histogram', 'SQL statement latency, by route.'),
+    'savane_sql_rows_total': ('counter', 'Rows returned or affected as reported by the driver, by route.'),
+    'savane_sql_slow_queries_total': ('counter', 'SQL statements over SLOW_QUERY_THRESHOLD_MS, by route.'),
+    'savane_report_render_seconds': ('histogram', 'WeasyPrint PDF render time.'),
+    'savane_report_rows_total': ('counter', 'Rows rendered into PDF reports.'),
+}
+
+DEFAULT_SLOW_QUERY_THRESHOLD_MS = 200
+DEFAULT_FLUSH_INTERVAL = 1.0
+AGGREGATE_FILE = 'metrics-aggregate.json'
+LOCK_FILE = 'metrics.lock'
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            buckets = self.histograms.get(key)
+            if buckets is None:
+                # One slot per bucket, then +Inf, sum and count
+                buckets = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 3)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    buckets[i] += 1
+            buckets[-3] += 1
+            buckets[-2] += value
+            buckets[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+
+_registry = Registry()
+_owner_pid = os.getpid()
+_token = uuid.uuid4().hex[:8]
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+_metrics_dir = None
+
+
+def registry():
+    global _registry, _owner_pid, _token
+    # A forked worker starts from a clean registry and its own file
+    if os.getpid() != _owner_pid:
+        _registry = Registry()
+        _owner_pid = os.getpid()
+        _token = uuid.uuid4().hex[:8]
+    return _registry
+
+
+def _route():
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return 'background'
+
+
+def flush(force=False):
+    """Write this process's metrics to the shared directory (at most every flush interval)."""
+    global _last_flush
+    if _metrics_dir is None:
+        return
+    # Request threads finish together; one writes, the others skip unless forced
+    if not _flush_lock.acquire(blocking=force):
+        return
+    try:
+        now = time.monotonic()
+        if not force and now - _last_flush < DEFAULT_FLUSH_INTERVAL:
+            return
+        _last_flush = now
+        snapshot = registry().snapshot()
+        path = os.path.join(_metrics_dir, f'metrics-{os.getpid()}-{_token}.json')
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=_metrics_dir, prefix=f'metrics-{os.getpid()}-', suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            if tmp_path:
+                _remove(tmp_path)
+    finally:
+        _flush_lock.release()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+@contextmanager
+def _locked(exclusive):
+    with open(os.path.join(_metrics_dir, LOCK_FILE), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _file_pid(name):
+    # metrics-<pid>-<token>.json, or a temporary file of <pid>; None for the aggregate
+    parts = name.split('-')
+    if len(parts) < 3 or parts[0] != 'metrics':
+        return None
+    try:
+        return int(parts[1])
+    except ValueError:
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(snapshot, counters, histograms):
+    for metric, labels, value in snapshot['counters']:
+        key = (metric, tuple(tuple(label) for label in labels))
+        counters[key] = counters.get(key, 0) + value
+    for metric, labels, values in snapshot['histograms']:
+        key = (metric, tuple(tuple(label) for label in labels))
+        merged = histograms.setdefault(key, [0] * len(values))
+        for i, value in enumerate(values):
+            merged[i] += value
+
+
+def fold_exited(pids=None):
+    """Add the files of processes that exited to the aggregate file and delete them.
+
+    ``pids`` limits this to those processes (gunicorn knows which worker
+    exited); by default every file whose process is gone is folded.
+    Returns the number of files folded.
+    """
+    if _metrics_dir is None:
+        return 0
+    with _locked(exclusive=True):
+        exited = []
+        for name in os.listdir(_metrics_dir):
+            pid = _file_pid(name)
+            if pid is None or pid == os.getpid() or (pids is not None and pid not in pids):
+                continue
+            if pids is None and _pid_alive(pid):
+                continue
+            exited.append(name)
+        folded = [name for name in exited if name.endswith('.json')]
+        if folded:
+            counters, histograms = {}, {}
+            aggregate_path = os.path.join(_metrics_dir, AGGREGATE_FILE)
+            for path in [aggregate_path] + [os.path.join(_metrics_dir, name) for name in folded]:
+                snapshot = _read(path)
+                if snapshot is not None:
+                    _merge(snapshot, counters, histograms)
+            fd, tmp_path = tempfile.mkstemp(dir=_metrics_dir, prefix='aggregate-', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump({
+                        'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+                        'histograms': [[name, list(labels), values]
+                                       for (name, labels), values in histograms.items()],
+                    }, f)
+                os.replace(tmp_path, aggregate_path)
+            except OSError:
+                _remove(tmp_path)
+                return 0
+        # Temporary files of a process killed while flushing go too
+        for name in exited:
+            _remove(os.path.join(_metrics_dir, name))
+        return len(folded)
+
+
+def collect():
+    """Merge the metric files of every process, folding those of exited ones first."""
+    flush(force=True)
+    fold_exited()
+    counters, histograms = {}, {}
+    with _locked(exclusive=False):
+        for name in os.listdir(_metrics_dir):
+            if not (name.startswith('metrics-') and name.endswith('.json')):
+                continue
+            snapshot = _read(os.path.join(_metrics_dir, name))
+            if snapshot is not None:
+                _merge(snapshot, counters, histograms)
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def render_prometheus():
+    counters, histograms = collect()
+    lines = []
+    for metric, (kind, help_text) in HELP.items():
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} {kind}')
+        if kind == 'counter':
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f'{metric}{_format_labels(labels)} {value}')
+        else:
+            for (name, labels), values in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                for bound, value in zip(LATENCY_BUCKETS, values):
+                    lines.append(f'{metric}_bucket{_format_labels(labels, [("le", bound)])} {value}')
+                lines.append(f'{metric}_bucket{_format_labels(labels, [("le", "+Inf")])} {values[-3]}')
+                lines.append(f'{metric}_sum{_format_labels(labels)} {values[-2]}')
+                lines.append(f'{metric}_count{_format_labels(labels)} {values[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def observe_report_render(seconds, rows):
+    registry().observe('savane_report_render_seconds', {}, seconds)
+    registry().inc('savane_report_rows_total', {}, rows)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_times', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_start_times')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    route = _route()
+    metrics = registry()
+    metrics.inc('savane_sql_queries_total', {'route': route})
+    metrics.observe('savane_sql_query_duration_seconds', {'route': route}, elapsed)
+    # MySQL reports the size of a buffered SELECT result here; SQLite reports -1
+    if cursor.rowcount is not None and cursor.rowcount >= 0:
+        metrics.inc('savane_sql_rows_total', {'route': route}, cursor.rowcount)
+
+    threshold_ms = DEFAULT_SLOW_QUERY_THRESHOLD_MS
+    if has_app_context():
+        threshold_ms = current_app.config.get('SLOW_QUERY_THRESHOLD_MS', threshold_ms)
+    if elapsed * 1000 >= threshold_ms:
+        metrics.inc('savane_sql_slow_queries_total', {'route': route})
+        if has_app_context():
+            current_app.logger.warning(f"Slow query ({elapsed * 1000:.0f} ms) in {route}: {statement}")
+
+
+def _on_request_started(sender, **extra):
+    g.instrumentation_start = time.perf_counter()
+
+
+def _on_request_finished(sender, response, **extra):
+    started = g.get('instrumentation_start')
+    if started is None:
+        return
+    route = _route()
+    metrics = registry()
+    metrics.inc('savane_http_requests_total', {
+        'route': route, 'method': request.method, 'status': str(response.status_code)
+    })
+    metrics.observe('savane_http_request_duration_seconds', {'route': route, 'method': request.method},
+                    time.perf_counter() - started)
+    flush()
+
+
+def init_instrumentation(app):
+    global _metrics_dir
+    _metrics_dir = app.config.get('METRICS_DIR') or os.path.join(app.instance_path, 'metrics')
+    os.makedirs(_metrics_dir, exist_ok=True)
+    request_started.connect(_on_request_started, app)
+    request_finished.connect(_on_request_finished, app)
+    atexit.register(flush, force=True)
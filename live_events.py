@@ -0,0 +1,337 @@
+"""Live feed of ledger entries, sales and stock movements (Server-Sent Events).
+
+Every commit that adds or deletes rows of ``income_expenses``, ``sales`` or
+``stocks`` writes one ``live_events`` row per change in the same transaction,
+so an event exists exactly when its change was committed. Bulk writes
+(imports, offline sync, user deletion) write a single ``changed`` event for
+the table instead. The event's id is the SSE id: a browser that reconnects
+sends ``Last-Event-ID`` and is replayed what it missed from the table.
+
+Each worker process runs one feed thread that reads new events for all the
+streams it serves and fans them out to per-stream queues, so the database
+sees one small query per worker rather than one per open dashboard. A commit
+that wrote events touches a signal file (see signal_files), which wakes
+the feed threads of every worker on the host; other hosts pick the events up
+on the ``LIVE_POLL_SECONDS`` poll.
+
+Under the gthread worker each open stream holds a thread, so a worker serves
+at most ``LIVE_MAX_STREAMS`` of them; extra clients are told to retry later.
+Streams end after ``LIVE_STREAM_SECONDS`` and the browser reconnects, which
+frees threads and resumes from ``Last-Event-ID``.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import Response, has_request_context
+from flask_login import current_user
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from dashboard_api import SERIALIZERS
+from models import db, IncomeExpense, LiveEvent, Sale
+from signal_files import signal_state, touch_signal
+
+LIVE_TABLES = ('income_expenses', 'sales', 'stocks')
+# Tables each role's live view follows
+LIVE_ROLES = {
+    'chef_commercial': ('sales',),
+    'management': ('income_expenses', 'sales', 'stocks'),
+}
+# More row changes than this in one commit are sent as one 'changed' event
+MAX_ROW_EVENTS = 50
+REPLAY_LIMIT = 500
+QUEUE_SIZE = 1000
+POLL_BATCH = 500
+HEARTBEAT_SECONDS = 15
+SIGNAL_CHECK_SECONDS = 0.25
+# A skipped id is a transaction still in flight, or one rolled back; stop waiting after this
+GAP_TIMEOUT_SECONDS = 30
+PRUNE_INTERVAL_SECONDS = 3600
+BUSY_RETRY_MS = 15000
+RECONNECT_MS = 3000
+
+
+# Column naming the row's author in the dashboards that show one
+USER_NAME_FIELDS = {Sale: 'agent', IncomeExpense: 'user'}
+
+
+def _row_payload(obj):
+    row = SERIALIZERS[type(obj)](obj)
+    field = USER_NAME_FIELDS.get(type(obj))
+    if field:
+        # Only name the author when that costs no query: the user is loaded or is the writer
+        user = obj.__dict__.get('user')
+        if user is None and has_request_context() and current_user.is_authenticated \
+                and current_user.id == obj.user_id:
+            user = current_user
+        row[field] = user.full_name if user is not None else None
+    return row
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    # Ids are assigned by now; new/deleted still list what this flush wrote
+    for action, objects in (('created', session.new), ('deleted', session.deleted)):
+        for obj in objects:
+            if type(obj) in SERIALIZERS:
+                session.info.setdefault('live_changes', []).append(
+                    (obj.__tablename__, action, _row_payload(obj)))
+
+
+@event.listens_for(Session, 'before_commit')
+def _write_events(session):
+    if session.in_nested_transaction():
+        return
+    # Assign ids to rows still pending, which also collects their changes
+    session.flush()
+    changes = session.info.pop('live_changes', [])
+    tables = session.info.pop('changed_tables', set())
+    by_table = {}
+    for table, action, row in changes:
+        by_table.setdefault(table, []).append((action, row))
+
+    now = datetime.utcnow()
+    events = []
+    for table in LIVE_TABLES:
+        rows = by_table.get(table, [])
+        if len(rows) > MAX_ROW_EVENTS or (not rows and table in tables):
+            # Bulk write: clients fetch or reload instead of applying rows one by one
+            events.append(LiveEvent(table_name=table, action='changed', payload='{}', created_at=now))
+            continue
+        for action, row in rows:
+            events.append(LiveEvent(table_name=table, action=action, payload=json.dumps(row), created_at=now))
+    if events:
+        session.add_all(events)
+        session.info['live_events_written'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_after_commit(session):
+    if session.info.pop('live_events_written', False):
+        feed.notify()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_after_rollback(session):
+    for key in ('live_changes', 'changed_tables', 'live_events_written'):
+        session.info.pop(key, None)
+
+
+def _event_dict(row):
+    return {'id': row.id, 'table': row.table_name, 'action': row.action, 'row': json.loads(row.payload)}
+
+
+def _format(event_dict):
+    return f"id: {event_dict['id']}\ndata: {json.dumps(event_dict)}\n\n"
+
+
+class Subscription(queue.Queue):
+    def __init__(self, tables):
+        super().__init__(maxsize=QUEUE_SIZE)
+        self.tables = tables
+        # Set when the stream fell too far behind; the client reloads
+        self.overflowed = False
+
+
+class LiveFeed:
+    """One per worker process: reads new events and fans them out to its streams."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.subscribers = set()
+        self.thread = None
+        self.pid = None
+        self.app = None
+        self.signal_file = None
+        self.last_id = 0
+        self.gaps = {}
+
+    def configure(self, app, signal_file):
+        self.app = app
+        self.signal_file = signal_file
+
+    def _signal_state(self):
+        if not self.signal_file:
+            return None
+        return signal_state(self.signal_file)
+
+    def notify(self):
+        """Wake this worker's feed thread, and through the signal file the others on the host."""
+        self.wakeup.set()
+        if self.signal_file:
+            touch_signal(self.signal_file)
+
+    def subscribe(self, tables, max_streams):
+        """Register a stream; returns None when this worker already serves ``max_streams``."""
+        with self.lock:
+            if self.pid != os.getpid():
+                # Forked: the parent's thread and streams do not exist here
+                self.pid = os.getpid()
+                self.subscribers = set()
+                self.thread = None
+            if len(self.subscribers) >= max_streams:
+                return None
+            if self.thread is None:
+                # Events committed before this point are the caller's replay, not ours
+                self.last_id = db.session.query(func.max(LiveEvent.id)).scalar() or 0
+                self.gaps = {}
+                self.thread = threading.Thread(target=self._run, name='live-feed', daemon=True)
+                self.thread.start()
+            subscription = Subscription(tables)
+            self.subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def publish(self, events):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            for event_dict in events:
+                if event_dict['table'] not in subscription.tables:
+                    continue
+                try:
+                    subscription.put_nowait(event_dict)
+                except queue.Full:
+                    subscription.overflowed = True
+                    break
+
+    def _read_new(self):
+        now = time.monotonic()
+        rows = LiveEvent.query.filter(LiveEvent.id > self.last_id).order_by(LiveEvent.id).limit(POLL_BATCH).all()
+        self.gaps = {gap: since for gap, since in self.gaps.items() if now - since < GAP_TIMEOUT_SECONDS}
+        if self.gaps:
+            rows += LiveEvent.query.filter(LiveEvent.id.in_(list(self.gaps))).all()
+        for row in rows:
+            if row.id > self.last_id:
+                # Ids skipped on the way may belong to transactions that commit later
+                for missing in range(self.last_id + 1, row.id):
+                    self.gaps.setdefault(missing, now)
+                self.last_id = row.id
+            else:
+                self.gaps.pop(row.id, None)
+        return [_event_dict(row) for row in rows]
+
+    def _prune(self):
+        hours = self.app.config.get('LIVE_RETENTION_HOURS', 24)
+        LiveEvent.query.filter(LiveEvent.created_at < datetime.utcnow() - timedelta(hours=hours)).delete(
+            synchronize_session=False)
+        db.session.commit()
+
+    def _run(self):
+        poll_seconds = self.app.config.get('LIVE_POLL_SECONDS', 2)
+        signal_state = self._signal_state()
+        next_poll = next_prune = 0
+        while True:
+            with self.lock:
+                if not self.subscribers or self.pid != os.getpid():
+                    self.thread = None
+                    return
+            woken = self.wakeup.wait(SIGNAL_CHECK_SECONDS)
+            self.wakeup.clear()
+            state = self._signal_state()
+            now = time.monotonic()
+            if not (woken or state != signal_state or now >= next_poll):
+                continue
+            signal_state = state
+            next_poll = now + poll_seconds
+            try:
+                with self.app.app_context():
+                    events = self._read_new()
+                    if now >= next_prune:
+                        next_prune = now + PRUNE_INTERVAL_SECONDS
+                        self._prune()
+            except Exception as e:
+                self.app.logger.error(f"Live feed poll failed: {e}")
+                continue
+            if events:
+                self.publish(events)
+
+
+feed = LiveFeed()
+
+
+def replay(tables, last_event_id):
+    """Events after ``last_event_id`` for ``tables``, or None when the client must reload."""
+    oldest = db.session.query(func.min(LiveEvent.id)).scalar()
+    if oldest is not None and last_event_id < oldest - 1:
+        # Pruned since the client last saw the feed
+        return None
+    rows = LiveEvent.query.filter(
+        LiveEvent.id > last_event_id,
+        LiveEvent.table_name.in_(tables)
+    ).order_by(LiveEvent.id).limit(REPLAY_LIMIT + 1).all()
+    if len(rows) > REPLAY_LIMIT:
+        return None
+    return [_event_dict(row) for row in rows]
+
+
+def latest_event_id():
+    """Id of the newest event, for pages to start their stream from."""
+    return db.session.query(func.max(LiveEvent.id)).scalar() or 0
+
+
+def _parse_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def open_stream(app, tables, last_event_id=None):
+    """The ``text/event-stream`` response for one live view."""
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    subscription = feed.subscribe(tables, app.config.get('LIVE_MAX_STREAMS', 2))
+    if subscription is None:
+        # EventSource gives up on an error status, so answer 200 and ask it to come back later
+        return Response(f'retry: {BUSY_RETRY_MS}\n\n', mimetype='text/event-stream', headers=headers)
+
+    # Subscribed first, so nothing committed during the replay is missed
+    last_event_id = _parse_event_id(last_event_id)
+    missed = [] if last_event_id is None else replay(tables, last_event_id)
+    # The stream outlives the request; give the connection back to the pool now
+    db.session.close()
+    stream_seconds = app.config.get('LIVE_STREAM_SECONDS', 300)
+
+    def generate():
+        try:
+            yield f'retry: {RECONNECT_MS}\n\n'
+            if missed is None:
+                yield 'event: reset\ndata: {}\n\n'
+                return
+            sent = {event_dict['id'] for event_dict in missed}
+            for event_dict in missed:
+                yield _format(event_dict)
+            deadline = time.monotonic() + stream_seconds
+            while time.monotonic() < deadline:
+                try:
+                    event_dict = subscription.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    # Keeps proxies from closing an idle stream and notices gone clients
+                    yield ': ping\n\n'
+                    continue
+                if subscription.overflowed:
+                    yield 'event: reset\ndata: {}\n\n'
+                    return
+                if event_dict['id'] in sent:
+                    continue
+                yield _format(event_dict)
+        finally:
+            feed.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers=headers)
+
+
+def init_live_events(app):
+    signal_file = app.config.get('LIVE_SIGNAL_FILE')
+    if signal_file is None:
+        os.makedirs(app.instance_path, exist_ok=True)
+        signal_file = os.path.join(app.instance_path, 'live_events.signal')
+    feed.configure(app, signal_file or None)
@@ -0,0 +1,412 @@
+"""Management: users, PDF reports, deletions, the overview dashboard and metrics."""
+import os
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from flask import (Blueprint, Response, abort, current_app, flash, jsonify, redirect, render_template, request,
+                   send_file, url_for)
+from flask_login import current_user, login_required
+from sqlalchemy.orm import joinedload
+
+from conditional import conditional_get
+from forms import EditUserForm, RegistrationForm
+from fragment_cache import Deferred
+from instrumentation import render_prometheus
+from live_events import latest_event_id
+from models import (db, User, IncomeExpense, Sale, Stock, IncomeExpenseArchive, SaleArchive, StockArchive, ReportJob,
+                    SyncSubmission)
+from pagination import keyset_paginate
+from query_budget import query_budget
+from read_models import ledger_rows, sale_rows, stock_rows
+import report_cache
+from reports import submit_report_job, report_filename
+from rollups import (remove_stock_movement, remove_stock_movements, get_stock_levels,
+                     remove_ledger_entry, remove_ledger_entries, ledger_totals,
+                     remove_sale_entry, remove_sale_entries, sales_totals, bump_table_version)
+from user_cache import invalidate_user
+
+bp = Blueprint('management', __name__)
+
+# Add user management route for management role
+@bp.route('/manage_users')
+@login_required
+@query_budget(2)
+def manage_users():
+    if current_user.role != 'management':
+        return render_template('unauthorized.html')
+    
+    users = User.query.all()
+    return render_template('manage_users.html', users=users)
+
+# Add route for creating new users (admin only)
+@bp.route('/create_user', methods=['GET', 'POST'])
+@login_required
+@query_budget(8)
+def create_user():
+    if current_user.role != 'management':
+        return render_template('unauthorized.html')
+    
+    form = RegistrationForm()
+    if form.validate_on_submit():
+        # Check if username already exists
+        if User.query.filter_by(username=form.username.data).first():
+            flash('Username already exists. Please choose a different one.', 'danger')
+            return render_template('create_user.html', form=form)
+        
+        # Create new user
+        user = User(
+            username=form.username.data,
+            full_name=form.full_name.data,
+            department=form.department.data,
+            role=form.role.data  # Use the role field instead of department
+        )
+        user.set_password(form.password.data)
+        
+        db.session.add(user)
+        bump_table_version('users')
+        db.session.commit()
+        
+        flash('User created successfully!', 'success')
+        return redirect(url_for('management.manage_users'))
+    
+    return render_template('create_user.html', form=form)
+
+# Add user deletion route
+@bp.route("/delete_user/<int:user_id>", methods=["POST"])
+@login_required
+@query_budget(70)
+def delete_user(user_id):
+    if current_user.role != 'management':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    user_to_delete = User.query.get_or_404(user_id)
+    
+    # Prevent self-deletion
+    if user_to_delete.id == current_user.id:
+        flash('You cannot delete your own account.', 'danger')
+        return redirect(url_for('management.manage_users'))
+    
+    # Prevent deletion of the default admin account
+    if user_to_delete.username == 'administrator':
+        flash('Cannot delete the default administrator account.', 'danger')
+        return redirect(url_for('management.manage_users'))
+    
+    try:
+        # Delete all related records first
+        remove_ledger_entries(IncomeExpense.query.filter_by(user_id=user_id))
+        IncomeExpense.query.filter_by(user_id=user_id).delete()
+        remove_sale_entries(Sale.query.filter_by(user_id=user_id))
+        Sale.query.filter_by(user_id=user_id).delete()
+        remove_stock_movements(Stock.query.filter_by(user_id=user_id))
+        Stock.query.filter_by(user_id=user_id).delete()
+        # and their archived rows, from closed periods
+        remove_ledger_entries(IncomeExpenseArchive.query.filter_by(user_id=user_id), IncomeExpenseArchive)
+        IncomeExpenseArchive.query.filter_by(user_id=user_id).delete()
+        remove_sale_entries(SaleArchive.query.filter_by(user_id=user_id), SaleArchive)
+        SaleArchive.query.filter_by(user_id=user_id).delete()
+        remove_stock_movements(StockArchive.query.filter_by(user_id=user_id), StockArchive)
+        StockArchive.query.filter_by(user_id=user_id).delete()
+        ReportJob.query.filter_by(user_id=user_id).delete()
+        SyncSubmission.query.filter_by(user_id=user_id).delete()
+        
+        # Now delete the user
+        db.session.delete(user_to_delete)
+        bump_table_version('users')
+        db.session.commit()
+        invalidate_user(user_id)
+        flash('User deleted successfully.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error deleting user: {str(e)}', 'danger')
+    
+    return redirect(url_for('management.manage_users'))
+
+# Add route for editing users (admin only)
+@bp.route('/edit_user/<int:user_id>', methods=['GET', 'POST'])
+@login_required
+@query_budget(8)
+def edit_user(user_id):
+    if current_user.role != 'management':
+        return render_template('unauthorized.html')
+    
+    user = User.query.get_or_404(user_id)
+    form = EditUserForm(obj=user)
+    
+    if form.validate_on_submit():
+        # Update user details
+        user.username = form.username.data
+        user.full_name = form.full_name.data
+        user.department = form.department.data
+        user.role = form.role.data  # Update role field
+        
+        # Update password if provided
+        if form.password.data:
+            user.set_password(form.password.data)
+        
+        bump_table_version('users')
+        db.session.commit()
+        invalidate_user(user.id)
+        flash('User updated successfully!', 'success')
+        return redirect(url_for('management.manage_users'))
+    
+    return render_template('edit_user.html', form=form, user=user)
+
+# Add route for date selection form
+@bp.route('/select_report_dates', methods=['GET', 'POST'])
+@login_required
+@query_budget(1)
+def select_report_dates():
+    if current_user.role != 'management':
+        return render_template('unauthorized.html')
+    
+    if request.method == 'POST':
+        start_date_str = request.form.get('start_date')
+        end_date_str = request.form.get('end_date')
+        
+        try:
+            start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
+            end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
+            
+            if start_date > end_date:
+                flash('La date de début doit être antérieure à la date de fin.', 'danger')
+                return render_template('select_report_dates.html')
+            
+            return redirect(url_for('management.download_report', start_date=start_date_str, end_date=end_date_str))
+            
+        except ValueError:
+            flash('Format de date invalide. Utilisez le format AAAA-MM-JJ.', 'danger')
+    
+    # Set default dates (last 7 days)
+    default_end_date = datetime.now()
+    default_start_date = default_end_date - timedelta(days=7)
+    
+    return render_template('select_report_dates.html', 
+                          default_start_date=default_start_date.strftime('%Y-%m-%d'),
+                          default_end_date=default_end_date.strftime('%Y-%m-%d'))
+
+# Add route for downloading PDF report with custom date range
+@bp.route('/download_report')
+@login_required
+@query_budget(6)
+def download_report():
+    if current_user.role != 'management':
+        return render_template('unauthorized.html')
+    
+    # Get date range from query parameters
+    start_date_str = request.args.get('start_date')
+    end_date_str = request.args.get('end_date')
+    
+    if not start_date_str or not end_date_str:
+        flash('Veuillez sélectionner une plage de dates.', 'danger')
+        return redirect(url_for('management.select_report_dates'))
+    
+    try:
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+    except ValueError:
+        flash('Format de date invalide.', 'danger')
+        return redirect(url_for('management.select_report_dates'))
+    
+    # Closed periods that were already rendered are sent straight from the cache
+    cached = report_cache.lookup(start_date, end_date)
+    if cached:
+        return send_file(
+            cached,
+            as_attachment=True,
+            download_name=report_filename(start_date, end_date),
+            mimetype='application/pdf'
+        )
+    
+    # Otherwise the report worker renders it; follow its progress on the job page
+    job = submit_report_job(start_date, end_date, current_user.id)
+    return redirect(url_for('management.report_job', job_id=job.id))
+
+# Submit a report job from scripts or AJAX; returns the job id and its URLs
+@bp.route('/reports', methods=['POST'])
+@login_required
+@query_budget(6)
+def submit_report():
+    if current_user.role != 'management':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    data = request.get_json(silent=True) or request.form
+    try:
+        start_date = datetime.strptime(data.get('start_date', ''), '%Y-%m-%d').date()
+        end_date = datetime.strptime(data.get('end_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid date, use YYYY-MM-DD'}), 400
+    
+    if start_date > end_date:
+        return jsonify({'success': False, 'message': 'start_date must be before end_date'}), 400
+    
+    job = submit_report_job(start_date, end_date, current_user.id)
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status_url': url_for('management.report_status', job_id=job.id),
+        'download_url': url_for('management.download_report_file', job_id=job.id)
+    }), 202
+
+@bp.route('/reports/<job_id>')
+@login_required
+@query_budget(2)
+def report_job(job_id):
+    if current_user.role != 'management':
+        return render_template('unauthorized.html')
+    
+    job = ReportJob.query.get_or_404(job_id)
+    return render_template('report_job.html', job=job)
+
+@bp.route('/reports/<job_id>/status')
+@login_required
+@query_budget(2)
+def report_status(job_id):
+    if current_user.role != 'management':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    job = ReportJob.query.get_or_404(job_id)
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'error': job.error,
+        'download_url': url_for('management.download_report_file', job_id=job.id) if job.status == 'done' else None
+    })
+
+@bp.route('/reports/<job_id>/download')
+@login_required
+@query_budget(8)
+def download_report_file(job_id):
+    if current_user.role != 'management':
+        return render_template('unauthorized.html')
+    
+    job = ReportJob.query.get_or_404(job_id)
+    if job.status != 'done':
+        abort(404)
+    
+    download_name = report_filename(job.start_date, job.end_date)
+    if job.file_path and os.path.exists(job.file_path):
+        return send_file(job.file_path, as_attachment=True, download_name=download_name,
+                         mimetype='application/pdf')
+    
+    # The worker's file is on another host (or was evicted): serve the copy stored on the job
+    if job.pdf is not None:
+        return send_file(BytesIO(job.pdf), as_attachment=True, download_name=download_name,
+                         mimetype='application/pdf')
+    
+    # Stored copy pruned, or a cache hit on another web host: render it once more.
+    # The new job stores its PDF, so this never sends the user round again
+    job = submit_report_job(job.start_date, job.end_date, current_user.id)
+    return redirect(url_for('management.report_job', job_id=job.id))
+
+# Add route for deleting financial records (admin only)
+@bp.route('/delete_income_expense/<int:record_id>', methods=['POST'])
+@login_required
+@query_budget(20)
+def delete_income_expense(record_id):
+    if current_user.role != 'management':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    record = IncomeExpense.query.get_or_404(record_id)
+    
+    try:
+        remove_ledger_entry(record)
+        db.session.delete(record)
+        db.session.commit()
+        return jsonify({'success': True, 'message': 'Record deleted successfully'})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Error deleting record: {str(e)}'}), 500
+
+# Add route for deleting sales records (admin only)
+@bp.route('/delete_sale/<int:sale_id>', methods=['POST'])
+@login_required
+@query_budget(20)
+def delete_sale(sale_id):
+    if current_user.role != 'management':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    sale = Sale.query.options(joinedload(Sale.product)).get_or_404(sale_id)
+    
+    try:
+        remove_sale_entry(sale)
+        db.session.delete(sale)
+        db.session.commit()
+        return jsonify({'success': True, 'message': 'Sale record deleted successfully'})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Error deleting sale record: {str(e)}'}), 500
+
+# Add route for deleting stock records (admin only)
+@bp.route('/delete_stock/<int:stock_id>', methods=['POST'])
+@login_required
+@query_budget(20)
+def delete_stock(stock_id):
+    if current_user.role != 'management':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    stock = Stock.query.options(joinedload(Stock.product)).get_or_404(stock_id)
+    
+    try:
+        remove_stock_movement(stock)
+        db.session.delete(stock)
+        db.session.commit()
+        return jsonify({'success': True, 'message': 'Stock record deleted successfully'})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Error deleting stock record: {str(e)}'}), 500
+
+@bp.route('/dashboard/management')
+@login_required
+@query_budget(10)
+@conditional_get('income_expenses', 'sales', 'stocks', 'users')
+def management_dashboard():
+    if current_user.role != 'management':
+        return render_template('unauthorized.html')
+    
+    # New rows are pushed over the live feed; read its position before the data so no row falls between
+    live_event_id = latest_event_id()
+    
+    # Financial data; the tables are Deferred so a cached fragment skips their queries
+    records = Deferred(keyset_paginate, ledger_rows(with_user=True), IncomeExpense, prefix='records_')
+    totals = ledger_totals()
+    total_income = totals['income']
+    total_expense = totals['expense']
+    balance = total_income - total_expense
+    
+    # Sales data
+    sales = Deferred(keyset_paginate, sale_rows(), Sale, prefix='sales_')
+    sales_summary = sales_totals()
+    total_sales = sales_summary['revenue']
+    total_quantity = sales_summary['quantity']
+    
+    # Stock data - recent movements, one page at a time
+    movements = Deferred(keyset_paginate, stock_rows(), Stock, prefix='movements_', default_per_page=20)
+    
+    # Available quantities for each product come from the balance table
+    products = Deferred(get_stock_levels)
+    
+    # User data
+    user_count = User.query.count()
+    
+    return render_template('dashboard_management.html', 
+                          total_income=total_income,
+                          total_expense=total_expense,
+                          balance=balance,
+                          total_sales=total_sales,
+                          total_quantity=total_quantity,
+                          products=products,
+                          sales=sales,
+                          records=records,
+                          user_count=user_count,
+                          live_event_id=live_event_id,
+                          movements=movements)  # Pass movements to template
+
+# Prometheus metrics for every worker; scrape with METRICS_TOKEN as a bearer token
+@bp.route('/metrics')
+def metrics():
+    token = current_app.config['METRICS_TOKEN']
+    authorized = token and request.headers.get('Authorization') == f'Bearer {token}'
+    if not authorized and not (current_user.is_authenticated and current_user.role == 'management'):
+        return render_template('unauthorized.html'), 403
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,317 @@
+"""Versioned schema migrations.
+
+Each migration is a function registered with ``@migration(version, name)``
+and runs once, in version order, inside an application context. Applied
+versions are recorded in the ``schema_migrations`` table. Migrations must
+be idempotent (``checkfirst``/inspector checks) because a fresh database
+created by ``db.create_all()`` already has the latest schema. A migration
+builds on the schema the versions before it left, so the first ones
+create the tables as they shipped (``_shipped``), not the current models.
+"""
+from datetime import datetime
+
+from sqlalchemy import MetaData, Table, column, func, inspect, table, text
+
+from models import db, Product
+
+MIGRATIONS = []
+
+schema_migrations = db.Table(
+    'schema_migrations',
+    db.Column('version', db.Integer, primary_key=True, autoincrement=False),
+    db.Column('name', db.String(100), nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False),
+)
+
+
+def migration(version, name):
+    def register(func):
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return register
+
+
+def applied_versions():
+    schema_migrations.create(db.engine, checkfirst=True)
+    rows = db.session.execute(db.select(schema_migrations.c.version)).all()
+    return {row.version for row in rows}
+
+
+def pending_migrations():
+    applied = applied_versions()
+    return [item for item in MIGRATIONS if item[0] not in applied]
+
+
+def upgrade(echo=print):
+    """Apply every pending migration in order; returns the versions applied."""
+    done = []
+    for version, name, func in pending_migrations():
+        echo(f'Applying migration {version:04d} {name}...')
+        func()
+        db.session.execute(schema_migrations.insert().values(
+            version=version, name=name, applied_at=datetime.utcnow()
+        ))
+        db.session.commit()
+        done.append(version)
+    return done
+
+
+def _create_tables(*names):
+    for name in names:
+        db.metadata.tables[name].create(db.engine, checkfirst=True)
+
+
+def _create_indexes(table_name):
+    table = db.metadata.tables[table_name]
+    existing = {index['name'] for index in inspect(db.engine).get_indexes(table_name)}
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(db.engine)
+
+
+# The tables as migrations 1 to 3 created them; later versions alter them,
+# so these never follow the models
+_shipped = MetaData()
+
+Table(
+    'users', _shipped,
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('username', db.String(80), unique=True, nullable=False),
+    db.Column('full_name', db.String(120), nullable=False),
+    db.Column('department', db.String(80), nullable=False),
+    db.Column('role', db.String(80), nullable=False),
+    db.Column('password_hash', db.String(200), nullable=False),
+)
+
+Table(
+    'income_expenses', _shipped,
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('date', db.DateTime, nullable=False),
+    db.Column('description', db.String(200), nullable=False),
+    db.Column('amount', db.Float, nullable=False),
+    db.Column('type', db.String(20), nullable=False),
+    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), nullable=False),
+    db.Index('ix_income_expenses_date_id', 'date', 'id'),
+    db.Index('ix_income_expenses_user_id_date', 'user_id', 'date'),
+    db.Index('ix_income_expenses_type_date', 'type', 'date'),
+)
+
+Table(
+    'sales', _shipped,
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('date', db.DateTime, nullable=False),
+    db.Column('product', db.String(100), nullable=False),
+    db.Column('quantity', db.Integer, nullable=False),
+    db.Column('unit_price', db.Float, nullable=False),
+    db.Column('total', db.Float, nullable=False),
+    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), nullable=False),
+    db.Index('ix_sales_date_id', 'date', 'id'),
+    db.Index('ix_sales_user_id_date', 'user_id', 'date'),
+    db.Index('ix_sales_product_date', 'product', 'date'),
+)
+
+Table(
+    'stocks', _shipped,
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('date', db.DateTime, nullable=False),
+    db.Column('product', db.String(100), nullable=False),
+    db.Column('quantity_in', db.Integer, default=0),
+    db.Column('quantity_out', db.Integer, default=0),
+    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), nullable=False),
+    db.Index('ix_stocks_date_id', 'date', 'id'),
+    db.Index('ix_stocks_user_id_date', 'user_id', 'date'),
+    db.Index('ix_stocks_product_date', 'product', 'date'),
+)
+
+Table(
+    'stock_balances', _shipped,
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('product', db.String(100), unique=True, nullable=False),
+    db.Column('quantity', db.Integer, nullable=False, default=0),
+    db.Column('movements', db.Integer, nullable=False, default=0),
+)
+
+Table(
+    'ledger_daily_totals', _shipped,
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('day', db.Date, nullable=False),
+    db.Column('type', db.String(20), nullable=False),
+    db.Column('total', db.Float, nullable=False, default=0),
+    db.Column('count', db.Integer, nullable=False, default=0),
+    db.UniqueConstraint('day', 'type', name='uq_ledger_daily_totals_day_type'),
+)
+
+Table(
+    'sales_daily', _shipped,
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('day', db.Date, nullable=False),
+    db.Column('product', db.String(100), nullable=False),
+    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), nullable=False),
+    db.Column('quantity', db.Integer, nullable=False, default=0),
+    db.Column('revenue', db.Float, nullable=False, default=0),
+    db.Column('count', db.Integer, nullable=False, default=0),
+    db.UniqueConstraint('day', 'product', 'user_id', name='uq_sales_daily_day_product_user'),
+    db.Index('ix_sales_daily_user_id_day', 'user_id', 'day'),
+)
+
+
+def _create_shipped_tables(*names):
+    for name in names:
+        _shipped.tables[name].create(db.engine, checkfirst=True)
+
+
+def _create_shipped_indexes(table_name):
+    # A database created by db.create_all() has the later columns already;
+    # indexes on columns it no longer has are left to the migration that
+    # replaced them
+    inspector = inspect(db.engine)
+    existing = {index['name'] for index in inspector.get_indexes(table_name)}
+    columns = {c['name'] for c in inspector.get_columns(table_name)}
+    for index in _shipped.tables[table_name].indexes:
+        if index.name not in existing and {c.name for c in index.columns} <= columns:
+            index.create(db.engine)
+
+
+@migration(1, 'base_tables')
+def _base_tables():
+    _create_shipped_tables('users', 'income_expenses', 'sales', 'stocks')
+
+
+@migration(2, 'read_models')
+def _read_models():
+    # Filled by migration 9, once the raw tables have the shape the rollups read
+    _create_shipped_tables('stock_balances', 'ledger_daily_totals', 'sales_daily')
+
+
+@migration(3, 'hot_query_indexes')
+def _hot_query_indexes():
+    # (date, id) for keyset pagination, (user_id, date) for per-agent lists,
+    # (product, date) and (type, date) for per-product / per-type ranges
+    for table_name in ('income_expenses', 'sales', 'stocks', 'sales_daily'):
+        _create_shipped_indexes(table_name)
+
+
+@migration(4, 'report_jobs')
+def _report_jobs():
+    _create_tables('report_jobs')
+
+
+@migration(5, 'day_versions')
+def _day_versions():
+    _create_tables('day_versions')
+
+
+@migration(6, 'sync_submissions')
+def _sync_submissions():
+    _create_tables('sync_submissions')
+
+
+@migration(7, 'table_versions')
+def _table_versions():
+    _create_tables('table_versions')
+
+
+@migration(8, 'live_events')
+def _live_events():
+    _create_tables('live_events')
+
+
+def _product_names():
+    # Every spelling used so far, with how many rows use it
+    counts = {}
+    for table_name in ('sales', 'stocks'):
+        raw = table(table_name, column('product'))
+        for name, count in db.session.execute(
+                db.select(raw.c.product, func.count()).group_by(raw.c.product)):
+            counts[name] = counts.get(name, 0) + count
+    return counts.items()
+
+
+def _drop_index(table_name, index_name):
+    if index_name not in {index['name'] for index in inspect(db.engine).get_indexes(table_name)}:
+        return
+    if db.engine.dialect.name == 'mysql':
+        db.session.execute(text(f'DROP INDEX {index_name} ON {table_name}'))
+    else:
+        db.session.execute(text(f'DROP INDEX {index_name}'))
+
+
+@migration(9, 'products')
+def _products():
+    from products import product_name_groups
+    from rollups import rebuild_stock_balances, rebuild_ledger_totals, rebuild_sales_daily
+
+    _create_tables('products')
+    dialect = db.engine.dialect.name
+    pending = [name for name in ('sales', 'stocks')
+               if 'product_id' not in {c['name'] for c in inspect(db.engine).get_columns(name)}]
+    if pending:
+        for table_name in pending:
+            # MySQL ignores an inline REFERENCES; its foreign key is added below
+            reference = '' if dialect == 'mysql' else ' REFERENCES products (id)'
+            db.session.execute(text(f'ALTER TABLE {table_name} ADD COLUMN product_id INTEGER{reference}'))
+
+        # One product per normalized name, called by its most used spelling
+        groups = product_name_groups(_product_names())
+        for normalized, (name, raws) in groups.items():
+            product = Product.query.filter_by(normalized_name=normalized).first()
+            if product is None:
+                product = Product(name=name, normalized_name=normalized)
+                db.session.add(product)
+                db.session.flush()
+            for table_name in pending:
+                raw = table(table_name, column('product'), column('product_id'))
+                db.session.execute(db.update(raw).where(raw.c.product.in_(raws)).values(product_id=product.id))
+
+        for table_name in pending:
+            # Every row must have its product before the names go
+            raw = table(table_name, column('product_id'))
+            missing = db.session.execute(
+                db.select(func.count()).select_from(raw).where(raw.c.product_id.is_(None))).scalar()
+            if missing:
+                raise RuntimeError(f'{missing} {table_name} row(s) matched no product; the product column was kept')
+        for table_name in pending:
+            _drop_index(table_name, f'ix_{table_name}_product_date')
+            db.session.execute(text(f'ALTER TABLE {table_name} DROP COLUMN product'))
+            if dialect == 'mysql':
+                db.session.execute(text(
+                    f'ALTER TABLE {table_name} MODIFY product_id INTEGER NOT NULL, '
+                    f'ADD FOREIGN KEY (product_id) REFERENCES products (id)'))
+            elif dialect == 'postgresql':
+                db.session.execute(text(f'ALTER TABLE {table_name} ALTER COLUMN product_id SET NOT NULL'))
+            # SQLite cannot add NOT NULL to an existing column; the application always sets it
+        db.session.commit()
+    # (product_id, date) replaces the (product, date) indexes of migration 3
+    for table_name in ('sales', 'stocks'):
+        _create_indexes(table_name)
+
+    # The read models are keyed by product id now; recreate the ones still
+    # keyed by name, then fill all of them from the raw tables
+    for table_name in ('stock_balances', 'sales_daily'):
+        if 'product_id' not in {c['name'] for c in inspect(db.engine).get_columns(table_name)}:
+            db.metadata.tables[table_name].drop(db.engine)
+            _create_tables(table_name)
+    _create_archive_tables()
+    rebuild_stock_balances()
+    rebuild_ledger_totals()
+    rebuild_sales_daily()
+
+
+def _create_archive_tables():
+    # The rollup rebuilds read the archives too, so migration 9 creates
+    # them before version 10
+    _create_tables('income_expenses_archive', 'sales_archive', 'stocks_archive', 'archive_cutoffs')
+
+
+@migration(10, 'archive_tables')
+def _archive_tables():
+    _create_archive_tables()
+
+
+@migration(11, 'report_job_pdf')
+def _report_job_pdf():
+    if 'pdf' in {c['name'] for c in inspect(db.engine).get_columns('report_jobs')}:
+        return
+    pdf_type = db.metadata.tables['report_jobs'].c.pdf.type.compile(dialect=db.engine.dialect)
+    db.session.execute(text(f'ALTER TABLE report_jobs ADD COLUMN pdf {pdf_type}'))
@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.dialects.mysql import LONGBLOB
+from passwords import hash_password, verify_password, needs_rehash
 
 db = SQLAlchemy()
 
@@ -20,14 +21,30 @@ class User(UserMixin, db.Model):
 
     def set_password(self, password):
         # Use pbkdf2:sha256 instead of scrypt for shorter hash length
-        self.password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return needs_rehash(self.password_hash)
+
+
+class Product(db.Model):
+    # Catalogue shared by sales and stock movements (see products.py)
+    __tablename__ = 'products'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # As displayed
+    normalized_name = db.Column(db.String(100), unique=True, nullable=False)  # Trimmed, single-spaced, case-folded
 
 
 class IncomeExpense(db.Model):
     __tablename__ = 'income_expenses'
+    __table_args__ = (
+        db.Index('ix_income_expenses_date_id', 'date', 'id'),
+        db.Index('ix_income_expenses_user_id_date', 'user_id', 'date'),
+        db.Index('ix_income_expenses_type_date', 'type', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime, nullable=False)
     description = db.Column(db.String(200), nullable=False)
@@ -36,31 +53,197 @@ class IncomeExpense(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
     # Relationship to User
-    user = db.relationship('User', back_populates='income_expenses')
+    user = db.relationship('User', back_populates='income_expenses', lazy='raise_on_sql')  # Load explicitly in list queries
 
 
 class Sale(db.Model):
     __tablename__ = 'sales'
+    __table_args__ = (
+        db.Index('ix_sales_date_id', 'date', 'id'),
+        db.Index('ix_sales_user_id_date', 'user_id', 'date'),
+        db.Index('ix_sales_product_id_date', 'product_id', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime, nullable=False)
-    product = db.Column(db.String(100), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Float, nullable=False)
     total = db.Column(db.Float, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
-    # Relationship to User
-    user = db.relationship('User', back_populates='sales')
+    # Relationships to User and Product
+    user = db.relationship('User', back_populates='sales', lazy='raise_on_sql')  # Load explicitly in list queries
+    product = db.relationship('Product', lazy='raise_on_sql')
 
 
 class Stock(db.Model):
     __tablename__ = 'stocks'
+    __table_args__ = (
+        db.Index('ix_stocks_date_id', 'date', 'id'),
+        db.Index('ix_stocks_user_id_date', 'user_id', 'date'),
+        db.Index('ix_stocks_product_id_date', 'product_id', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime, nullable=False)
-    product = db.Column(db.String(100), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity_in = db.Column(db.Integer, default=0)
     quantity_out = db.Column(db.Integer, default=0)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
-    # Relationship to User
-    user = db.relationship('User', back_populates='stocks')
\ No newline at end of file
+    # Relationships to User and Product
+    user = db.relationship('User', back_populates='stocks', lazy='raise_on_sql')  # Load explicitly in list queries
+    product = db.relationship('Product', lazy='raise_on_sql')
+
+
+class IncomeExpenseArchive(db.Model):
+    # Closed periods moved out of income_expenses by archive.py; same columns and ids
+    __tablename__ = 'income_expenses_archive'
+    __table_args__ = (
+        db.Index('ix_income_expenses_archive_date_id', 'date', 'id'),
+        db.Index('ix_income_expenses_archive_user_id_date', 'user_id', 'date'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    date = db.Column(db.DateTime, nullable=False)
+    description = db.Column(db.String(200), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    type = db.Column(db.String(20), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    user = db.relationship('User', lazy='raise_on_sql')
+
+
+class SaleArchive(db.Model):
+    # Closed periods moved out of sales by archive.py; same columns and ids
+    __tablename__ = 'sales_archive'
+    __table_args__ = (
+        db.Index('ix_sales_archive_date_id', 'date', 'id'),
+        db.Index('ix_sales_archive_user_id_date', 'user_id', 'date'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    date = db.Column(db.DateTime, nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Float, nullable=False)
+    total = db.Column(db.Float, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    user = db.relationship('User', lazy='raise_on_sql')
+    product = db.relationship('Product', lazy='raise_on_sql')
+
+
+class StockArchive(db.Model):
+    # Closed periods moved out of stocks by archive.py; same columns and ids
+    __tablename__ = 'stocks_archive'
+    __table_args__ = (
+        db.Index('ix_stocks_archive_date_id', 'date', 'id'),
+        db.Index('ix_stocks_archive_user_id_date', 'user_id', 'date'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    date = db.Column(db.DateTime, nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity_in = db.Column(db.Integer, default=0)
+    quantity_out = db.Column(db.Integer, default=0)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    user = db.relationship('User', lazy='raise_on_sql')
+    product = db.relationship('Product', lazy='raise_on_sql')
+
+
+class ArchiveCutoff(db.Model):
+    # Rows dated before archived_before were moved to the table's archive (see archive.py)
+    __tablename__ = 'archive_cutoffs'
+    table_name = db.Column(db.String(50), primary_key=True)
+    archived_before = db.Column(db.DateTime, nullable=False)
+
+
+class StockBalance(db.Model):
+    # Read model: one row per product, kept in step with the stocks table
+    __tablename__ = 'stock_balances'
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), unique=True, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    movements = db.Column(db.Integer, nullable=False, default=0)  # Row is dropped when this reaches 0
+
+
+class LedgerDailyTotal(db.Model):
+    # Read model: income/expense sum and count per day, kept in step with income_expenses
+    __tablename__ = 'ledger_daily_totals'
+    __table_args__ = (db.UniqueConstraint('day', 'type', name='uq_ledger_daily_totals_day_type'),)
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    type = db.Column(db.String(20), nullable=False)  # 'income' or 'expense'
+    total = db.Column(db.Float, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)  # Row is dropped when this reaches 0
+
+
+class SalesDaily(db.Model):
+    # Read model: sales per day, product and agent, kept in step with the sales table
+    __tablename__ = 'sales_daily'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'product_id', 'user_id', name='uq_sales_daily_day_product_user'),
+        db.Index('ix_sales_daily_user_id_day', 'user_id', 'day'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)  # Row is dropped when this reaches 0
+
+
+class ReportJob(db.Model):
+    # Queue of PDF reports rendered by the report worker (flask report-worker)
+    __tablename__ = 'report_jobs'
+    __table_args__ = (db.Index('ix_report_jobs_status_created_at', 'status', 'created_at'),)
+    id = db.Column(db.String(32), primary_key=True)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done or failed
+    file_path = db.Column(db.String(255))
+    # The rendered PDF, so web processes can serve it without sharing the worker's disk;
+    # deferred so polling the job status does not load it
+    pdf = db.deferred(db.Column(db.LargeBinary().with_variant(LONGBLOB(), 'mysql')))
+    error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+
+class DayVersion(db.Model):
+    # Change counter per table and day, bumped with every insert/delete dated that day
+    __tablename__ = 'day_versions'
+    __table_args__ = (db.UniqueConstraint('table_name', 'day', name='uq_day_versions_table_day'),)
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class TableVersion(db.Model):
+    # Change counter per table, bumped with every write; dashboard ETags are built from it
+    __tablename__ = 'table_versions'
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SyncSubmission(db.Model):
+    # Idempotency keys of offline submissions already applied through /api/sync
+    __tablename__ = 'sync_submissions'
+    __table_args__ = (db.UniqueConstraint('user_id', 'key', name='uq_sync_submissions_user_key'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    key = db.Column(db.String(64), nullable=False)
+    table_name = db.Column(db.String(50), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+
+class LiveEvent(db.Model):
+    # Committed inserts/deletes of ledger entries, sales and stock movements, streamed by live_events.py
+    __tablename__ = 'live_events'
+    id = db.Column(db.Integer, primary_key=True)  # The SSE event id
+    table_name = db.Column(db.String(50), nullable=False)
+    action = db.Column(db.String(20), nullable=False)  # 'created', 'deleted' or 'changed' (bulk write)
+    payload = db.Column(db.Text, nullable=False)  # JSON of the row
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
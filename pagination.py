@@ -0,0 +1,117 @@
+import base64
+from datetime import datetime
+
+from flask import request, url_for
+from sqlalchemy import and_, or_
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+
+def encode_cursor(date, record_id):
+    raw = f"{date.isoformat()}|{record_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    # Returns (date, id) or None for a missing or tampered cursor
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_str, id_str = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(date_str), int(id_str)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def get_per_page(prefix='', default=DEFAULT_PER_PAGE):
+    try:
+        per_page = int(request.args.get(f'{prefix}per_page', default))
+    except (TypeError, ValueError):
+        per_page = default
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+class KeysetPage:
+    """One page of a list ordered newest first on ``(date, id)``."""
+
+    def __init__(self, items, prefix, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.prefix = prefix
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def _url(self, **cursor):
+        # Keep the other lists' cursors so several pagers can share one page
+        args = request.args.to_dict()
+        args.pop(f'{self.prefix}after', None)
+        args.pop(f'{self.prefix}before', None)
+        args[f'{self.prefix}per_page'] = self.per_page
+        for key, value in cursor.items():
+            args[f'{self.prefix}{key}'] = value
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+    def next_url(self):
+        return self._url(after=self.next_cursor) if self.has_next else None
+
+    def prev_url(self):
+        return self._url(before=self.prev_cursor) if self.has_prev else None
+
+
+def newest_first(query, model):
+    """``query`` in page order, newest first on ``(date, id)``."""
+    return query.order_by(model.date.desc(), model.id.desc())
+
+
+def keyset_paginate(query, model, prefix='', default_per_page=DEFAULT_PER_PAGE):
+    """Seek through ``query`` newest first using the ``after``/``before`` cursors.
+
+    Each page costs one indexed range scan of ``per_page + 1`` rows whatever
+    its position in the table, unlike OFFSET which re-reads every skipped row.
+    """
+    per_page = get_per_page(prefix, default_per_page)
+    after = decode_cursor(request.args.get(f'{prefix}after'))
+    before = decode_cursor(request.args.get(f'{prefix}before'))
+
+    if before is not None:
+        date, record_id = before
+        rows = query.filter(or_(
+            model.date > date,
+            and_(model.date == date, model.id > record_id)
+        )).order_by(model.date.asc(), model.id.asc()).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        prev_cursor = encode_cursor(items[0].date, items[0].id) if has_more else None
+        next_cursor = encode_cursor(items[-1].date, items[-1].id) if items else None
+        return KeysetPage(items, prefix, per_page, next_cursor, prev_cursor)
+
+    if after is not None:
+        date, record_id = after
+        query = query.filter(or_(
+            model.date < date,
+            and_(model.date == date, model.id < record_id)
+        ))
+    rows = newest_first(query, model).limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = encode_cursor(items[-1].date, items[-1].id) if len(rows) > per_page else None
+    prev_cursor = encode_cursor(items[0].date, items[0].id) if after is not None and items else None
+    return KeysetPage(items, prefix, per_page, next_cursor, prev_cursor)
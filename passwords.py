@@ -0,0 +1,157 @@
+"""Password hashing off the request threads, with login throttling.
+
+PBKDF2 runs on a small shared executor (``PASSWORD_HASH_CONCURRENCY``
+threads), so a login burst keeps at most that many cores busy hashing;
+hashlib releases the GIL while it works. The caller still blocks until
+its hash is done: a login holds its request thread for the whole hash.
+At most ``PASSWORD_HASH_QUEUE`` hashes may wait for a slot; beyond that
+``HashingBusy`` is raised so the caller answers "try again" straight away.
+Under gthread each waiting hash is a request thread, so the queue is sized
+from ``GUNICORN_THREADS`` (see config): logins never take the last thread
+of a worker, and other requests keep being served during a burst.
+
+Failed logins are counted per username in a sliding window
+(``LOGIN_MAX_ATTEMPTS`` per ``LOGIN_ATTEMPT_WINDOW`` seconds, per process)
+and further attempts are refused before any hashing is done.
+
+Hashes record their own method and iteration count, so changing
+``PASSWORD_HASH_ITERATIONS`` takes effect for each user at their next
+successful login (``needs_rehash``) without any password reset.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'pbkdf2:sha256'
+DEFAULT_ITERATIONS = 1_000_000
+DEFAULT_CONCURRENCY = 2
+# Four request threads, two hashing, one waiting, one left for other requests
+DEFAULT_QUEUE = 1
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_ATTEMPT_WINDOW = 300
+# Usernames tracked before expired entries are swept (bounds memory under spraying)
+MAX_TRACKED_USERNAMES = 10000
+
+
+class HashingBusy(Exception):
+    pass
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f'Too many attempts, retry in {retry_after} s')
+        self.retry_after = retry_after
+
+
+_settings = {
+    'method': DEFAULT_METHOD,
+    'iterations': DEFAULT_ITERATIONS,
+    'max_attempts': DEFAULT_MAX_ATTEMPTS,
+    'attempt_window': DEFAULT_ATTEMPT_WINDOW,
+    'concurrency': DEFAULT_CONCURRENCY,
+    'queue': DEFAULT_QUEUE,
+}
+_executor = None
+_executor_pid = None
+_slots = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid, _slots
+    with _executor_lock:
+        # Executor threads do not survive a fork, so each process starts its own
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=_settings['concurrency'],
+                                           thread_name_prefix='password-hash')
+            _executor_pid = os.getpid()
+            # Running plus waiting hashes
+            _slots = threading.BoundedSemaphore(_settings['concurrency'] + _settings['queue'])
+        return _executor, _slots
+
+
+def _run(func, *args):
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        return executor.submit(func, *args).result()
+    finally:
+        slots.release()
+
+
+def method_string():
+    return f"{_settings['method']}:{_settings['iterations']}"
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, method_string())
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """True when the hash was made with another method or iteration count than configured."""
+    method = password_hash.split('$', 1)[0]
+    return method != method_string()
+
+
+class AttemptTracker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.failures = {}
+
+    def _recent(self, username, now):
+        window = _settings['attempt_window']
+        attempts = self.failures.get(username)
+        if attempts is None:
+            return None
+        while attempts and attempts[0] <= now - window:
+            attempts.popleft()
+        if not attempts:
+            del self.failures[username]
+            return None
+        return attempts
+
+    def check(self, username):
+        """Raise ``LoginThrottled`` if ``username`` used up its attempts in the window."""
+        now = time.monotonic()
+        with self.lock:
+            attempts = self._recent(username, now)
+            if attempts and len(attempts) >= _settings['max_attempts']:
+                retry_after = int(attempts[0] + _settings['attempt_window'] - now) + 1
+                raise LoginThrottled(retry_after)
+
+    def fail(self, username):
+        now = time.monotonic()
+        with self.lock:
+            if len(self.failures) >= MAX_TRACKED_USERNAMES:
+                for name in list(self.failures):
+                    self._recent(name, now)
+            attempts = self._recent(username, now)
+            if attempts is None:
+                attempts = self.failures[username] = deque()
+            attempts.append(now)
+
+    def reset(self, username):
+        with self.lock:
+            self.failures.pop(username, None)
+
+
+login_attempts = AttemptTracker()
+
+
+def init_passwords(app):
+    config = app.config
+    _settings['method'] = config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+    _settings['iterations'] = config.get('PASSWORD_HASH_ITERATIONS', DEFAULT_ITERATIONS)
+    _settings['max_attempts'] = config.get('LOGIN_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    _settings['attempt_window'] = config.get('LOGIN_ATTEMPT_WINDOW', DEFAULT_ATTEMPT_WINDOW)
+    _settings['concurrency'] = config.get('PASSWORD_HASH_CONCURRENCY', DEFAULT_CONCURRENCY)
+    _settings['queue'] = config.get('PASSWORD_HASH_QUEUE', DEFAULT_QUEUE)
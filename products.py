@@ -0,0 +1,99 @@
+"""Product catalogue shared by sales and stock movements.
+
+Forms and CSV files still take a product name; it is looked up by its
+normalized form (trimmed, inner spaces collapsed, case-folded), so "Savon",
+"savon " and "SAVON" are one product, and created on first use. Sales,
+stock movements and their rollups then store the integer ``product_id``.
+"""
+import unicodedata
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Product
+from query_budget import UPSERT_QUERIES, allow_queries
+
+# Suggestions returned to the form autocomplete
+MAX_SUGGESTIONS = 20
+# Product of the rows recorded with a blank name, before products were normalized
+UNNAMED_PRODUCT = 'Produit sans nom'
+
+
+def clean_product_name(name):
+    """The name as displayed: Unicode-normalized with single inner spaces."""
+    return ' '.join(unicodedata.normalize('NFKC', name or '').split())
+
+
+def normalize_product_name(name):
+    """The key names are unique on."""
+    return clean_product_name(name).casefold()
+
+
+def _find(normalized):
+    return Product.query.filter_by(normalized_name=normalized).first()
+
+
+def get_or_create_product(name):
+    """The product called ``name``, created (and flushed, so it has an id) if new."""
+    normalized = normalize_product_name(name)
+    product = _find(normalized)
+    if product is None:
+        try:
+            with db.session.begin_nested():
+                product = Product(name=clean_product_name(name), normalized_name=normalized)
+                db.session.add(product)
+        except IntegrityError:
+            # Created by a concurrent request meanwhile
+            product = _find(normalized)
+    return product
+
+
+def product_ids(names):
+    """Map each of ``names`` to its product id, creating missing products; one SELECT for the lot."""
+    by_normalized = {}
+    for name in names:
+        by_normalized.setdefault(normalize_product_name(name), name)
+    ids = dict(db.session.query(Product.normalized_name, Product.id).filter(
+        Product.normalized_name.in_(list(by_normalized))
+    ).all()) if by_normalized else {}
+    allow_queries(UPSERT_QUERIES * (len(by_normalized) - len(ids) - 1))
+    for normalized, name in by_normalized.items():
+        if normalized not in ids:
+            ids[normalized] = get_or_create_product(name).id
+    return {name: ids[normalize_product_name(name)] for name in names}
+
+
+def assign_product_ids(rows):
+    """Replace the ``product`` name of each row (dicts of column values) by its ``product_id``."""
+    ids = product_ids({row['product'] for row in rows})
+    for row in rows:
+        row['product_id'] = ids[row.pop('product')]
+    return rows
+
+
+def search_products(prefix, limit=MAX_SUGGESTIONS):
+    """Names of the products starting with ``prefix``, for autocomplete."""
+    normalized = normalize_product_name(prefix)
+    query = db.session.query(Product.name)
+    if normalized:
+        escaped = normalized.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(Product.normalized_name.like(escaped + '%', escape='\\'))
+    return [name for (name,) in query.order_by(Product.normalized_name).limit(limit)]
+
+
+def product_name_groups(names_with_counts):
+    """Group raw names by normalized key; the most used spelling becomes the product's name.
+
+    ``names_with_counts`` is an iterable of ``(raw name, row count)``.
+    Returns ``{normalized: (display name, [raw names])}``. Blank names are
+    grouped under ``UNNAMED_PRODUCT``.
+    """
+    groups = {}
+    for raw, count in names_with_counts:
+        name = clean_product_name(raw) or UNNAMED_PRODUCT
+        normalized = normalize_product_name(name)
+        best, best_count, raws = groups.get(normalized, (None, -1, []))
+        raws.append(raw)
+        if count > best_count:
+            best, best_count = name, count
+        groups[normalized] = (best, best_count, raws)
+    return {normalized: (best, raws) for normalized, (best, _, raws) in groups.items()}
@@ -0,0 +1,38 @@
+"""Progressive web app files: the service worker, manifest, offline page and install guide.
+
+These are served to anyone, logged in or not.
+"""
+import json
+import os
+
+from flask import Blueprint, Response, current_app, render_template, send_from_directory, url_for
+
+from assets import asset_version, hashed_urls
+
+bp = Blueprint('pwa', __name__)
+
+@bp.route('/sw.js')
+def service_worker():
+    # The worker versions its cache from the asset build; a new build changes
+    # these bytes, which is what makes browsers install the new worker
+    assets = {'version': asset_version() or 'dev', 'urls': hashed_urls(url_for)}
+    with open(os.path.join(current_app.static_folder, 'sw.js')) as f:
+        source = f.read()
+    response = Response(f'self.ASSETS = {json.dumps(assets)};\n' + source, mimetype='application/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@bp.route('/manifest.json')
+def manifest():
+    return send_from_directory(
+        os.path.join(current_app.root_path, 'static'),
+        'manifest.json',
+        mimetype='application/json'
+    )
+@bp.route('/offline.html')
+def offline():
+    return send_from_directory('templates', 'offline.html')
+
+@bp.route('/install')
+def install_guide():
+    return render_template('install.html')
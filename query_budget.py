@@ -0,0 +1,113 @@
+"""Per-route SQL query budgets.
+
+Decorate a view with ``@query_budget(n)`` to declare how many statements a
+request to it may run. Every statement sent through any engine is counted
+per request; going over budget logs an error and, when
+``QUERY_BUDGET_STRICT`` is on (the default under ``TESTING``), raises
+``QueryBudgetExceeded`` so the request fails and N+1 regressions surface
+in tests instead of production. Streamed responses (exports, the live
+feed) are checked when the stream ends, counting the statements run while
+it was sent along with the view's. ``count_queries()`` counts statements
+in any block, e.g. around a test client call.
+
+Bulk writes (imports, offline sync, user deletion) update one rollup row
+per day and product they touch, by design. The code doing that calls
+``allow_queries()`` for each group beyond the first, so their budget stays
+a fixed number for everything else.
+"""
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_local = threading.local()
+
+# Statements of one upsert (UPDATE or SELECT, then SAVEPOINT, INSERT and
+# RELEASE, or a rollback and retry after a conflict)
+UPSERT_QUERIES = 5
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            rv = view(*args, **kwargs)
+            if isinstance(rv, Response) and rv.is_streamed and not rv.direct_passthrough:
+                # The body runs after the request's check; count it as it is sent
+                # (files from send_file pass through untouched, they run no queries)
+                rv.response = _counted_stream(rv.response, limit + g.get('query_allowance', 0),
+                                              current_app._get_current_object(), request.endpoint,
+                                              g.get('query_count', 0))
+            return rv
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
+
+
+def allow_queries(count):
+    """Let the current request run ``count`` statements more than its budget."""
+    if count > 0 and has_request_context():
+        g.query_allowance = g.get('query_allowance', 0) + count
+
+
+class QueryCount:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+
+@contextmanager
+def count_queries():
+    counter = QueryCount()
+    stack = getattr(_local, 'counters', None)
+    if stack is None:
+        stack = _local.counters = []
+    stack.append(counter)
+    try:
+        yield counter
+    finally:
+        stack.remove(counter)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for counter in getattr(_local, 'counters', None) or ():
+        counter.count += 1
+        counter.statements.append(statement)
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+        g.setdefault('query_statements', []).append(statement)
+
+
+def _over_budget(app, endpoint, count, limit, statements):
+    message = f"{endpoint} ran {count} queries, budget is {limit}"
+    app.logger.error(message + ':\n' + '\n'.join(statements))
+    if app.config.get('QUERY_BUDGET_STRICT', app.testing):
+        raise QueryBudgetExceeded(message)
+
+
+def _counted_stream(chunks, limit, app, endpoint, view_count):
+    with count_queries() as counter:
+        yield from chunks
+    if view_count + counter.count > limit:
+        _over_budget(app, endpoint, view_count + counter.count, limit, counter.statements)
+
+
+def init_query_budgets(app):
+    @app.after_request
+    def check_query_budget(response):
+        view = app.view_functions.get(request.endpoint)
+        limit = getattr(view, 'query_budget', None)
+        count = g.get('query_count', 0)
+        if limit is not None:
+            limit += g.get('query_allowance', 0)
+        if limit is not None and count > limit:
+            _over_budget(app, request.endpoint, count, limit, g.get('query_statements', []))
+        return response
@@ -0,0 +1,211 @@
+"""EXPLAIN check for the queries behind each dashboard.
+
+``flask explain-queries`` runs EXPLAIN (MySQL) or EXPLAIN QUERY PLAN
+(SQLite) on every entry of ``HOT_QUERIES`` and fails if one of them falls
+back to a full table scan, sorts its rows outside an index (temp B-tree,
+filesort) or does not use the index the entry expects. The list pages are
+built from the ``read_models`` queries the views paginate, so the plans
+checked are those of the projections and joins actually run. Add an
+entry with every new list or aggregate query.
+"""
+import re
+from datetime import datetime, timedelta
+from fnmatch import fnmatch
+
+from models import (db, IncomeExpense, Sale, Stock, SalesDaily, LedgerDailyTotal, User, IncomeExpenseArchive,
+                    SaleArchive, StockArchive)
+from pagination import DEFAULT_PER_PAGE, newest_first
+from read_models import ledger_lines, ledger_rows, sale_rows, stock_rows
+
+
+def _sample_range():
+    end = datetime.combine(datetime.now().date(), datetime.min.time())
+    return end - timedelta(days=7), end
+
+
+def _first_page(query, model):
+    # The statement keyset_paginate runs for a list's first page
+    return newest_first(query, model).limit(DEFAULT_PER_PAGE + 1).statement
+
+
+def _ledger_lines_page():
+    # accounting_dashboard
+    return _first_page(ledger_lines(), IncomeExpense)
+
+
+def _ledger_page():
+    # finance_dashboard, record_income_expense
+    return _first_page(ledger_rows(), IncomeExpense)
+
+
+def _ledger_users_page():
+    # management_dashboard
+    return _first_page(ledger_rows(with_user=True), IncomeExpense)
+
+
+def _sales_page():
+    # management_dashboard
+    return _first_page(sale_rows(), Sale)
+
+
+def _sales_agents_page():
+    # commercial_dashboard (chef_commercial)
+    return _first_page(sale_rows(with_agent=True), Sale)
+
+
+def _agent_sales_page():
+    # commercial_dashboard (agent_commercial), record_sale
+    return _first_page(sale_rows(user_id=1), Sale)
+
+
+def _stock_page():
+    # stock_dashboard, record_stock, management_dashboard
+    return _first_page(stock_rows(), Stock)
+
+
+def _report_ledger_range():
+    # download_report
+    start, end = _sample_range()
+    return db.select(IncomeExpense).where(IncomeExpense.date >= start, IncomeExpense.date < end)
+
+
+def _report_sales_range():
+    # download_report
+    start, end = _sample_range()
+    return db.select(Sale).where(Sale.date >= start, Sale.date < end)
+
+
+def _report_stock_range():
+    # download_report
+    start, end = _sample_range()
+    return db.select(Stock).where(Stock.date >= start, Stock.date < end)
+
+
+def _report_archive_ranges():
+    # download_report and exports reaching into archived periods
+    start, end = _sample_range()
+    return db.union_all(*[
+        db.select(archive.id).where(archive.date >= start, archive.date < end)
+        for archive in (IncomeExpenseArchive, SaleArchive, StockArchive)
+    ])
+
+
+def _ledger_partial_day():
+    # ledger_totals() head/tail days
+    start, end = _sample_range()
+    return db.select(IncomeExpense.type, db.func.sum(IncomeExpense.amount)).where(
+        IncomeExpense.date >= start, IncomeExpense.date < end
+    ).group_by(IncomeExpense.type)
+
+
+def _ledger_days():
+    # ledger_totals() whole days for a report range
+    start, end = _sample_range()
+    return db.select(LedgerDailyTotal.type, db.func.sum(LedgerDailyTotal.total)).where(
+        LedgerDailyTotal.day >= start.date(), LedgerDailyTotal.day < end.date()
+    ).group_by(LedgerDailyTotal.type)
+
+
+def _today_by_product():
+    # commercial_dashboard today's summary, /api/sales/summary
+    start, end = _sample_range()
+    return db.select(SalesDaily.product_id, db.func.sum(SalesDaily.quantity)).where(
+        SalesDaily.day >= start.date(), SalesDaily.day < end.date()
+    ).group_by(SalesDaily.product_id)
+
+
+def _agent_today_by_product():
+    # commercial_dashboard (agent_commercial) today's summary
+    start, end = _sample_range()
+    return db.select(SalesDaily.product_id, db.func.sum(SalesDaily.quantity)).where(
+        SalesDaily.user_id == 1, SalesDaily.day >= start.date(), SalesDaily.day < end.date()
+    ).group_by(SalesDaily.product_id)
+
+
+def _user_by_id():
+    # load_user on every authenticated request
+    return db.select(User).where(User.id == 1)
+
+
+# (name, statement builder, expected index; * matches any characters)
+HOT_QUERIES = [
+    ('ledger lines page', _ledger_lines_page, 'ix_income_expenses_date_id'),
+    ('ledger page', _ledger_page, 'ix_income_expenses_date_id'),
+    ('ledger page with users', _ledger_users_page, 'ix_income_expenses_date_id'),
+    ('sales page', _sales_page, 'ix_sales_date_id'),
+    ('sales page with agents', _sales_agents_page, 'ix_sales_date_id'),
+    ('agent sales page', _agent_sales_page, 'ix_sales_user_id_date'),
+    ('stock page', _stock_page, 'ix_stocks_date_id'),
+    ('report ledger range', _report_ledger_range, 'ix_income_expenses_date_id'),
+    ('report sales range', _report_sales_range, 'ix_sales_date_id'),
+    ('report stock range', _report_stock_range, 'ix_stocks_date_id'),
+    ('report archive ranges', _report_archive_ranges, 'ix_*_archive_date_id'),
+    ('ledger partial day', _ledger_partial_day, 'ix_income_expenses_date_id'),
+    ('ledger whole days', _ledger_days, 'uq_ledger_daily_totals_day_type'),
+    ('sales by product', _today_by_product, 'uq_sales_daily_day_product_user'),
+    ('agent sales by product', _agent_today_by_product, 'ix_sales_daily_user_id_day'),
+    ('user by id', _user_by_id, 'PRIMARY'),
+]
+
+
+def explain(statement):
+    """Return the plan rows for ``statement`` as a list of strings."""
+    dialect = db.engine.dialect
+    compiled = statement.compile(dialect=dialect)
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    with db.engine.connect() as connection:
+        result = connection.exec_driver_sql(prefix + str(compiled), params)
+        keys = list(result.keys())
+        return [' '.join(f'{key}={value}' for key, value in zip(keys, row)) for row in result]
+
+
+def is_full_scan(plan, dialect_name):
+    if dialect_name == 'sqlite':
+        # "SCAN table" without "USING ... INDEX" reads every row
+        return any(' SCAN ' in f' {line} ' and 'USING' not in line for line in plan)
+    return any('type=ALL' in line for line in plan)
+
+
+def sorts_outside_index(plan, dialect_name):
+    marker = 'USE TEMP B-TREE FOR ORDER BY' if dialect_name == 'sqlite' else 'Using filesort'
+    return any(marker in line for line in plan)
+
+
+def plan_index_names(index_name, dialect_name):
+    """The names ``index_name`` can appear under in a plan."""
+    if dialect_name == 'sqlite':
+        # SQLite backs a UNIQUE constraint with an index named after the table
+        for table in db.metadata.tables.values():
+            if any(constraint.name == index_name for constraint in table.constraints):
+                return (index_name, f'sqlite_autoindex_{table.name}_*')
+    return (index_name,)
+
+
+def uses_index(plan, index_name, dialect_name):
+    # SQLite names the index in the plan text, MySQL in the key column
+    names = plan_index_names(index_name, dialect_name)
+    return any(fnmatch(word, name) for line in plan for word in re.split(r'[\s=(),]+', line) for name in names)
+
+
+def check_query_plans(echo=print):
+    """EXPLAIN every hot query; returns the names of those with a bad plan."""
+    dialect_name = db.engine.dialect.name
+    failures = []
+    for name, build, expected_index in HOT_QUERIES:
+        plan = explain(build())
+        problems = []
+        if is_full_scan(plan, dialect_name):
+            problems.append('FULL SCAN')
+        if sorts_outside_index(plan, dialect_name):
+            problems.append('SORT')
+        if not uses_index(plan, expected_index, dialect_name):
+            problems.append('NO INDEX')
+        echo(f"{', '.join(problems) or 'ok':9} {name} (expects {expected_index})")
+        for line in plan:
+            echo(f'          {line}')
+        if problems:
+            failures.append(name)
+    return failures
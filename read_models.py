@@ -0,0 +1,52 @@
+"""Column projections for the read-only lists of the dashboards and record pages.
+
+The lists only display a few columns, so they select those instead of
+whole entities. Rows come back as SQLAlchemy ``Row`` objects: named tuples
+with ``__slots__``, never added to the session's identity map or tracked
+for changes. Product and user names are joined in as plain columns,
+named like in the JSON rows (``product``, ``agent``, ``user``), instead of
+related objects. The queries keep ``id`` and ``date``, so
+``keyset_paginate`` pages them like entity queries.
+"""
+from sqlalchemy import case
+
+from models import db, IncomeExpense, Product, Sale, Stock, User
+
+
+def ledger_lines():
+    """Ledger entries as ``(id, date, income, expense)``; the amount is under its type, the other is None."""
+    return db.session.query(
+        IncomeExpense.id,
+        IncomeExpense.date,
+        case((IncomeExpense.type == 'income', IncomeExpense.amount)).label('income'),
+        case((IncomeExpense.type == 'expense', IncomeExpense.amount)).label('expense'),
+    )
+
+
+def ledger_rows(with_user=False):
+    """Ledger entries as ``(id, date, description, amount, type[, user])``."""
+    columns = [IncomeExpense.id, IncomeExpense.date, IncomeExpense.description, IncomeExpense.amount,
+               IncomeExpense.type]
+    if not with_user:
+        return db.session.query(*columns)
+    return db.session.query(*columns, User.full_name.label('user')).join(User, IncomeExpense.user_id == User.id)
+
+
+def sale_rows(user_id=None, with_agent=False):
+    """Sales as ``(id, date, product, quantity, unit_price, total[, agent])``, only ``user_id``'s if given."""
+    columns = [Sale.id, Sale.date, Product.name.label('product'), Sale.quantity, Sale.unit_price, Sale.total]
+    if with_agent:
+        columns.append(User.full_name.label('agent'))
+    query = db.session.query(*columns).join(Product, Sale.product_id == Product.id)
+    if with_agent:
+        query = query.join(User, Sale.user_id == User.id)
+    if user_id is not None:
+        query = query.filter(Sale.user_id == user_id)
+    return query
+
+
+def stock_rows():
+    """Stock movements as ``(id, date, product, quantity_in, quantity_out)``."""
+    return db.session.query(
+        Stock.id, Stock.date, Product.name.label('product'), Stock.quantity_in, Stock.quantity_out
+    ).join(Product, Stock.product_id == Product.id)
@@ -0,0 +1,141 @@
+"""On-disk cache of rendered PDF reports.
+
+Files are named ``<start>_<end>_<key>.pdf`` where the key hashes the date
+range, the report template source and the day versions of the tables the
+report reads. A write to any of those tables bumps the version of its day,
+so a stale report can never be served; the after-commit hook below also
+deletes cached files whose range covers a changed day right away. The rest
+is bounded by ``REPORT_CACHE_MAX_AGE_DAYS`` and ``REPORT_CACHE_MAX_BYTES``.
+"""
+import hashlib
+import os
+import time
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from models import db, DayVersion
+
+REPORT_TEMPLATE = 'report_template.html'
+REPORT_TABLES = ('income_expenses', 'sales', 'stocks')
+DEFAULT_MAX_AGE_DAYS = 30
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+
+
+def cache_dir():
+    path = current_app.config.get('REPORTS_DIR') or os.path.join(current_app.instance_path, 'reports')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def template_version():
+    source = current_app.jinja_env.loader.get_source(current_app.jinja_env, REPORT_TEMPLATE)[0]
+    return hashlib.sha256(source.encode()).hexdigest()[:16]
+
+
+def data_version(start_date, end_date):
+    """Per-table sum of day versions over the range; grows with every change in it."""
+    rows = db.session.query(DayVersion.table_name, func.sum(DayVersion.version)).filter(
+        DayVersion.table_name.in_(REPORT_TABLES),
+        DayVersion.day >= start_date,
+        DayVersion.day <= end_date
+    ).group_by(DayVersion.table_name).all()
+    versions = dict(rows)
+    return ','.join(f'{table}:{int(versions.get(table) or 0)}' for table in REPORT_TABLES)
+
+
+def cache_path(start_date, end_date):
+    raw = f'{start_date.isoformat()}|{end_date.isoformat()}|{template_version()}|{data_version(start_date, end_date)}'
+    key = hashlib.sha256(raw.encode()).hexdigest()[:32]
+    return os.path.join(cache_dir(), f'{start_date:%Y%m%d}_{end_date:%Y%m%d}_{key}.pdf')
+
+
+def lookup(start_date, end_date):
+    """Path of an up-to-date cached report, or None."""
+    path = cache_path(start_date, end_date)
+    if not os.path.exists(path):
+        return None
+    # mtime doubles as last-used time for eviction
+    os.utime(path)
+    return path
+
+
+def _entries():
+    directory = cache_dir()
+    for name in os.listdir(directory):
+        if not name.endswith('.pdf'):
+            continue
+        parts = name[:-4].split('_')
+        if len(parts) != 3:
+            continue
+        try:
+            start = datetime.strptime(parts[0], '%Y%m%d').date()
+            end = datetime.strptime(parts[1], '%Y%m%d').date()
+        except ValueError:
+            continue
+        yield os.path.join(directory, name), start, end
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def invalidate_days(days):
+    """Delete cached reports whose range covers any of ``days``."""
+    days = sorted(days)
+    if not days:
+        return 0
+    removed = 0
+    for path, start, end in list(_entries()):
+        if any(start <= day <= end for day in days):
+            _remove(path)
+            removed += 1
+    return removed
+
+
+def evict(max_age_days=None, max_bytes=None):
+    """Drop reports unused for ``max_age_days``, then least recently used ones above ``max_bytes``."""
+    config = current_app.config
+    if max_age_days is None:
+        max_age_days = config.get('REPORT_CACHE_MAX_AGE_DAYS', DEFAULT_MAX_AGE_DAYS)
+    if max_bytes is None:
+        max_bytes = config.get('REPORT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+
+    cutoff = time.time() - max_age_days * 86400
+    files = []
+    for path, _, _ in list(_entries()):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime < cutoff:
+            _remove(path)
+        else:
+            files.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    days = session.info.pop('changed_days', None)
+    if days and has_app_context():
+        try:
+            invalidate_days(days)
+        except OSError as e:
+            current_app.logger.error(f"Report cache invalidation failed: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_after_rollback(session):
+    session.info.pop('changed_days', None)
@@ -0,0 +1,166 @@
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app, render_template
+
+from archive import rows_between
+from models import db, IncomeExpense, Sale, Stock, ReportJob
+from rollups import ledger_totals
+import report_cache
+import instrumentation
+
+# Running jobs older than this are assumed to belong to a dead worker
+STALE_JOB_AGE = timedelta(minutes=15)
+
+
+def report_filename(start_date, end_date):
+    return f'savane_report_{start_date.strftime("%Y%m%d")}_to_{end_date.strftime("%Y%m%d")}.pdf'
+
+
+def build_report_html(start_date, end_date):
+    """Render report_template.html for the days ``start_date`` to ``end_date`` inclusive.
+
+    Returns the HTML and the number of table rows it contains.
+    """
+    start = datetime.combine(start_date, datetime.min.time())
+    end_exclusive = start + timedelta(days=(end_date - start_date).days + 1)
+
+    # Ranges reaching into closed periods are read from the archive tables too
+    income_expenses = rows_between(IncomeExpense, start, end_exclusive)
+    sales = rows_between(Sale, start, end_exclusive, joined=('product',))
+    stock_movements = rows_between(Stock, start, end_exclusive, joined=('product',))
+
+    totals = ledger_totals(start, end_exclusive)
+    total_income = totals['income']
+    total_expense = totals['expense']
+
+    html = render_template(
+        'report_template.html',
+        start_date=start,
+        end_date=datetime.combine(end_date, datetime.min.time()),
+        income_expenses=income_expenses,
+        sales=sales,
+        stock_movements=stock_movements,
+        total_income=total_income,
+        total_expense=total_expense,
+        balance=total_income - total_expense,
+        total_sales=sum(sale.total for sale in sales),
+        now=datetime.now()
+    )
+    return html, len(income_expenses) + len(sales) + len(stock_movements)
+
+
+def render_report_pdf(start_date, end_date, target):
+    # WeasyPrint (with fonttools, Pillow, cffi and pango) is only loaded by the
+    # process that renders a report, not by every web worker at boot
+    from weasyprint import HTML
+
+    html, rows = build_report_html(start_date, end_date)
+    started = time.perf_counter()
+    HTML(string=html).write_pdf(target)
+    instrumentation.observe_report_render(time.perf_counter() - started, rows)
+
+
+def submit_report_job(start_date, end_date, user_id):
+    # A cached report for the same range and data is finished on arrival
+    cached = report_cache.lookup(start_date, end_date)
+    now = datetime.utcnow()
+    job = ReportJob(
+        id=uuid.uuid4().hex,
+        start_date=start_date,
+        end_date=end_date,
+        status='done' if cached else 'queued',
+        file_path=cached,
+        created_at=now,
+        finished_at=now if cached else None,
+        user_id=user_id
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def claim_next_job():
+    """Atomically move the oldest queued job to running; returns it or None."""
+    while True:
+        job = ReportJob.query.filter_by(status='queued').order_by(ReportJob.created_at).first()
+        if job is None:
+            return None
+        claimed = ReportJob.query.filter_by(id=job.id, status='queued').update({
+            ReportJob.status: 'running',
+            ReportJob.started_at: datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            db.session.refresh(job)
+            return job
+        # Another worker took it first; try the next one
+
+
+def requeue_stale_jobs():
+    stale = ReportJob.query.filter(
+        ReportJob.status == 'running',
+        ReportJob.started_at < datetime.utcnow() - STALE_JOB_AGE
+    ).update({ReportJob.status: 'queued', ReportJob.started_at: None}, synchronize_session=False)
+    db.session.commit()
+    return stale
+
+
+def run_job(job):
+    # Key the file on the data version seen before rendering, so a write made
+    # meanwhile changes the key and can never be served from this file.
+    # The worker may not share a filesystem with the web processes (separate
+    # dynos or containers), so the PDF is stored on the job row as well and
+    # the download is served from there when the file is not on the web host
+    path = report_cache.lookup(job.start_date, job.end_date)
+    tmp_path = None
+    try:
+        if path is None:
+            path = report_cache.cache_path(job.start_date, job.end_date)
+            tmp_path = f'{path}.{job.id}.tmp'
+            render_report_pdf(job.start_date, job.end_date, tmp_path)
+            os.replace(tmp_path, path)
+        with open(path, 'rb') as f:
+            job.pdf = f.read()
+        job.status = 'done'
+        job.file_path = path
+    except Exception as e:
+        db.session.rollback()
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        job.status = 'failed'
+        job.error = str(e)[:500]
+        current_app.logger.error(f"Report job {job.id} failed: {e}")
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def prune_job_pdfs(max_age_days=None):
+    """Drop the stored PDF of jobs finished more than ``max_age_days`` ago; returns how many."""
+    if max_age_days is None:
+        max_age_days = current_app.config.get('REPORT_CACHE_MAX_AGE_DAYS', report_cache.DEFAULT_MAX_AGE_DAYS)
+    pruned = ReportJob.query.filter(
+        ReportJob.pdf.isnot(None),
+        ReportJob.finished_at < datetime.utcnow() - timedelta(days=max_age_days)
+    ).update({ReportJob.pdf: None}, synchronize_session=False)
+    db.session.commit()
+    return pruned
+
+
+def work(poll_interval=2.0, once=False):
+    """Worker loop: render queued reports until interrupted (or the queue is empty with ``once``)."""
+    requeue_stale_jobs()
+    while True:
+        job = claim_next_job()
+        if job is not None:
+            run_job(job)
+            report_cache.evict()
+            prune_job_pdfs()
+            instrumentation.flush(force=True)
+            continue
+        if once:
+            return
+        db.session.remove()
+        time.sleep(poll_interval)
@@ -0,0 +1,526 @@
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from archive import sources
+from models import (db, Product, Stock, StockArchive, StockBalance, IncomeExpense, IncomeExpenseArchive,
+                    LedgerDailyTotal, Sale, SaleArchive, SalesDaily, User, DayVersion, TableVersion)
+from query_budget import UPSERT_QUERIES, allow_queries
+
+
+def _increment_day_version(table_name, day):
+    return DayVersion.query.filter_by(table_name=table_name, day=day).update({
+        DayVersion.version: DayVersion.version + 1
+    }, synchronize_session=False)
+
+
+def _increment_table_version(table_name):
+    return TableVersion.query.filter_by(table_name=table_name).update({
+        TableVersion.version: TableVersion.version + 1
+    }, synchronize_session=False)
+
+
+def bump_table_version(table_name):
+    """Mark ``table_name`` as changed, in the caller's transaction.
+
+    The table is also remembered on the session for the live feed.
+    """
+    db.session.info.setdefault('changed_tables', set()).add(table_name)
+    if not _increment_table_version(table_name):
+        try:
+            with db.session.begin_nested():
+                db.session.add(TableVersion(table_name=table_name, version=1))
+        except IntegrityError:
+            _increment_table_version(table_name)
+
+
+def bump_day_versions(table_name, days):
+    """Mark ``days`` of ``table_name`` as changed, in the caller's transaction.
+
+    The report cache keys on these versions; the days are also remembered on
+    the session so cached reports covering them are dropped after commit.
+    """
+    days = set(days)
+    allow_queries(UPSERT_QUERIES * (len(days) - 1))
+    for day in days:
+        if not _increment_day_version(table_name, day):
+            try:
+                with db.session.begin_nested():
+                    db.session.add(DayVersion(table_name=table_name, day=day, version=1))
+            except IntegrityError:
+                _increment_day_version(table_name, day)
+    db.session.info.setdefault('changed_days', set()).update(days)
+    bump_table_version(table_name)
+
+
+def _increment_stock_balance(product_id, quantity, movements):
+    # Atomic increment so concurrent workers never lose an update
+    return StockBalance.query.filter_by(product_id=product_id).update({
+        StockBalance.quantity: StockBalance.quantity + quantity,
+        StockBalance.movements: StockBalance.movements + movements
+    }, synchronize_session=False)
+
+
+def _apply_stock_delta(product_id, quantity, movements):
+    if not _increment_stock_balance(product_id, quantity, movements):
+        try:
+            with db.session.begin_nested():
+                db.session.add(StockBalance(product_id=product_id, quantity=quantity, movements=movements))
+        except IntegrityError:
+            # Another worker created the row first; add to it instead
+            _increment_stock_balance(product_id, quantity, movements)
+    else:
+        StockBalance.query.filter(
+            StockBalance.product_id == product_id,
+            StockBalance.movements <= 0
+        ).delete(synchronize_session=False)
+
+
+def record_stock_movement(stock):
+    """Add a new movement to the balances, in the caller's transaction."""
+    _apply_stock_delta(stock.product_id, (stock.quantity_in or 0) - (stock.quantity_out or 0), 1)
+    bump_day_versions('stocks', [stock.date.date()])
+
+
+def remove_stock_movement(stock):
+    """Take a movement that is about to be deleted out of the balances."""
+    _apply_stock_delta(stock.product_id, (stock.quantity_out or 0) - (stock.quantity_in or 0), -1)
+    bump_day_versions('stocks', [stock.date.date()])
+
+
+def remove_stock_movements(query, model=Stock):
+    """Take every movement matched by ``query`` out of the balances before a bulk delete.
+
+    ``model`` is the class ``query`` reads: ``Stock`` or its archive.
+    """
+    grouped = query.with_entities(
+        model.product_id,
+        func.sum(func.coalesce(model.quantity_in, 0) - func.coalesce(model.quantity_out, 0)),
+        func.count(model.id)
+    ).group_by(model.product_id).all()
+    allow_queries(UPSERT_QUERIES * (len(grouped) - 1))
+    for product_id, quantity, movements in grouped:
+        _apply_stock_delta(product_id, -int(quantity or 0), -movements)
+    # The days come from the database, one row per day, not per movement
+    day = func.date(model.date)
+    bump_day_versions('stocks', [_as_date(row_day) for row_day, in query.with_entities(day).distinct()])
+
+
+def record_stock_movements(rows):
+    """Add a batch of new movements (dicts of column values) with one update per product."""
+    deltas = {}
+    for row in rows:
+        quantity, movements = deltas.get(row['product_id'], (0, 0))
+        deltas[row['product_id']] = (quantity + (row['quantity_in'] or 0) - (row['quantity_out'] or 0),
+                                     movements + 1)
+    allow_queries(UPSERT_QUERIES * (len(deltas) - 1))
+    for product_id, (quantity, movements) in deltas.items():
+        _apply_stock_delta(product_id, quantity, movements)
+    bump_day_versions('stocks', [row['date'].date() for row in rows])
+
+
+def get_stock_levels():
+    """Available quantity per product, read straight from the balance table."""
+    rows = db.session.query(Product.name, StockBalance.quantity).join(
+        Product, Product.id == StockBalance.product_id
+    ).order_by(Product.name).all()
+    return {name: quantity for name, quantity in rows}
+
+
+def compute_stock_levels():
+    # Full scan of the stocks table and its archive, used only to rebuild or verify the balances
+    levels = {}
+    for source in (Stock, StockArchive):
+        rows = db.session.query(
+            source.product_id,
+            func.sum(func.coalesce(source.quantity_in, 0) - func.coalesce(source.quantity_out, 0)),
+            func.count(source.id)
+        ).group_by(source.product_id).all()
+        for product_id, quantity, movements in rows:
+            total, count = levels.get(product_id, (0, 0))
+            levels[product_id] = (total + int(quantity or 0), count + movements)
+    return levels
+
+
+def verify_stock_balances():
+    """Return ``{product_id: (expected, stored)}`` for every balance that drifted."""
+    expected = compute_stock_levels()
+    stored = {b.product_id: (b.quantity, b.movements) for b in StockBalance.query.all()}
+    mismatches = {}
+    for product_id in set(expected) | set(stored):
+        if expected.get(product_id) != stored.get(product_id):
+            mismatches[product_id] = (expected.get(product_id), stored.get(product_id))
+    return mismatches
+
+
+def rebuild_stock_balances():
+    StockBalance.query.delete(synchronize_session=False)
+    for product_id, (quantity, movements) in compute_stock_levels().items():
+        db.session.add(StockBalance(product_id=product_id, quantity=quantity, movements=movements))
+    db.session.commit()
+
+
+def _increment_ledger_total(day, type, amount, count):
+    return LedgerDailyTotal.query.filter_by(day=day, type=type).update({
+        LedgerDailyTotal.total: LedgerDailyTotal.total + amount,
+        LedgerDailyTotal.count: LedgerDailyTotal.count + count
+    }, synchronize_session=False)
+
+
+def _apply_ledger_delta(day, type, amount, count):
+    if not _increment_ledger_total(day, type, amount, count):
+        try:
+            with db.session.begin_nested():
+                db.session.add(LedgerDailyTotal(day=day, type=type, total=amount, count=count))
+        except IntegrityError:
+            _increment_ledger_total(day, type, amount, count)
+    else:
+        LedgerDailyTotal.query.filter(
+            LedgerDailyTotal.day == day,
+            LedgerDailyTotal.type == type,
+            LedgerDailyTotal.count <= 0
+        ).delete(synchronize_session=False)
+
+
+def record_ledger_entry(record):
+    """Add a new income/expense record to the daily totals, in the caller's transaction."""
+    _apply_ledger_delta(record.date.date(), record.type, record.amount, 1)
+    bump_day_versions('income_expenses', [record.date.date()])
+
+
+def record_ledger_entries(rows):
+    """Add a batch of new records (dicts of column values) with one update per (day, type)."""
+    deltas = {}
+    for row in rows:
+        key = (row['date'].date(), row['type'])
+        amount, count = deltas.get(key, (0.0, 0))
+        deltas[key] = (amount + row['amount'], count + 1)
+    allow_queries(UPSERT_QUERIES * (len(deltas) - 1))
+    for (day, type), (amount, count) in deltas.items():
+        _apply_ledger_delta(day, type, amount, count)
+    bump_day_versions('income_expenses', [day for day, _ in deltas])
+
+
+def remove_ledger_entry(record):
+    """Take a record that is about to be deleted out of the daily totals."""
+    _apply_ledger_delta(record.date.date(), record.type, -record.amount, -1)
+    bump_day_versions('income_expenses', [record.date.date()])
+
+
+def remove_ledger_entries(query, model=IncomeExpense):
+    """Take every record matched by ``query`` out of the daily totals before a bulk delete.
+
+    ``model`` is the class ``query`` reads: ``IncomeExpense`` or its archive.
+    """
+    # One grouped read and one update per (day, type), not per record
+    day = func.date(model.date)
+    grouped = query.with_entities(
+        day, model.type, func.sum(model.amount), func.count(model.id)
+    ).group_by(day, model.type).all()
+    allow_queries(UPSERT_QUERIES * (len(grouped) - 1))
+    for record_day, type, amount, count in grouped:
+        _apply_ledger_delta(_as_date(record_day), type, -(amount or 0.0), -count)
+    bump_day_versions('income_expenses', [_as_date(record_day) for record_day, _, _, _ in grouped])
+
+
+def split_day_range(start, end):
+    """Split ``[start, end)`` into a partial head, whole days and a partial tail.
+
+    Returns ``(head, days, tail)``: ``head`` and ``tail`` are datetime ranges
+    (or None) to read from the raw table, ``days`` is a ``(first_day,
+    last_day)`` half-open range of whole days (or None) to read from a daily
+    rollup.  ``None`` bounds mean open-ended.
+    """
+    first_day = last_day = None
+    head = tail = None
+    if start is not None:
+        first_day = start.date()
+        if start.time() != time.min:
+            first_day += timedelta(days=1)
+            head = (start, datetime.combine(first_day, time.min))
+    if end is not None:
+        last_day = end.date()
+        if end.time() != time.min:
+            tail = (datetime.combine(last_day, time.min), end)
+    if first_day is not None and last_day is not None and first_day >= last_day:
+        # No whole day in the range: read it all from the raw table
+        return (start, end), None, None
+    return head, (first_day, last_day), tail
+
+
+def ledger_totals(start=None, end=None):
+    """Income and expense totals for ``[start, end)`` (datetimes, open-ended if None).
+
+    Whole days are summed from ``ledger_daily_totals``; only the partial
+    first and last day, if any, touch ``income_expenses``.
+    """
+    totals = {'income': 0.0, 'expense': 0.0}
+    head, days, tail = split_day_range(start, end)
+
+    for edge in (head, tail):
+        if edge is None:
+            continue
+        for source in sources(IncomeExpense, edge[0]):
+            rows = db.session.query(source.type, func.sum(source.amount)).filter(
+                source.date >= edge[0],
+                source.date < edge[1]
+            ).group_by(source.type).all()
+            for type, amount in rows:
+                totals[type] = totals.get(type, 0.0) + (amount or 0.0)
+
+    if days is not None:
+        first_day, last_day = days
+        query = db.session.query(LedgerDailyTotal.type, func.sum(LedgerDailyTotal.total))
+        if first_day is not None:
+            query = query.filter(LedgerDailyTotal.day >= first_day)
+        if last_day is not None:
+            query = query.filter(LedgerDailyTotal.day < last_day)
+        for type, amount in query.group_by(LedgerDailyTotal.type).all():
+            totals[type] = totals.get(type, 0.0) + (amount or 0.0)
+    return totals
+
+
+def compute_ledger_totals():
+    # Full scan of income_expenses and its archive, used only to rebuild or verify the rollup
+    totals = {}
+    for source in (IncomeExpense, IncomeExpenseArchive):
+        day = func.date(source.date)
+        rows = db.session.query(
+            day, source.type, func.sum(source.amount), func.count(source.id)
+        ).group_by(day, source.type).all()
+        for d, type, total, count in rows:
+            key = (_as_date(d), type)
+            amount, entries = totals.get(key, (0.0, 0))
+            totals[key] = (amount + (total or 0.0), entries + count)
+    return totals
+
+
+def _as_date(value):
+    # SQLite returns DATE() as a string, MySQL as a date
+    return datetime.strptime(value, '%Y-%m-%d').date() if isinstance(value, str) else value
+
+
+def verify_ledger_totals():
+    """Return ``{(day, type): (expected, stored)}`` for every daily total that drifted."""
+    expected = compute_ledger_totals()
+    stored = {(r.day, r.type): (r.total, r.count) for r in LedgerDailyTotal.query.all()}
+    mismatches = {}
+    for key in set(expected) | set(stored):
+        want, have = expected.get(key), stored.get(key)
+        if want is None or have is None or want[1] != have[1] or abs(want[0] - have[0]) > 0.005:
+            mismatches[key] = (want, have)
+    return mismatches
+
+
+def rebuild_ledger_totals():
+    LedgerDailyTotal.query.delete(synchronize_session=False)
+    for (day, type), (total, count) in compute_ledger_totals().items():
+        db.session.add(LedgerDailyTotal(day=day, type=type, total=total, count=count))
+    db.session.commit()
+
+
+def _increment_sales_daily(day, product_id, user_id, quantity, revenue, count):
+    return SalesDaily.query.filter_by(day=day, product_id=product_id, user_id=user_id).update({
+        SalesDaily.quantity: SalesDaily.quantity + quantity,
+        SalesDaily.revenue: SalesDaily.revenue + revenue,
+        SalesDaily.count: SalesDaily.count + count
+    }, synchronize_session=False)
+
+
+def _apply_sales_delta(day, product_id, user_id, quantity, revenue, count):
+    if not _increment_sales_daily(day, product_id, user_id, quantity, revenue, count):
+        try:
+            with db.session.begin_nested():
+                db.session.add(SalesDaily(day=day, product_id=product_id, user_id=user_id,
+                                          quantity=quantity, revenue=revenue, count=count))
+        except IntegrityError:
+            _increment_sales_daily(day, product_id, user_id, quantity, revenue, count)
+    else:
+        SalesDaily.query.filter(
+            SalesDaily.day == day,
+            SalesDaily.product_id == product_id,
+            SalesDaily.user_id == user_id,
+            SalesDaily.count <= 0
+        ).delete(synchronize_session=False)
+
+
+def record_sale_entry(sale):
+    """Add a new sale to the daily sales rollup, in the caller's transaction."""
+    _apply_sales_delta(sale.date.date(), sale.product_id, sale.user_id, sale.quantity, sale.total, 1)
+    bump_day_versions('sales', [sale.date.date()])
+
+
+def record_sale_entries(rows):
+    """Add a batch of new sales (dicts of column values) with one update per (day, product, agent)."""
+    deltas = {}
+    for row in rows:
+        key = (row['date'].date(), row['product_id'], row['user_id'])
+        quantity, revenue, count = deltas.get(key, (0, 0.0, 0))
+        deltas[key] = (quantity + row['quantity'], revenue + row['total'], count + 1)
+    allow_queries(UPSERT_QUERIES * (len(deltas) - 1))
+    for (day, product_id, user_id), (quantity, revenue, count) in deltas.items():
+        _apply_sales_delta(day, product_id, user_id, quantity, revenue, count)
+    bump_day_versions('sales', [day for day, _, _ in deltas])
+
+
+def remove_sale_entry(sale):
+    """Take a sale that is about to be deleted out of the daily sales rollup."""
+    _apply_sales_delta(sale.date.date(), sale.product_id, sale.user_id, -sale.quantity, -sale.total, -1)
+    bump_day_versions('sales', [sale.date.date()])
+
+
+def remove_sale_entries(query, model=Sale):
+    """Take every sale matched by ``query`` out of the rollup before a bulk delete.
+
+    ``model`` is the class ``query`` reads: ``Sale`` or its archive.
+    """
+    # One grouped read and one update per (day, product, agent), not per sale
+    day = func.date(model.date)
+    grouped = query.with_entities(
+        day, model.product_id, model.user_id, func.sum(model.quantity), func.sum(model.total), func.count(model.id)
+    ).group_by(day, model.product_id, model.user_id).all()
+    allow_queries(UPSERT_QUERIES * (len(grouped) - 1))
+    for sale_day, product_id, user_id, quantity, revenue, count in grouped:
+        _apply_sales_delta(_as_date(sale_day), product_id, user_id, -int(quantity or 0), -(revenue or 0.0), -count)
+    bump_day_versions('sales', [_as_date(sale_day) for sale_day, _, _, _, _, _ in grouped])
+
+
+def period_range(day, period):
+    """Half-open ``(first_day, last_day)`` of the day, ISO week or month containing ``day``."""
+    if period == 'day':
+        return day, day + timedelta(days=1)
+    if period == 'week':
+        first_day = day - timedelta(days=day.weekday())
+        return first_day, first_day + timedelta(days=7)
+    if period == 'month':
+        first_day = day.replace(day=1)
+        if first_day.month == 12:
+            return first_day, first_day.replace(year=first_day.year + 1, month=1)
+        return first_day, first_day.replace(month=first_day.month + 1)
+    raise ValueError(f'Unknown period: {period}')
+
+
+def sales_totals(first_day=None, last_day=None, user_id=None):
+    """Total revenue and quantity for days ``first_day <= day < last_day``."""
+    query = db.session.query(
+        func.coalesce(func.sum(SalesDaily.revenue), 0),
+        func.coalesce(func.sum(SalesDaily.quantity), 0)
+    )
+    if first_day is not None:
+        query = query.filter(SalesDaily.day >= first_day)
+    if last_day is not None:
+        query = query.filter(SalesDaily.day < last_day)
+    if user_id is not None:
+        query = query.filter(SalesDaily.user_id == user_id)
+    revenue, quantity = query.one()
+    return {'revenue': float(revenue), 'quantity': int(quantity)}
+
+
+def sales_by_product(first_day, last_day, user_id=None):
+    """Per-product quantity, revenue and sale count for ``first_day <= day < last_day``."""
+    query = db.session.query(
+        SalesDaily.product_id,
+        Product.name,
+        func.sum(SalesDaily.quantity),
+        func.sum(SalesDaily.revenue),
+        func.sum(SalesDaily.count)
+    ).join(Product, Product.id == SalesDaily.product_id).filter(
+        SalesDaily.day >= first_day,
+        SalesDaily.day < last_day
+    )
+    if user_id is not None:
+        query = query.filter(SalesDaily.user_id == user_id)
+    rows = query.group_by(SalesDaily.product_id, Product.name).order_by(Product.name).all()
+    return [{'product_id': product_id, 'product': name, 'quantity': int(quantity), 'revenue': float(revenue),
+             'count': int(count)}
+            for product_id, name, quantity, revenue, count in rows]
+
+
+def sales_by_agent(first_day, last_day, user_id=None):
+    """Per-agent quantity, revenue and sale count for ``first_day <= day < last_day``."""
+    query = db.session.query(
+        SalesDaily.user_id,
+        User.full_name,
+        func.sum(SalesDaily.quantity),
+        func.sum(SalesDaily.revenue),
+        func.sum(SalesDaily.count)
+    ).join(User, User.id == SalesDaily.user_id).filter(
+        SalesDaily.day >= first_day,
+        SalesDaily.day < last_day
+    )
+    if user_id is not None:
+        query = query.filter(SalesDaily.user_id == user_id)
+    rows = query.group_by(SalesDaily.user_id, User.full_name).order_by(User.full_name).all()
+    return [{'user_id': agent_id, 'full_name': full_name, 'quantity': int(quantity),
+             'revenue': float(revenue), 'count': int(count)}
+            for agent_id, full_name, quantity, revenue, count in rows]
+
+
+def compute_sales_daily():
+    # Full scan of sales and its archive, used only to rebuild or verify the rollup
+    totals = {}
+    for source in (Sale, SaleArchive):
+        day = func.date(source.date)
+        rows = db.session.query(
+            day, source.product_id, source.user_id,
+            func.sum(source.quantity), func.sum(source.total), func.count(source.id)
+        ).group_by(day, source.product_id, source.user_id).all()
+        for d, product_id, user_id, quantity, revenue, count in rows:
+            key = (_as_date(d), product_id, user_id)
+            units, amount, sales = totals.get(key, (0, 0.0, 0))
+            totals[key] = (units + int(quantity or 0), amount + (revenue or 0.0), sales + count)
+    return totals
+
+
+def verify_sales_daily():
+    """Return ``{(day, product_id, user_id): (expected, stored)}`` for every row that drifted."""
+    expected = compute_sales_daily()
+    stored = {(r.day, r.product_id, r.user_id): (r.quantity, r.revenue, r.count) for r in SalesDaily.query.all()}
+    mismatches = {}
+    for key in set(expected) | set(stored):
+        want, have = expected.get(key), stored.get(key)
+        if (want is None or have is None or want[0] != have[0] or want[2] != have[2]
+                or abs(want[1] - have[1]) > 0.005):
+            mismatches[key] = (want, have)
+    return mismatches
+
+
+def rebuild_sales_daily():
+    SalesDaily.query.delete(synchronize_session=False)
+    for (day, product_id, user_id), (quantity, revenue, count) in compute_sales_daily().items():
+        db.session.add(SalesDaily(day=day, product_id=product_id, user_id=user_id,
+                                  quantity=quantity, revenue=revenue, count=count))
+    db.session.commit()
+
+
+def reconcile_sales_stock(first_day=None, last_day=None):
+    """Compare units sold with stock taken out, per product, for ``first_day <= day < last_day``.
+
+    Returns ``[{'product_id', 'product', 'sold', 'out'}]`` for the products
+    where the two differ. Sales come from the daily rollup, stock from the
+    movements (archive included), both keyed by product id.
+    """
+    sold_query = db.session.query(SalesDaily.product_id, func.sum(SalesDaily.quantity))
+    if first_day is not None:
+        sold_query = sold_query.filter(SalesDaily.day >= first_day)
+    if last_day is not None:
+        sold_query = sold_query.filter(SalesDaily.day < last_day)
+    sold = {product_id: int(quantity or 0) for product_id, quantity in sold_query.group_by(SalesDaily.product_id)}
+    start = datetime.combine(first_day, time.min) if first_day is not None else None
+    out = {}
+    for source in sources(Stock, start):
+        out_query = db.session.query(source.product_id, func.sum(func.coalesce(source.quantity_out, 0)))
+        if start is not None:
+            out_query = out_query.filter(source.date >= start)
+        if last_day is not None:
+            out_query = out_query.filter(source.date < datetime.combine(last_day, time.min))
+        for product_id, quantity in out_query.group_by(source.product_id):
+            out[product_id] = out.get(product_id, 0) + int(quantity or 0)
+    differing = [product_id for product_id in set(sold) | set(out)
+                 if sold.get(product_id, 0) != out.get(product_id, 0)]
+    if not differing:
+        return []
+    names = dict(db.session.query(Product.id, Product.name).filter(Product.id.in_(differing)).all())
+    return sorted(({'product_id': product_id, 'product': names.get(product_id), 'sold': sold.get(product_id, 0),
+                    'out': out.get(product_id, 0)} for product_id in differing), key=lambda row: row['product'] or '')
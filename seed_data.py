@@ -0,0 +1,155 @@
+"""Synthetic data for benchmarks and load tests.
+
+``flask seed-data --rows 100k`` fills an empty database (point
+``DATABASE_URL`` at a scratch one) with a user of every role, a few dozen
+sales agents, a product catalogue and ``rows`` ledger entries, sales and
+stock movements spread over the last ``days`` days, then rebuilds the
+rollups from them. Popular products and busy agents get most of the rows,
+as in production. The same ``seed`` always produces the same data, so two
+benchmark runs on the same scale compare like with like.
+"""
+import random
+from datetime import datetime, timedelta
+
+from models import db, IncomeExpense, Product, Sale, Stock, User
+from passwords import hash_password
+from products import clean_product_name, normalize_product_name
+from rollups import rebuild_ledger_totals, rebuild_sales_daily, rebuild_stock_balances
+
+# Named sizes accepted by --rows
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000, '5m': 5_000_000}
+# Share of the rows going to each table
+TABLE_SHARES = {'sales': 0.4, 'stocks': 0.3, 'income_expenses': 0.3}
+# Password of every seeded user; the benchmark logs in with it
+PASSWORD = 'benchmark'
+# Logins used by the benchmark, one per role
+ROLE_USERS = {
+    'accounting': 'bench_accounting',
+    'agent_commercial': 'bench_agent',
+    'chef_commercial': 'bench_chef',
+    'stock': 'bench_stock',
+    'finance': 'bench_finance',
+    'management': 'bench_management',
+}
+MAX_AGENTS = 50
+ROWS_PER_AGENT = 20_000
+BATCH_SIZE = 10_000
+
+GOODS = ['Riz', 'Sucre', 'Huile de palme', 'Savon', 'Farine de blé', 'Farine de manioc', 'Sel', 'Lait en poudre',
+         'Café', 'Thé', 'Maïs', 'Haricots', 'Ciment', 'Tomate concentrée', 'Pâtes', 'Sardines', 'Eau minérale',
+         'Jus de fruits', 'Bière', 'Détergent', 'Allumettes', 'Bougies', 'Pétrole lampant', 'Charbon de bois']
+PACKAGINGS = ['1 kg', '5 kg', '25 kg', '50 kg', '1 L', '5 L', 'carton', 'paquet']
+DESCRIPTIONS = {
+    'income': ['Vente au comptant', 'Encaissement client', 'Acompte', 'Remboursement fournisseur'],
+    'expense': ['Achat marchandises', 'Transport', 'Salaires', 'Loyer', 'Électricité', 'Carburant',
+                'Frais bancaires', 'Entretien véhicule', 'Fournitures de bureau'],
+}
+
+
+def parse_rows(value):
+    """``'100k'``, ``'5m'`` or a plain number of rows."""
+    value = str(value).strip().lower()
+    if value in SCALES:
+        return SCALES[value]
+    return int(value.replace('_', ''))
+
+
+def _zipf_weights(count):
+    # A few items take most of the traffic
+    return [1 / (rank + 1) for rank in range(count)]
+
+
+def _seed_users(rows):
+    password_hash = hash_password(PASSWORD)  # Hashed once; every seeded user shares it
+    users = [{'username': username, 'full_name': role.replace('_', ' ').title(), 'department': role,
+              'role': role, 'password_hash': password_hash} for role, username in ROLE_USERS.items()]
+    agents = min(MAX_AGENTS, max(1, rows // ROWS_PER_AGENT))
+    users += [{'username': f'bench_agent_{n}', 'full_name': f'Agent {n}', 'department': 'commercial',
+               'role': 'agent_commercial', 'password_hash': password_hash} for n in range(1, agents)]
+    db.session.execute(db.insert(User), users)
+    by_role = {}
+    for user_id, role in db.session.query(User.id, User.role).filter(User.username.like('bench\\_%', escape='\\')):
+        by_role.setdefault(role, []).append(user_id)
+    return by_role
+
+
+def _seed_products(rng):
+    names = [f'{good} {packaging}' for good in GOODS for packaging in PACKAGINGS]
+    rng.shuffle(names)
+    db.session.execute(db.insert(Product), [
+        {'name': clean_product_name(name), 'normalized_name': normalize_product_name(name)} for name in names
+    ])
+    ids = [product_id for (product_id,) in db.session.query(Product.id).order_by(Product.id)]
+    prices = {product_id: round(rng.lognormvariate(8, 1), 2) for product_id in ids}
+    return ids, prices
+
+
+def _dates(rng, days, count):
+    # Midnight, like the forms record; a little busier towards today
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    return [today - timedelta(days=int(days * rng.random() ** 1.3)) for _ in range(count)]
+
+
+def _sales(rng, count, days, agents, product_ids, prices):
+    agent_ids = rng.choices(agents, weights=_zipf_weights(len(agents)), k=count)
+    products = rng.choices(product_ids, weights=_zipf_weights(len(product_ids)), k=count)
+    rows = []
+    for date, user_id, product_id in zip(_dates(rng, days, count), agent_ids, products):
+        quantity = rng.randint(1, 20)
+        unit_price = prices[product_id]
+        rows.append({'date': date, 'product_id': product_id, 'quantity': quantity, 'unit_price': unit_price,
+                     'total': round(quantity * unit_price, 2), 'user_id': user_id})
+    return rows
+
+
+def _stocks(rng, count, days, user_id, product_ids):
+    products = rng.choices(product_ids, weights=_zipf_weights(len(product_ids)), k=count)
+    rows = []
+    for date, product_id in zip(_dates(rng, days, count), products):
+        # Deliveries are rarer and bigger than what leaves the shelves
+        incoming = rng.random() < 0.3
+        rows.append({'date': date, 'product_id': product_id, 'user_id': user_id,
+                     'quantity_in': rng.randint(10, 500) if incoming else 0,
+                     'quantity_out': 0 if incoming else rng.randint(1, 50)})
+    return rows
+
+
+def _income_expenses(rng, count, days, user_id):
+    rows = []
+    for date in _dates(rng, days, count):
+        type = 'income' if rng.random() < 0.45 else 'expense'
+        rows.append({'date': date, 'description': rng.choice(DESCRIPTIONS[type]), 'user_id': user_id,
+                     'amount': round(rng.lognormvariate(10, 1.2), 2), 'type': type})
+    return rows
+
+
+def seed(rows, days=365, seed=0, batch_size=BATCH_SIZE, echo=None):
+    """Insert the users, products and ``rows`` raw rows, then rebuild the rollups.
+
+    Raises ``ValueError`` if the database was already seeded.
+    """
+    if User.query.filter_by(username=ROLE_USERS['management']).first():
+        raise ValueError('Database already seeded; use an empty one')
+    rng = random.Random(seed)
+    users = _seed_users(rows)
+    product_ids, prices = _seed_products(rng)
+    db.session.commit()
+
+    builders = {
+        'sales': (Sale, lambda count: _sales(rng, count, days, users['agent_commercial'], product_ids, prices)),
+        'stocks': (Stock, lambda count: _stocks(rng, count, days, users['stock'][0], product_ids)),
+        'income_expenses': (IncomeExpense, lambda count: _income_expenses(rng, count, days, users['accounting'][0])),
+    }
+    for table, share in TABLE_SHARES.items():
+        model, build = builders[table]
+        total = int(rows * share)
+        for start in range(0, total, batch_size):
+            db.session.execute(db.insert(model), build(min(batch_size, total - start)))
+            db.session.commit()
+            if echo:
+                echo(f'{table}: {min(start + batch_size, total)}/{total}')
+
+    for rebuild in (rebuild_stock_balances, rebuild_ledger_totals, rebuild_sales_daily):
+        rebuild()
+    if echo:
+        echo('Rollups rebuilt.')
@@ -0,0 +1,32 @@
+"""Change signals shared by the worker processes of one host.
+
+A process that changes something other workers cache (a user, the live
+events) calls ``touch_signal``; the others compare ``signal_state`` with
+the state they saw last, which is only a ``stat``. Each touch appends one
+byte, so two touches within one mtime tick still differ in size, and the
+file is truncated back to one byte once it reaches ``MAX_SIGNAL_BYTES``
+instead of growing with every change.
+"""
+import os
+
+MAX_SIGNAL_BYTES = 4096
+
+
+def signal_state(path):
+    """What a reader compares: ``(mtime_ns, size)``, or 0 before the first touch."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return 0
+    return stat.st_mtime_ns, stat.st_size
+
+
+def touch_signal(path):
+    """Tell the other workers that something changed; errors are ignored."""
+    try:
+        with open(path, 'a') as f:
+            if f.tell() >= MAX_SIGNAL_BYTES:
+                f.truncate(0)
+            f.write('.')
+    except OSError:
+        pass
@@ -0,0 +1,64 @@
+"""Import-time and memory budget of a web worker.
+
+``flask startup-check`` imports the app in a fresh interpreter, as the
+gunicorn master does before forking workers (or each worker, without
+preload), and fails when that takes longer than
+``STARTUP_IMPORT_BUDGET_MS``, leaves the process bigger than
+``STARTUP_RSS_BUDGET_MB``, or loads one of ``DEFERRED_MODULES``: those are
+only imported by the code that needs them (the PDF stack, on the first
+report). The import runs ``runs`` times and the fastest counts, so a busy
+machine does not fail the check.
+"""
+import json
+import os
+import subprocess
+import sys
+
+DEFAULT_RUNS = 3
+# Loaded on first use only; none of them may be imported at boot
+DEFERRED_MODULES = ('weasyprint', 'pdfkit', 'fontTools', 'PIL', 'pydyf', 'tinycss2', 'cssselect2', 'pyphen')
+
+_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    'import_ms': elapsed * 1000,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': sorted(sys.modules),
+}))
+"""
+
+
+def measure(runs=DEFAULT_RUNS, root=None):
+    """Import the app ``runs`` times in new interpreters; the fastest run's figures.
+
+    Returns ``{'import_ms', 'rss_mb', 'loaded'}``, ``loaded`` being the
+    ``DEFERRED_MODULES`` found in ``sys.modules`` after the import.
+    """
+    root = root or os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', _PROBE], cwd=root, check=True, capture_output=True,
+                                text=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    best = min(samples, key=lambda sample: sample['import_ms'])
+    modules = set(best['modules'])
+    return {
+        'import_ms': round(best['import_ms'], 1),
+        'rss_mb': round(min(sample['rss_mb'] for sample in samples), 1),
+        'loaded': [name for name in DEFERRED_MODULES if name in modules],
+    }
+
+
+def check(measurement, import_budget_ms, rss_budget_mb):
+    """Messages for each budget ``measurement`` exceeds (empty when within budget)."""
+    failures = []
+    if measurement['import_ms'] > import_budget_ms:
+        failures.append(f"import took {measurement['import_ms']:.0f} ms, budget is {import_budget_ms} ms")
+    if measurement['rss_mb'] > rss_budget_mb:
+        failures.append(f"RSS after import is {measurement['rss_mb']:.1f} MiB, budget is {rss_budget_mb} MiB")
+    if measurement['loaded']:
+        failures.append(f"imported at boot: {', '.join(measurement['loaded'])}")
+    return failures
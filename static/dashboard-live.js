@@ -0,0 +1,242 @@
+// In-place updates for the dashboards.
+//
+// The form is posted as JSON to /api/dashboard/<table>; the answer holds
+// the rows added since the newest one the page shows and the table's
+// summary, which are patched into the page instead of reloading it. When
+// the server cannot be reached the form is submitted the normal way, so
+// the service worker can queue it for the next sync.
+//
+// Read-only views (chef commercial, management) follow the live feed
+// instead and patch each pushed event into the page.
+(function (root) {
+  'use strict';
+
+  // Same output as the format_currency template filter: 12345.6 -> 12,345.60
+  function formatCurrency(value) {
+    const number = Number(value);
+    if (!isFinite(number)) {
+      return value;
+    }
+    return number.toLocaleString('en-US', { minimumFractionDigits: 2, maximumFractionDigits: 2 });
+  }
+
+  function escapeHtml(value) {
+    return String(value === null || value === undefined ? '' : value)
+      .replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+      .replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+  }
+
+  // Rows are ordered newest first on (date, id), like the server's pages
+  function isNewer(row, other) {
+    return row.date > other.date || (row.date === other.date && row.id > other.id);
+  }
+
+  class DashboardLive {
+    // options: form, table, tbody, renderRow(row) -> '<tr>...</tr>' HTML,
+    // renderSummary(summary), firstPage (new rows only belong on the first
+    // page), hasMore (older rows exist past the last one shown),
+    // successMessage, alerts (element that receives messages). Without
+    // firstPage/hasMore, the tbody's data-first-page/data-has-more are read,
+    // so a cached fragment carries its own page flags
+    constructor(options) {
+      this.form = options.form;
+      this.table = options.table;
+      this.tbody = options.tbody;
+      this.renderRow = options.renderRow;
+      this.renderSummary = options.renderSummary || function () {};
+      const flags = (this.tbody && this.tbody.dataset) || {};
+      this.firstPage = 'firstPage' in options ? options.firstPage !== false : flags.firstPage !== 'false';
+      this.hasMore = 'hasMore' in options ? Boolean(options.hasMore) : flags.hasMore === 'true';
+      this.successMessage = options.successMessage || '';
+      this.alerts = options.alerts || (this.form && this.form.parentNode);
+      this.lastId = 0;
+      this.shownRows().forEach(tr => {
+        this.lastId = Math.max(this.lastId, Number(tr.dataset.id));
+      });
+      if (this.form) {
+        this.form.addEventListener('submit', event => this.submit(event));
+      }
+    }
+
+    shownRows() {
+      return this.tbody ? Array.from(this.tbody.querySelectorAll('tr[data-id]')) : [];
+    }
+
+    csrfToken() {
+      const input = this.form.querySelector('input[name="csrf_token"]');
+      return input ? input.value : '';
+    }
+
+    formData() {
+      const data = {};
+      new FormData(this.form).forEach((value, name) => {
+        if (name !== 'csrf_token' && name !== 'submit') {
+          data[name] = value;
+        }
+      });
+      return data;
+    }
+
+    async submit(event) {
+      event.preventDefault();
+      const button = this.form.querySelector('[type="submit"]');
+      if (button) {
+        button.disabled = true;
+      }
+      this.clearErrors();
+      let response;
+      try {
+        response = await fetch('/api/dashboard/' + this.table, {
+          method: 'POST',
+          credentials: 'same-origin',
+          headers: { 'Content-Type': 'application/json', 'X-CSRFToken': this.csrfToken() },
+          body: JSON.stringify({ data: this.formData(), since_id: this.lastId })
+        });
+      } catch (error) {
+        // Offline: a plain submit goes through the service worker's queue
+        HTMLFormElement.prototype.submit.call(this.form);
+        return;
+      } finally {
+        if (button) {
+          button.disabled = false;
+        }
+      }
+      if (response.redirected) {
+        // Sent to the login page: the session expired
+        window.location.reload();
+        return;
+      }
+      let result = {};
+      try {
+        result = await response.json();
+      } catch (error) {
+        // An HTML error page
+      }
+      if (response.ok) {
+        this.apply(result);
+        this.resetForm();
+        this.showMessage(this.successMessage, 'success');
+      } else if (result.errors) {
+        this.showErrors(result.errors);
+      } else {
+        this.showMessage(result.message || ('Erreur ' + response.status), 'danger');
+      }
+    }
+
+    // Fetch what other users added since the page was last patched
+    async refresh() {
+      const response = await fetch('/api/dashboard/' + this.table + '/rows?since_id=' + this.lastId,
+                                   { credentials: 'same-origin' });
+      if (response.ok && !response.redirected) {
+        this.apply(await response.json());
+      }
+    }
+
+    apply(result) {
+      if (result.truncated) {
+        window.location.reload();
+        return;
+      }
+      if (this.firstPage && this.tbody) {
+        // Oldest first, so each row lands after any newer one of the same batch
+        (result.rows || []).slice().reverse().forEach(row => this.insertRow(row));
+      }
+      this.lastId = Math.max(this.lastId, result.last_id || 0);
+      if (result.summary) {
+        this.renderSummary(result.summary, this);
+      }
+    }
+
+    insertRow(row) {
+      if (this.tbody.querySelector('tr[data-id="' + row.id + '"]')) {
+        return;
+      }
+      const before = this.shownRows().find(other => isNewer(row, {
+        id: Number(other.dataset.id), date: other.dataset.date
+      }));
+      if (!before && this.hasMore) {
+        // Older than every row shown: it belongs on a later page
+        return;
+      }
+      const template = document.createElement('template');
+      template.innerHTML = this.renderRow(row).trim();
+      const tr = template.content.firstElementChild;
+      tr.dataset.id = row.id;
+      tr.dataset.date = row.date;
+      tr.classList.add('table-success');
+      this.tbody.querySelectorAll('tr[data-empty]').forEach(placeholder => placeholder.remove());
+      this.tbody.insertBefore(tr, before || null);
+    }
+
+    removeRow(id) {
+      const tr = this.tbody && this.tbody.querySelector('tr[data-id="' + id + '"]');
+      if (tr) {
+        tr.remove();
+      }
+    }
+
+    resetForm() {
+      // Keep the date: entries usually come in batches for the same day
+      const date = this.form.querySelector('input[name="date"]');
+      const day = date ? date.value : null;
+      this.form.reset();
+      if (date) {
+        date.value = day;
+      }
+    }
+
+    showMessage(message, category) {
+      if (!message || !this.alerts) {
+        return;
+      }
+      const alert = document.createElement('div');
+      alert.className = 'alert alert-' + category + ' alert-dismissible fade show';
+      alert.setAttribute('role', 'alert');
+      alert.innerHTML = escapeHtml(message) +
+        '<button type="button" class="btn-close" data-bs-dismiss="alert" aria-label="Close"></button>';
+      this.alerts.insertBefore(alert, this.alerts.firstChild);
+    }
+
+    showErrors(errors) {
+      Object.keys(errors).forEach(name => {
+        const field = this.form.querySelector('[name="' + name + '"]');
+        const message = errors[name].join(' ');
+        if (!field) {
+          this.showMessage(message, 'danger');
+          return;
+        }
+        field.classList.add('is-invalid');
+        const feedback = document.createElement('div');
+        feedback.className = 'invalid-feedback';
+        feedback.textContent = message;
+        field.insertAdjacentElement('afterend', feedback);
+      });
+    }
+
+    clearErrors() {
+      this.form.querySelectorAll('.is-invalid').forEach(field => field.classList.remove('is-invalid'));
+      this.form.querySelectorAll('.invalid-feedback').forEach(feedback => feedback.remove());
+    }
+  }
+
+  // Follow the /live/events feed from lastEventId (the newest event when the
+  // page was rendered); onEvent receives {id, table, action, row}. The
+  // browser reconnects by itself and resumes from the last event it saw.
+  DashboardLive.follow = function (lastEventId, onEvent) {
+    if (!root.EventSource) {
+      return null;
+    }
+    const source = new EventSource('/live/events?last_event_id=' + encodeURIComponent(lastEventId));
+    source.onmessage = message => onEvent(JSON.parse(message.data));
+    // Too much was missed to catch up event by event
+    source.addEventListener('reset', () => {
+      source.close();
+      window.location.reload();
+    });
+    return source;
+  };
+
+  DashboardLive.formatCurrency = formatCurrency;
+  DashboardLive.escape = escapeHtml;
+  root.DashboardLive = DashboardLive;
+})(window);
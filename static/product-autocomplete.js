@@ -0,0 +1,64 @@
+// Product name suggestions for the sale and stock forms.
+//
+// Inputs marked data-product-autocomplete get a <datalist> filled from
+// /api/products?q=<what was typed>, so agents pick an existing product
+// instead of typing a new spelling of it. Offline, the input stays a plain
+// text field.
+(function (root) {
+  'use strict';
+
+  const DELAY_MS = 200;
+
+  function attach(input) {
+    const list = document.createElement('datalist');
+    list.id = input.id + '-suggestions';
+    input.insertAdjacentElement('afterend', list);
+    input.setAttribute('list', list.id);
+    input.setAttribute('autocomplete', 'off');
+
+    let timer = null;
+    let lastQuery = null;
+    let controller = null;
+
+    async function load() {
+      const query = input.value.trim();
+      if (query === lastQuery) {
+        return;
+      }
+      lastQuery = query;
+      if (controller) {
+        controller.abort();
+      }
+      controller = root.AbortController ? new AbortController() : null;
+      let names;
+      try {
+        const response = await fetch('/api/products?q=' + encodeURIComponent(query), {
+          credentials: 'same-origin',
+          signal: controller ? controller.signal : undefined
+        });
+        if (!response.ok || response.redirected) {
+          return;
+        }
+        names = (await response.json()).products || [];
+      } catch (error) {
+        // Offline or superseded by a newer query
+        return;
+      }
+      list.replaceChildren(...names.map(name => {
+        const option = document.createElement('option');
+        option.value = name;
+        return option;
+      }));
+    }
+
+    input.addEventListener('input', () => {
+      clearTimeout(timer);
+      timer = setTimeout(load, DELAY_MS);
+    });
+    input.addEventListener('focus', load, { once: true });
+  }
+
+  document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('input[data-product-autocomplete]').forEach(attach);
+  });
+})(window);
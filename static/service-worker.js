@@ -1,41 +1,8 @@
-const CACHE_NAME = 'savane-app-v1';
-const urlsToCache = [
-  '/',
-  '/offline',
-  '/static/style.css',
-  '/static/icon-192x192.png',
-  '/static/icon-512x512.png',
-  'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css',
-  'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/bootstrap-icons.css',
-  'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js'
-];
+// Superseded by /sw.js, which is served from the site root so it controls
+// every page (a worker under /static/ only sees /static/ requests).
+// Browsers that installed this one replace it with nothing on next update.
+self.addEventListener('install', () => self.skipWaiting());
 
-// Install event - cache essential resources
-self.addEventListener('install', (event) => {
-  event.waitUntil(
-    caches.open(CACHE_NAME)
-      .then((cache) => cache.addAll(urlsToCache))
-  );
-});
-
-// Activate event - cleanup old caches
-self.addEventListener('activate', (event) => {
-  event.waitUntil(
-    caches.keys().then(keys => {
-      return Promise.all(
-        keys.filter(k => k !== CACHE_NAME)
-            .map(k => caches.delete(k))
-      );
-    })
-  );
-});
-
-// Fetch event - serve from cache if available, fallback to offline page
-self.addEventListener('fetch', (event) => {
-  event.respondWith(
-    fetch(event.request).catch(() => {
-      return caches.match(event.request)
-        .then(response => response || caches.match('/offline'));
-    })
-  );
+self.addEventListener('activate', event => {
+  event.waitUntil(self.registration.unregister());
 });
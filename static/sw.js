@@ -1,12 +1,27 @@
-const CACHE_NAME = 'savane-app-v1';
+// /sw.js prepends self.ASSETS = {version, urls} from the asset build
+const ASSETS = self.ASSETS || { version: 'dev', urls: {} };
+const assetUrl = name => ASSETS.urls[name] || '/static/' + name;
+
+importScripts(assetUrl('sync-queue.js'));
+
+const CACHE_NAME = 'savane-app-' + ASSETS.version;
+const SYNC_TAG = 'savane-sync';
 const urlsToCache = [
   '/',
-  '/static/style.css',
-  '/static/icon-192x192.png',
-  '/static/icon-512x512.png',
+  assetUrl('style.css'),
+  assetUrl('icon-192x192.png'),
+  assetUrl('icon-512x512.png'),
+  assetUrl('sync-queue.js'),
+  assetUrl('dashboard-live.js'),
+  assetUrl('product-autocomplete.js'),
   '/offline.html'
 ];
 
+const syncQueue = new SyncQueue({
+  store: new IdbQueueStore(indexedDB),
+  fetch: (url, options) => fetch(url, options)
+});
+
 // Install event
 self.addEventListener('install', event => {
   event.waitUntil(
@@ -15,19 +30,109 @@ self.addEventListener('install', event => {
   );
 });
 
-// Fetch event
+// Activate event - drop old caches and send anything queued by a previous version
+self.addEventListener('activate', event => {
+  event.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(keys.filter(k => k !== CACHE_NAME).map(k => caches.delete(k))))
+      .then(() => self.clients.claim())
+      .then(() => flushQueue())
+  );
+});
+
+async function notifyClients(message) {
+  const clients = await self.clients.matchAll({ includeUncontrolled: true });
+  clients.forEach(client => client.postMessage(message));
+}
+
+async function flushQueue() {
+  const summary = await syncQueue.flush();
+  await notifyClients({ type: 'sync', summary: summary, pending: await syncQueue.store.count() });
+  return summary;
+}
+
+function queuedPage(pending) {
+  const html = `<!DOCTYPE html>
+<html lang="fr"><head><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Enregistré hors ligne</title><link rel="stylesheet" href="/static/style.css"></head>
+<body style="font-family: sans-serif; text-align: center; padding: 2rem;">
+<h2>Enregistré hors ligne</h2>
+<p>Pas de connexion : l'enregistrement a été mis en file d'attente et sera envoyé dès le retour du réseau.</p>
+<p>${pending} enregistrement(s) en attente.</p>
+<p><a href="javascript:history.back()">Retour</a></p>
+</body></html>`;
+  return new Response(html, { headers: { 'Content-Type': 'text/html; charset=utf-8' } });
+}
+
+// A record form POST that cannot reach the server is queued for the next sync
+async function submitOrQueue(request, table) {
+  const copy = request.clone();
+  try {
+    return await fetch(request);
+  } catch (error) {
+    await syncQueue.enqueueForm(table, await copy.formData());
+    if (self.registration.sync) {
+      self.registration.sync.register(SYNC_TAG).catch(() => {});
+    }
+    return queuedPage(await syncQueue.store.count());
+  }
+}
+
+// Fetch event - network first, cached copy or offline page when the network is down
 self.addEventListener('fetch', event => {
-  event.respondWith(
-    caches.match(event.request)
-      .then(response => {
-        // Return cached version or fetch from network
-        return response || fetch(event.request);
-      })
-      .catch(() => {
-        // Return offline page for navigation requests
-        if (event.request.mode === 'navigate') {
-          return caches.match('/offline.html');
+  const url = new URL(event.request.url);
+  const table = url.origin === self.location.origin && SYNC_FORMS[url.pathname];
+  if (event.request.method === 'POST' && table) {
+    event.respondWith(submitOrQueue(event.request, table));
+    return;
+  }
+  if (event.request.method !== 'GET') {
+    return;
+  }
+  // Fingerprinted files never change under the same URL: cache first
+  if (url.origin === self.location.origin && url.pathname.startsWith('/static/dist/')) {
+    event.respondWith(
+      caches.match(event.request).then(cached => cached || fetch(event.request).then(response => {
+        if (response.ok) {
+          const copy = response.clone();
+          caches.open(CACHE_NAME).then(cache => cache.put(event.request, copy));
         }
-      })
+        return response;
+      }))
+    );
+    return;
+  }
+  event.respondWith(
+    fetch(event.request)
+      .catch(() => caches.match(event.request)
+        .then(response => {
+          if (response) {
+            return response;
+          }
+          // Return offline page for navigation requests
+          if (event.request.mode === 'navigate') {
+            return caches.match('/offline.html');
+          }
+          return Response.error();
+        }))
   );
-});
\ No newline at end of file
+});
+
+// Background Sync, where supported, wakes the worker once the connection is back
+self.addEventListener('sync', event => {
+  if (event.tag === SYNC_TAG) {
+    event.waitUntil(flushQueue().then(summary => {
+      if (summary.status !== 'done') {
+        // Let the browser retry later
+        throw new Error('Sync incomplete: ' + summary.status);
+      }
+    }));
+  }
+});
+
+// Pages ask for a flush when they come back online or load
+self.addEventListener('message', event => {
+  if (event.data && event.data.type === 'flush') {
+    event.waitUntil(flushQueue());
+  }
+});
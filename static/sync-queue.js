@@ -0,0 +1,188 @@
+// Offline submission queue shared by the service worker (importScripts) and
+// the tests under tests/js.
+//
+// Each submission gets a random idempotency key when it is queued. flush()
+// sends the oldest submissions to /api/sync in batches and only forgets a
+// submission once the server answered for it, so a batch lost half-way is
+// simply sent again: the server recognises the keys it already applied.
+
+(function (root) {
+  const DB_NAME = 'savane-sync';
+  const DB_VERSION = 1;
+
+  // Form field names of each record page, keyed by the table they write
+  const SYNC_TABLES = {
+    income_expenses: ['date', 'description', 'amount', 'type'],
+    sales: ['date', 'product', 'quantity', 'unit_price'],
+    stocks: ['date', 'product', 'quantity_in', 'quantity_out'],
+  };
+
+  // Record pages whose POSTs are queued when the network is down
+  const SYNC_FORMS = {
+    '/dashboard/accounting': 'income_expenses',
+    '/record/income_expense': 'income_expenses',
+    '/dashboard/commercial': 'sales',
+    '/record/sale': 'sales',
+    '/dashboard/stock': 'stocks',
+    '/record/stock': 'stocks',
+  };
+
+  function newKey() {
+    if (root.crypto && root.crypto.randomUUID) {
+      return root.crypto.randomUUID();
+    }
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2) + Math.random().toString(36).slice(2);
+  }
+
+  function requestPromise(request) {
+    return new Promise((resolve, reject) => {
+      request.onsuccess = () => resolve(request.result);
+      request.onerror = () => reject(request.error);
+    });
+  }
+
+  // Queue kept in IndexedDB so it survives the service worker being stopped
+  class IdbQueueStore {
+    constructor(indexedDB) {
+      this.indexedDB = indexedDB;
+      this.db = null;
+    }
+
+    open() {
+      if (!this.db) {
+        const request = this.indexedDB.open(DB_NAME, DB_VERSION);
+        request.onupgradeneeded = () => {
+          const db = request.result;
+          const queue = db.createObjectStore('queue', { keyPath: 'key' });
+          queue.createIndex('queuedAt', 'queuedAt');
+          db.createObjectStore('rejected', { keyPath: 'key' });
+        };
+        this.db = requestPromise(request);
+      }
+      return this.db;
+    }
+
+    async transaction(stores, mode, work) {
+      const db = await this.open();
+      const tx = db.transaction(stores, mode);
+      const result = work(tx);
+      await new Promise((resolve, reject) => {
+        tx.oncomplete = resolve;
+        tx.onerror = () => reject(tx.error);
+        tx.onabort = () => reject(tx.error);
+      });
+      return result;
+    }
+
+    add(item) {
+      return this.transaction(['queue'], 'readwrite', tx => { tx.objectStore('queue').put(item); });
+    }
+
+    async peek(limit) {
+      const db = await this.open();
+      const index = db.transaction(['queue']).objectStore('queue').index('queuedAt');
+      return requestPromise(index.getAll(null, limit));
+    }
+
+    remove(key) {
+      return this.transaction(['queue'], 'readwrite', tx => { tx.objectStore('queue').delete(key); });
+    }
+
+    reject(item, errors) {
+      return this.transaction(['queue', 'rejected'], 'readwrite', tx => {
+        tx.objectStore('queue').delete(item.key);
+        tx.objectStore('rejected').put(Object.assign({}, item, { errors: errors, rejectedAt: Date.now() }));
+      });
+    }
+
+    async count() {
+      const db = await this.open();
+      return requestPromise(db.transaction(['queue']).objectStore('queue').count());
+    }
+  }
+
+  class SyncQueue {
+    constructor({ store, fetch, url = '/api/sync', batchSize = 50 }) {
+      this.store = store;
+      this.fetch = fetch;
+      this.url = url;
+      this.batchSize = batchSize;
+      this.flushing = null;
+    }
+
+    async enqueue(table, data) {
+      const item = { key: newKey(), table: table, data: data, queuedAt: Date.now() };
+      await this.store.add(item);
+      return item;
+    }
+
+    // Queue a submitted record form, keeping only the fields the server reads
+    enqueueForm(table, formData) {
+      const data = {};
+      for (const name of SYNC_TABLES[table]) {
+        const value = formData.get(name);
+        if (value !== null && value !== '') {
+          data[name] = value;
+        }
+      }
+      return this.enqueue(table, data);
+    }
+
+    // One flush at a time; concurrent callers share the running one
+    flush() {
+      if (!this.flushing) {
+        this.flushing = this.flushAll().finally(() => { this.flushing = null; });
+      }
+      return this.flushing;
+    }
+
+    async flushAll() {
+      const summary = { status: 'done', applied: 0, duplicate: 0, rejected: 0 };
+      for (;;) {
+        const batch = await this.store.peek(this.batchSize);
+        if (!batch.length) {
+          return summary;
+        }
+        let response;
+        try {
+          response = await this.fetch(this.url, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ submissions: batch.map(item => ({ key: item.key, table: item.table, data: item.data })) }),
+          });
+        } catch (error) {
+          summary.status = 'offline';
+          return summary;
+        }
+        // An expired session is redirected to the login page, which is not JSON
+        const type = response.headers.get('Content-Type') || '';
+        if (!response.ok || type.indexOf('application/json') === -1) {
+          summary.status = response.status === 409 ? 'conflict' : 'error';
+          return summary;
+        }
+        const body = await response.json();
+        const byKey = new Map(batch.map(item => [item.key, item]));
+        for (const result of body.results) {
+          const item = byKey.get(result.key);
+          if (!item) {
+            continue;
+          }
+          if (result.status === 'rejected') {
+            await this.store.reject(item, result.errors);
+          } else {
+            await this.store.remove(item.key);
+          }
+          summary[result.status] += 1;
+        }
+      }
+    }
+  }
+
+  const api = { SYNC_TABLES, SYNC_FORMS, IdbQueueStore, SyncQueue, newKey };
+  if (typeof module !== 'undefined' && module.exports) {
+    module.exports = api;
+  } else {
+    Object.assign(root, api);
+  }
+})(typeof self !== 'undefined' ? self : globalThis);
@@ -0,0 +1,78 @@
+"""Stock keepers: the movements dashboard and the record page."""
+from datetime import datetime
+
+from flask import Blueprint, flash, redirect, render_template, url_for
+from flask_login import current_user, login_required
+
+from conditional import conditional_get
+from forms import StockForm
+from models import db, Stock
+from pagination import keyset_paginate
+from products import get_or_create_product
+from query_budget import query_budget
+from read_models import stock_rows
+from rollups import record_stock_movement, get_stock_levels
+
+bp = Blueprint('stock', __name__)
+
+@bp.route('/dashboard/stock', methods=['GET', 'POST'])
+@login_required
+@query_budget(20)
+@conditional_get('stocks', 'users')
+def stock_dashboard():
+    if current_user.role != 'stock':
+        return render_template('unauthorized.html')
+    
+    form = StockForm()
+    if form.validate_on_submit():
+        product = get_or_create_product(form.product.data)
+        stock = Stock(
+            date=datetime.combine(form.date.data, datetime.min.time()),
+            product_id=product.id,
+            product=product,
+            quantity_in=form.quantity_in.data,
+            quantity_out=form.quantity_out.data,
+            user_id=current_user.id
+        )
+        db.session.add(stock)
+        record_stock_movement(stock)
+        db.session.commit()
+        flash('Stock movement recorded successfully!', 'success')
+        return redirect(url_for('stock.stock_dashboard'))
+    
+    # Available quantities for each product come from the balance table
+    products = get_stock_levels()
+    
+    movements = keyset_paginate(stock_rows(), Stock)
+    return render_template('dashboard_stock.html', form=form, movements=movements, products=products)
+
+@bp.route('/record/stock', methods=['GET', 'POST'])
+@login_required
+@query_budget(20)
+@conditional_get('stocks', 'users')
+def record_stock():
+    if current_user.role != 'stock':
+        return render_template('unauthorized.html')
+    
+    form = StockForm()
+    if form.validate_on_submit():
+        product = get_or_create_product(form.product.data)
+        stock = Stock(
+            date=datetime.combine(form.date.data, datetime.min.time()),
+            product_id=product.id,
+            product=product,
+            quantity_in=form.quantity_in.data,
+            quantity_out=form.quantity_out.data,
+            user_id=current_user.id  # This ensures we track who made the record
+        )
+        db.session.add(stock)
+        record_stock_movement(stock)
+        db.session.commit()
+        flash('Stock movement recorded successfully!', 'success')
+        return redirect(url_for('stock.record_stock'))
+    
+    # Available quantities for each product come from the balance table
+    products = get_stock_levels()
+    
+    movements = keyset_paginate(stock_rows(), Stock, default_per_page=5)
+    return render_template('record_stock.html', form=form, movements=movements, products=products)
@@ -0,0 +1,87 @@
+"""Batch sync of submissions queued offline by the service worker.
+
+The client gives every submission a random idempotency key when it is
+queued and resends the whole queue until it gets an answer, so a batch
+may repeat submissions that were already applied. Keys are recorded per
+user in ``sync_submissions`` in the same transaction as the rows they
+created; a known key is answered ``duplicate`` and skipped. All new
+valid submissions of a batch are applied in one transaction. Invalid
+ones are answered ``rejected`` with the form errors, since resending
+them can never succeed.
+"""
+from datetime import datetime
+
+from models import db, SyncSubmission
+from imports import IMPORTS, IMPORT_ROLES, validate_row, insert_rows
+
+MAX_BATCH = 200
+MAX_KEY_LENGTH = 64
+
+
+def _check_submission(item, user):
+    """Return an error message for a malformed or forbidden submission, or None."""
+    if not isinstance(item, dict):
+        return 'Invalid submission'
+    key = item.get('key')
+    if not isinstance(key, str) or not 0 < len(key) <= MAX_KEY_LENGTH:
+        return 'Invalid idempotency key'
+    table = item.get('table')
+    if table not in IMPORTS:
+        return 'Unknown table'
+    if not isinstance(item.get('data'), dict):
+        return 'Invalid data'
+    if IMPORT_ROLES[table] != user.role:
+        return 'Unauthorized'
+    return None
+
+
+def apply_batch(submissions, user):
+    """Apply ``submissions`` for ``user`` and return one result per submission.
+
+    Raises ``IntegrityError`` if another request recorded one of the keys
+    meanwhile; nothing is applied and the client should retry.
+    """
+    results = [None] * len(submissions)
+    candidates = []
+    for i, item in enumerate(submissions):
+        error = _check_submission(item, user)
+        if error:
+            key = item.get('key') if isinstance(item, dict) else None
+            results[i] = {'key': key, 'status': 'rejected', 'errors': {'submission': [error]}}
+        else:
+            candidates.append(i)
+
+    keys = {submissions[i]['key'] for i in candidates}
+    known = set()
+    if keys:
+        known = {key for (key,) in db.session.query(SyncSubmission.key).filter(
+            SyncSubmission.user_id == user.id,
+            SyncSubmission.key.in_(keys)
+        )}
+
+    rows_by_table = {}
+    key_rows = []
+    now = datetime.utcnow()
+    for i in candidates:
+        item = submissions[i]
+        key = item['key']
+        if key in known:
+            results[i] = {'key': key, 'status': 'duplicate'}
+            continue
+        values, errors = validate_row(item['table'], item['data'], user.id)
+        if errors:
+            results[i] = {'key': key, 'status': 'rejected', 'errors': errors}
+            continue
+        # The same key twice in one batch is applied once
+        known.add(key)
+        rows_by_table.setdefault(item['table'], []).append(values)
+        key_rows.append({'user_id': user.id, 'key': key, 'table_name': item['table'], 'created_at': now})
+        results[i] = {'key': key, 'status': 'applied'}
+
+    if key_rows:
+        # One multi-row INSERT for the keys, like the rows themselves
+        db.session.execute(db.insert(SyncSubmission), key_rows)
+    for table, rows in rows_by_table.items():
+        insert_rows(table, rows)
+    db.session.commit()
+    return results
@@ -0,0 +1,54 @@
+import os
+import sys
+
+# Importing app builds the default instance; point it at SQLite instead of the MySQL settings
+os.environ['DATABASE_URL'] = 'sqlite://'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from app import create_app
+from config import Config, engine_options
+from models import db
+from seed_data import PASSWORD, ROLE_USERS, seed
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options('sqlite://')
+    WTF_CSRF_ENABLED = False
+    PASSWORD_HASH_ITERATIONS = 1000
+    USER_CACHE_SIGNAL_FILE = ''
+    LIVE_SIGNAL_FILE = ''
+    LIVE_STREAM_SECONDS = 0
+
+
+@pytest.fixture
+def app(tmp_path):
+    config = type('Config', (TestConfig,), {
+        'METRICS_DIR': str(tmp_path / 'metrics'),
+        'REPORTS_DIR': str(tmp_path / 'reports'),
+        'JINJA_BYTECODE_CACHE_DIR': str(tmp_path / 'jinja_cache'),
+    })
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        # A user of every role and a few hundred rows over the last month
+        seed(600, days=30)
+        db.session.remove()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def login(app):
+    """``login(role)``: a test client logged in as the seeded user of ``role``."""
+    def login(role):
+        client = app.test_client()
+        response = client.post('/login', data={'username': ROLE_USERS[role], 'password': PASSWORD})
+        assert response.status_code == 302
+        return client
+    return login
@@ -0,0 +1,144 @@
+// SyncQueue against an in-memory network and /api/sync, without a server
+// or IndexedDB: `node --test tests/js` (tests/test_sync.py runs it too).
+//
+// FakeSyncServer applies submissions with the same rules as sync.py
+// (per-key deduplication, rejected on invalid data); FakeNetwork can be
+// taken offline and can drop a response after the server applied the
+// batch, which is the case idempotency keys exist for.
+
+const assert = require('node:assert/strict');
+const test = require('node:test');
+
+const { SYNC_TABLES, SyncQueue } = require('../../static/sync-queue.js');
+
+class MemoryQueueStore {
+  constructor() {
+    this.queue = new Map();
+    this.rejected = new Map();
+  }
+
+  async add(item) { this.queue.set(item.key, item); }
+
+  async peek(limit) {
+    return Array.from(this.queue.values()).sort((a, b) => a.queuedAt - b.queuedAt).slice(0, limit);
+  }
+
+  async remove(key) { this.queue.delete(key); }
+
+  async reject(item, errors) {
+    this.queue.delete(item.key);
+    this.rejected.set(item.key, Object.assign({}, item, { errors: errors }));
+  }
+
+  async count() { return this.queue.size; }
+}
+
+class FakeSyncServer {
+  constructor() {
+    this.keys = new Set();
+    this.rows = [];
+  }
+
+  validate(table, data) {
+    const fields = SYNC_TABLES[table];
+    if (!fields) {
+      return { submission: ['Unknown table'] };
+    }
+    const required = table === 'stocks' ? ['date', 'product'] : fields;
+    const missing = required.filter(name => data[name] === undefined || data[name] === '');
+    if (missing.length) {
+      return Object.fromEntries(missing.map(name => [name, ['This field is required.']]));
+    }
+    return null;
+  }
+
+  handle(submissions) {
+    return submissions.map(item => {
+      if (this.keys.has(item.key)) {
+        return { key: item.key, status: 'duplicate' };
+      }
+      const errors = this.validate(item.table, item.data);
+      if (errors) {
+        return { key: item.key, status: 'rejected', errors: errors };
+      }
+      this.keys.add(item.key);
+      this.rows.push(item);
+      return { key: item.key, status: 'applied' };
+    });
+  }
+}
+
+class FakeNetwork {
+  constructor(server) {
+    this.server = server || new FakeSyncServer();
+    this.online = true;
+    // Apply the next N batches on the server but fail the request, as if the reply was lost
+    this.dropResponses = 0;
+    this.replies = [];
+    this.fetch = this.fetch.bind(this);
+  }
+
+  async fetch(url, options) {
+    if (!this.online) {
+      throw new TypeError('Failed to fetch');
+    }
+    const results = this.server.handle(JSON.parse(options.body).submissions);
+    if (this.dropResponses > 0) {
+      this.dropResponses -= 1;
+      throw new TypeError('Network connection lost');
+    }
+    this.replies.push(results);
+    const body = JSON.stringify({ success: true, results: results });
+    return {
+      ok: true,
+      status: 200,
+      headers: { get: name => (name.toLowerCase() === 'content-type' ? 'application/json' : null) },
+      json: async () => JSON.parse(body),
+    };
+  }
+}
+
+const SALE = { date: '2025-01-02', product: 'Riz', quantity: '3', unit_price: '1500' };
+
+test('offline submissions survive a lost reply and are applied once', async () => {
+  const store = new MemoryQueueStore();
+  const network = new FakeNetwork();
+  const queue = new SyncQueue({ store: store, fetch: network.fetch, batchSize: 2 });
+
+  network.online = false;
+  await queue.enqueue('sales', SALE);
+  await queue.enqueue('sales', { date: '2025-01-02', product: 'Huile', quantity: '1', unit_price: '4000' });
+  await queue.enqueue('stocks', { date: '2025-01-02', quantity_in: '5' });
+  assert.equal((await queue.flush()).status, 'offline');
+  assert.equal(await store.count(), 3);
+
+  // The server applies the first batch but its reply never arrives
+  network.online = true;
+  network.dropResponses = 1;
+  assert.equal((await queue.flush()).status, 'offline');
+  assert.equal(network.server.rows.length, 2);
+
+  const final = await queue.flush();
+  assert.deepEqual(final, { status: 'done', applied: 0, duplicate: 2, rejected: 1 });
+  assert.equal(network.server.rows.length, 2);
+  assert.equal(await store.count(), 0);
+  assert.deepEqual(Array.from(store.rejected.values()).map(item => item.table), ['stocks']);
+});
+
+test('a key replayed twice is one row with the same answer each time', async () => {
+  const network = new FakeNetwork();
+  const item = { key: 'replayed-key', table: 'sales', data: SALE, queuedAt: 1 };
+  for (let attempt = 0; attempt < 3; attempt++) {
+    const store = new MemoryQueueStore();
+    await store.add(item);
+    const queue = new SyncQueue({ store: store, fetch: network.fetch });
+    await queue.flush();
+    assert.equal(await store.count(), 0);
+  }
+  assert.equal(network.server.rows.length, 1);
+  assert.deepEqual(network.replies, [
+    [{ key: 'replayed-key', status: 'applied' }],
+    [{ key: 'replayed-key', status: 'duplicate' }],
+    [{ key: 'replayed-key', status: 'duplicate' }],
+  ]);
+});
@@ -0,0 +1,20 @@
+from benchmark import Benchmark, Case, default_cases, failed_requests
+
+
+def _run(app, cases):
+    return failed_requests(Benchmark(app, iterations=1, warmup=0).run(cases))
+
+
+def test_every_case_gets_its_status_within_budget(app):
+    assert _run(app, default_cases()) == []
+
+
+def test_unexpected_status_fails(app):
+    assert _run(app, [Case('missing page', '/nowhere', 'management')]) == [
+        'missing page: status 404, expected 200']
+
+
+def test_budget_overrun_fails(app, monkeypatch):
+    monkeypatch.setattr(app.view_functions['management.manage_users'], 'query_budget', 0)
+    failures = _run(app, [Case('manage users', '/manage_users', 'management')])
+    assert any('QueryBudgetExceeded' in failure for failure in failures)
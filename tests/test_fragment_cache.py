@@ -0,0 +1,19 @@
+from query_budget import count_queries
+
+# The keyset page queries of the three cached tables on the management dashboard
+PAGE_SELECTS = ('SELECT income_expenses.id', 'SELECT stocks.id', 'SELECT sales.id')
+
+
+def _page_selects(app, client):
+    with app.app_context(), count_queries() as counter:
+        response = client.get('/dashboard/management')
+    assert response.status_code == 200
+    return sorted(prefix for prefix in PAGE_SELECTS
+                  for statement in counter.statements if statement.lstrip().startswith(prefix))
+
+
+def test_cached_fragments_skip_their_page_queries(app, login):
+    client = login('management')
+    assert _page_selects(app, client) == sorted(PAGE_SELECTS)
+    # Nothing changed: every table comes from the fragment cache, page flags included
+    assert _page_selects(app, client) == []
@@ -0,0 +1,34 @@
+import io
+import re
+
+from models import db, Stock
+
+CSV = 'date,product,quantity_in,quantity_out\n2026-01-15,Savon 1 kg,10,0\n'
+
+
+def _upload(client, **data):
+    return client.post('/import/stocks', data={'file': (io.BytesIO(CSV.encode()), 'stocks.csv'), **data})
+
+
+def test_import_without_csrf_token_is_rejected(app, login):
+    client = login('stock')
+    app.config['WTF_CSRF_ENABLED'] = True
+    with app.app_context():
+        before = db.session.query(Stock).count()
+    response = _upload(client)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+    assert _upload(client, csrf_token='forged').status_code == 400
+    with app.app_context():
+        assert db.session.query(Stock).count() == before
+
+
+def test_import_with_the_page_token(app, login):
+    client = login('stock')
+    app.config['WTF_CSRF_ENABLED'] = True
+    page = client.get('/dashboard/stock').get_data(as_text=True)
+    form = page[page.index('id="importForm"'):]
+    token = re.search(r'name="csrf_token" value="([^"]+)"', form).group(1)
+    response = _upload(client, csrf_token=token)
+    assert response.status_code == 200
+    assert response.get_json()['imported'] == 1
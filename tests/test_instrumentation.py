@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import instrumentation
+
+
+def _exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def _requests_total(counters):
+    return sum(value for (name, _), value in counters.items() if name == 'savane_http_requests_total')
+
+
+def test_concurrent_flushes_leave_one_valid_file(app):
+    metrics_dir = app.config['METRICS_DIR']
+    instrumentation.registry().inc('savane_http_requests_total', {'route': 'test'})
+    threads = [threading.Thread(target=instrumentation.flush, kwargs={'force': True}) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    names = [name for name in os.listdir(metrics_dir) if name.startswith(f'metrics-{os.getpid()}-')]
+    assert len(names) == 1 and names[0].endswith('.json')
+    with open(os.path.join(metrics_dir, names[0])) as f:
+        json.load(f)
+
+
+def test_exited_processes_are_folded_into_the_aggregate(app):
+    metrics_dir = app.config['METRICS_DIR']
+    pid = _exited_pid()
+    counter = [['savane_http_requests_total', [['method', 'GET'], ['route', 'gone'], ['status', '200']], 5]]
+    with open(os.path.join(metrics_dir, f'metrics-{pid}-0000.json'), 'w') as f:
+        json.dump({'counters': counter, 'histograms': []}, f)
+    open(os.path.join(metrics_dir, f'metrics-{pid}-leftover.tmp'), 'w').close()
+
+    counters, _ = instrumentation.collect()
+    total = _requests_total(counters)
+    assert counters[('savane_http_requests_total', (('method', 'GET'), ('route', 'gone'), ('status', '200')))] == 5
+    assert not [name for name in os.listdir(metrics_dir) if name.startswith(f'metrics-{pid}-')]
+    assert instrumentation.AGGREGATE_FILE in os.listdir(metrics_dir)
+
+    # Folding again changes nothing; the totals come from the aggregate now
+    instrumentation.fold_exited()
+    assert _requests_total(instrumentation.collect()[0]) == total
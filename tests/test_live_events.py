@@ -0,0 +1,17 @@
+from live_events import LiveFeed
+from signal_files import MAX_SIGNAL_BYTES
+
+
+def test_commits_wake_the_other_workers_without_growing_the_signal_file(app, tmp_path):
+    signal_file = tmp_path / 'live_events.signal'
+    this_worker, other_worker = LiveFeed(), LiveFeed()
+    this_worker.configure(app, str(signal_file))
+    other_worker.configure(app, str(signal_file))
+
+    seen = other_worker._signal_state()
+    for _ in range(MAX_SIGNAL_BYTES * 2 + 10):
+        this_worker.notify()
+        state = other_worker._signal_state()
+        assert state != seen
+        seen = state
+    assert 0 < signal_file.stat().st_size <= MAX_SIGNAL_BYTES
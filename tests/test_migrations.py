@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import inspect
+
+from app import create_app
+from config import engine_options
+from conftest import TestConfig
+from migrations import MIGRATIONS, _shipped, upgrade
+from models import db, LedgerDailyTotal, Product
+from products import UNNAMED_PRODUCT
+from rollups import get_stock_levels, verify_sales_daily, verify_stock_balances
+
+
+@pytest.fixture
+def empty_app(tmp_path):
+    # A file database: the migrations mix engine DDL with session work, which
+    # the single shared in-memory connection cannot keep apart
+    uri = f"sqlite:///{tmp_path / 'app.db'}"
+    config = type('Config', (TestConfig,), {
+        'SQLALCHEMY_DATABASE_URI': uri,
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options(uri),
+        'METRICS_DIR': str(tmp_path / 'metrics'),
+        'REPORTS_DIR': str(tmp_path / 'reports'),
+        'JINJA_BYTECODE_CACHE_DIR': str(tmp_path / 'jinja_cache'),
+    })
+    app = create_app(config)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _columns(table_name):
+    return {c['name'] for c in inspect(db.engine).get_columns(table_name)}
+
+
+def test_baseline_database_upgrades_to_head(empty_app):
+    # The tables as they were before migrations existed, with free-text product names
+    _shipped.create_all(db.engine, tables=[_shipped.tables[name]
+                                           for name in ('users', 'income_expenses', 'sales', 'stocks')])
+    users, sales, stocks, ledger = (_shipped.tables[name] for name in ('users', 'sales', 'stocks', 'income_expenses'))
+    with db.engine.begin() as connection:
+        connection.execute(users.insert().values(id=1, username='agent', full_name='Agent', department='commercial',
+                                                 role='agent_commercial', password_hash='x'))
+        # A blank name too: the old forms did not strip spaces
+        for day, name in enumerate(['Savon', 'savon ', 'Riz', 'Riz', '  '], start=1):
+            date = datetime(2026, 1, day)
+            connection.execute(sales.insert().values(date=date, product=name, quantity=2, unit_price=1, total=2,
+                                                     user_id=1))
+            connection.execute(stocks.insert().values(date=date, product=name, quantity_in=5, quantity_out=2,
+                                                      user_id=1))
+            connection.execute(ledger.insert().values(date=date, description='vente', amount=2, type='income',
+                                                      user_id=1))
+
+    assert upgrade(echo=lambda message: None) == [version for version, _, _ in MIGRATIONS]
+    assert 'product' not in _columns('sales') and 'product_id' in _columns('stocks')
+    assert sorted(product.name for product in Product.query.all()) == [UNNAMED_PRODUCT, 'Riz', 'Savon']
+    assert get_stock_levels() == {UNNAMED_PRODUCT: 3, 'Riz': 6, 'Savon': 6}
+    assert verify_stock_balances() == {} and verify_sales_daily() == {}
+    assert LedgerDailyTotal.query.count() == 5
+
+
+@pytest.mark.parametrize('create_all', [False, True])
+def test_upgrade_is_idempotent(empty_app, create_all):
+    if create_all:
+        db.create_all()
+    assert upgrade(echo=lambda message: None) == [version for version, _, _ in MIGRATIONS]
+    assert upgrade(echo=lambda message: None) == []
+    indexes = {index['name'] for index in inspect(db.engine).get_indexes('sales')}
+    assert 'ix_sales_product_id_date' in indexes and 'ix_sales_product_date' not in indexes
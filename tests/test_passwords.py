@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+
+import passwords
+from config import DEFAULT_THREADS, env_int
+from passwords import HashingBusy
+
+
+@pytest.fixture
+def one_slot(monkeypatch):
+    # One hashing thread and nowhere to wait: a second concurrent hash is refused
+    monkeypatch.setitem(passwords._settings, 'concurrency', 1)
+    monkeypatch.setitem(passwords._settings, 'queue', 0)
+    monkeypatch.setattr(passwords, '_executor', None)
+
+
+def test_hash_beyond_the_queue_is_refused(one_slot):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_hash():
+        started.set()
+        release.wait(5)
+        return 'hash'
+
+    results = []
+    login = threading.Thread(target=lambda: results.append(passwords._run(slow_hash)))
+    login.start()
+    assert started.wait(5)
+    with pytest.raises(HashingBusy):
+        passwords.hash_password('secret')
+    release.set()
+    login.join()
+    assert results == ['hash']
+    # The slot is free again
+    assert passwords.verify_password(passwords.hash_password('secret'), 'secret')
+
+
+def test_default_queue_leaves_a_request_thread_free(app):
+    config = app.config
+    threads = env_int('GUNICORN_THREADS', DEFAULT_THREADS)
+    assert config['PASSWORD_HASH_CONCURRENCY'] + config['PASSWORD_HASH_QUEUE'] < threads
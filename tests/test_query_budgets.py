@@ -0,0 +1,112 @@
+import io
+from datetime import date, timedelta
+
+import pytest
+from flask import Response, stream_with_context
+
+from models import db, User
+from query_budget import QueryBudgetExceeded, query_budget
+from seed_data import ROLE_USERS
+
+# Every page and JSON read of each role; TESTING makes the budgets strict
+PAGES = [
+    ('accounting', '/dashboard/accounting'),
+    ('accounting', '/record/income_expense'),
+    ('accounting', '/api/dashboard/income_expenses/summary'),
+    ('agent_commercial', '/dashboard/commercial'),
+    ('agent_commercial', '/record/sale'),
+    ('chef_commercial', '/dashboard/commercial'),
+    ('chef_commercial', '/api/sales/summary'),
+    ('chef_commercial', '/api/dashboard/sales/rows'),
+    ('stock', '/dashboard/stock'),
+    ('stock', '/record/stock'),
+    ('stock', '/api/dashboard/stocks/summary'),
+    ('finance', '/dashboard/finance'),
+    ('management', '/dashboard/management'),
+    ('management', '/manage_users'),
+    ('management', '/select_report_dates'),
+    ('management', '/api/sales/summary?group_by=agent'),
+    ('agent_commercial', '/api/products?q=s'),
+]
+
+
+@pytest.mark.parametrize('role,path', PAGES)
+def test_pages_stay_within_budget(login, role, path):
+    assert login(role).get(path).status_code == 200
+
+
+@pytest.mark.parametrize('role,path,data', [
+    ('accounting', '/dashboard/accounting', {'description': 'Loyer', 'amount': 50, 'type': 'expense'}),
+    ('agent_commercial', '/record/sale', {'product': 'Savon 1 kg', 'quantity': 3, 'unit_price': 2.5}),
+    ('stock', '/dashboard/stock', {'product': 'Savon 1 kg', 'quantity_in': 10, 'quantity_out': 0}),
+])
+def test_record_writes_stay_within_budget(login, role, path, data):
+    response = login(role).post(path, data={'date': date.today().isoformat(), **data})
+    assert response.status_code in (200, 302)
+
+
+def test_delete_user_with_a_month_of_sales(app, login):
+    with app.app_context():
+        user_id = db.session.query(User.id).filter_by(username=ROLE_USERS['agent_commercial']).scalar()
+    response = login('management').post(f'/delete_user/{user_id}')
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.get(User, user_id) is None
+
+
+def test_import_of_several_chunks(login):
+    days = [(date.today() - timedelta(days=n)).isoformat() for n in range(10)]
+    lines = ''.join(f'{days[n % 10]},Produit {n % 40},3,0\n' for n in range(1200))
+    upload = io.BytesIO(('date,product,quantity_in,quantity_out\n' + lines).encode())
+    response = login('stock').post('/import/stocks', data={'file': (upload, 'stocks.csv')})
+    assert response.get_json()['imported'] == 1200
+
+
+def test_sync_of_a_full_batch(login):
+    submissions = [{'key': f'key-{n}', 'table': 'stocks',
+                    'data': {'date': date.today().isoformat(), 'product': f'Nouveau {n}', 'quantity_in': 1}}
+                   for n in range(200)]
+    client = login('stock')
+    first = client.post('/api/sync', json={'submissions': submissions}).get_json()
+    assert {result['status'] for result in first['results']} == {'applied'}
+    again = client.post('/api/sync', json={'submissions': submissions}).get_json()
+    assert {result['status'] for result in again['results']} == {'duplicate'}
+
+
+def test_live_feed_replay(login):
+    login('agent_commercial').post('/record/sale', data={
+        'date': date.today().isoformat(), 'product': 'Savon 1 kg', 'quantity': 1, 'unit_price': 2})
+    response = login('management').get('/live/events?last_event_id=0')
+    assert b'"table": "sales"' in response.data
+
+
+def test_export_counts_the_streamed_queries(login):
+    response = login('finance').get(f'/export/sales.csv?start_date=2000-01-01&end_date={date.today()}')
+    assert response.status_code == 200
+    assert response.data.startswith(b'id,date,product')
+
+
+def test_over_budget_request_fails(app, login):
+    @app.route('/test/over-budget')
+    @query_budget(1)
+    def over_budget():
+        for _ in range(3):
+            db.session.query(User.id).first()
+        return 'ok'
+
+    with pytest.raises(QueryBudgetExceeded):
+        login('management').get('/test/over-budget')
+
+
+def test_over_budget_stream_fails(app, login):
+    @app.route('/test/over-budget-stream')
+    @query_budget(1)
+    def over_budget_stream():
+        def generate():
+            for _ in range(3):
+                yield str(db.session.query(User.id).first())
+        return Response(stream_with_context(generate()))
+
+    response = login('management').get('/test/over-budget-stream')
+    with pytest.raises(QueryBudgetExceeded):
+        response.get_data()
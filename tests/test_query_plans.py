@@ -0,0 +1,19 @@
+import query_plans
+from models import IncomeExpense
+from read_models import ledger_rows
+
+
+def test_hot_queries_use_their_indexes(app):
+    with app.app_context():
+        assert query_plans.check_query_plans(echo=lambda message: None) == []
+
+
+def test_plan_on_another_index_fails(app, monkeypatch):
+    monkeypatch.setattr(query_plans, 'HOT_QUERIES', [
+        ('ledger page', query_plans._ledger_page, 'ix_income_expenses_type_date'),
+        # Largest amounts first: no index gives that order
+        ('ledger by amount', lambda: ledger_rows().order_by(IncomeExpense.amount.desc()).limit(10).statement,
+         'ix_income_expenses_date_id'),
+    ])
+    with app.app_context():
+        assert query_plans.check_query_plans(echo=lambda message: None) == ['ledger page', 'ledger by amount']
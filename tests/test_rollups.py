@@ -0,0 +1,23 @@
+from models import db, DayVersion, Stock, User
+from rollups import remove_stock_movements, verify_stock_balances
+
+
+def _stock_day_versions():
+    return {row.day.isoformat(): row.version for row in DayVersion.query.filter_by(table_name='stocks')}
+
+
+def test_bulk_stock_removal_bumps_each_day_once(app):
+    with app.app_context():
+        user_id = db.session.query(User.id).filter_by(role='stock').scalar()
+        query = Stock.query.filter_by(user_id=user_id)
+        days = {day for day, in db.session.query(db.func.date(Stock.date)).filter_by(user_id=user_id).distinct()}
+        assert query.count() > len(days)
+        before = _stock_day_versions()
+
+        remove_stock_movements(query)
+        query.delete(synchronize_session=False)
+        db.session.commit()
+        after = _stock_day_versions()
+        assert {day for day in after if after[day] != before.get(day, 0)} == days
+        assert all(after[day] == before.get(day, 0) + 1 for day in days)
+        assert verify_stock_balances() == {}
@@ -0,0 +1,15 @@
+import sys
+
+import app as app_module
+from startup_budget import DEFERRED_MODULES, check, measure
+
+
+def test_import_stays_within_budget():
+    config = app_module.app.config
+    measurement = measure()
+    assert check(measurement, config['STARTUP_IMPORT_BUDGET_MS'], config['STARTUP_RSS_BUDGET_MB']) == []
+    assert measurement['loaded'] == []
+
+
+def test_import_leaves_the_pdf_stack_unloaded():
+    assert [name for name in DEFERRED_MODULES if name in sys.modules] == []
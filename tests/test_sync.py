@@ -0,0 +1,60 @@
+import os
+import shutil
+import subprocess
+from datetime import date
+
+import pytest
+
+from models import db, Sale, SyncSubmission
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _sale(key, **data):
+    values = {'date': date.today().isoformat(), 'product': 'Savon 1 kg', 'quantity': '2', 'unit_price': '750'}
+    values.update(data)
+    return {'key': key, 'table': 'sales', 'data': values}
+
+
+def _sales_count(app):
+    with app.app_context():
+        return db.session.query(Sale).count()
+
+
+def test_replayed_key_is_applied_once(app, login):
+    client = login('agent_commercial')
+    before = _sales_count(app)
+    batch = {'submissions': [_sale('offline-1')]}
+
+    first = client.post('/api/sync', json=batch).get_json()
+    assert first['results'] == [{'key': 'offline-1', 'status': 'applied'}]
+    replies = [client.post('/api/sync', json=batch).get_json() for _ in range(2)]
+    assert replies[0] == replies[1] == {'success': True, 'results': [{'key': 'offline-1', 'status': 'duplicate'}]}
+
+    assert _sales_count(app) == before + 1
+    with app.app_context():
+        assert db.session.query(SyncSubmission).filter_by(key='offline-1').count() == 1
+
+
+def test_same_key_twice_in_one_batch(app, login):
+    before = _sales_count(app)
+    results = login('agent_commercial').post('/api/sync', json={
+        'submissions': [_sale('twice'), _sale('twice')]
+    }).get_json()['results']
+    assert [result['status'] for result in results] == ['applied', 'duplicate']
+    assert _sales_count(app) == before + 1
+
+
+def test_invalid_submission_is_rejected(login):
+    results = login('agent_commercial').post('/api/sync', json={
+        'submissions': [_sale('bad', quantity='')]
+    }).get_json()['results']
+    assert results[0]['status'] == 'rejected'
+    assert 'quantity' in results[0]['errors']
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='Node.js is not installed')
+def test_sync_queue_javascript():
+    result = subprocess.run(['node', '--test', os.path.join('tests', 'js')], cwd=ROOT, capture_output=True,
+                            text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,20 @@
+from signal_files import MAX_SIGNAL_BYTES
+from user_cache import CachedUser, UserCache
+
+
+def test_invalidation_reaches_other_workers(tmp_path):
+    signal_file = str(tmp_path / 'user_cache.signal')
+    this_worker, other_worker = UserCache(signal_file=signal_file), UserCache(signal_file=signal_file)
+    user = CachedUser(1, 'agent', 'Agent', 'commercial', 'agent_commercial')
+    for _ in range(3):
+        other_worker.put(user)
+        this_worker.invalidate(user.id)
+        assert other_worker.get(user.id) is None
+
+
+def test_signal_file_stays_small(tmp_path):
+    signal_file = tmp_path / 'user_cache.signal'
+    cache = UserCache(signal_file=str(signal_file))
+    for user_id in range(MAX_SIGNAL_BYTES * 2 + 10):
+        cache.invalidate(user_id)
+    assert 0 < signal_file.stat().st_size <= MAX_SIGNAL_BYTES
@@ -0,0 +1,118 @@
+"""Per-process cache of the logged-in user's identity.
+
+``load_user`` runs on every authenticated request; with the cache it only
+reaches the database on a miss or after ``USER_CACHE_TTL`` seconds. Entries
+are small ``CachedUser`` objects (no ORM state, safe to share between
+threads). ``invalidate_user`` drops an entry in this process and touches
+``USER_CACHE_SIGNAL_FILE`` (see signal_files); every worker stats that file
+on lookup and clears its cache when it changes, so an edit or delete is
+seen by all workers on the same host right away and by other hosts within
+the TTL.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+
+from signal_files import signal_state, touch_signal
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_SIZE = 1024
+
+
+class CachedUser(UserMixin):
+    __slots__ = ('id', 'username', 'full_name', 'department', 'role')
+
+    def __init__(self, id, username, full_name, department, role):
+        self.id = id
+        self.username = username
+        self.full_name = full_name
+        self.department = department
+        self.role = role
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, user.full_name, user.department, user.role)
+
+
+class UserCache:
+    def __init__(self, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE, signal_file=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.signal_file = signal_file
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.signal_state = self._signal_state()
+
+    def _signal_state(self):
+        if not self.signal_file:
+            return None
+        return signal_state(self.signal_file)
+
+    def _check_signal(self):
+        state = self._signal_state()
+        if state != self.signal_state:
+            self.signal_state = state
+            self.entries.clear()
+
+    def get(self, user_id):
+        with self.lock:
+            self._check_signal()
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return user
+
+    def put(self, user):
+        with self.lock:
+            self.entries[user.id] = (user, time.monotonic() + self.ttl)
+            self.entries.move_to_end(user.id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+            if self.signal_file:
+                touch_signal(self.signal_file)
+
+
+_cache = None
+
+
+def init_user_cache(app):
+    global _cache
+    signal_file = app.config.get('USER_CACHE_SIGNAL_FILE')
+    if signal_file is None:
+        os.makedirs(app.instance_path, exist_ok=True)
+        signal_file = os.path.join(app.instance_path, 'user_cache.signal')
+    _cache = UserCache(
+        ttl=app.config.get('USER_CACHE_TTL', DEFAULT_TTL),
+        max_size=app.config.get('USER_CACHE_MAX_SIZE', DEFAULT_MAX_SIZE),
+        signal_file=signal_file or None
+    )
+
+
+def load_cached_user(user_id, loader):
+    """Return the ``CachedUser`` for ``user_id``, calling ``loader(user_id)`` on a miss."""
+    user = _cache.get(user_id)
+    if user is not None:
+        return user
+    record = loader(user_id)
+    if record is None:
+        return None
+    user = CachedUser.from_user(record)
+    _cache.put(user)
+    return user
+
+
+def invalidate_user(user_id):
+    if _cache is not None:
+        _cache.invalidate(user_id)